@@ -0,0 +1,45 @@
+"""Add product stock buckets
+
+Revision ID: 5d2c7e9b41a3
+Revises: 0ab5137ed27c
+Create Date: 2025-03-10 12:14:03.118421
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2c7e9b41a3'
+down_revision: Union[str, None] = '0ab5137ed27c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'products',
+        sa.Column('stock_buckets', sa.Integer(), server_default='0', nullable=False),
+    )
+    op.create_table('product_stock_buckets',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('product_id', 'bucket', name='uq_product_bucket')
+    )
+
+
+def downgrade() -> None:
+    # Move bucket stock back to the product rows before dropping the buckets
+    op.execute(
+        'UPDATE products SET quantity = quantity + ('
+        'SELECT COALESCE(SUM(b.quantity), 0) FROM product_stock_buckets b '
+        'WHERE b.product_id = products.id)'
+    )
+    op.drop_table('product_stock_buckets')
+    op.drop_column('products', 'stock_buckets')
@@ -0,0 +1,51 @@
+"""Add reservation access path indexes
+
+Revision ID: c71d3e5f8a20
+Revises: 8e4b1f2a9c7d
+Create Date: 2025-03-27 15:02:44.871935
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c71d3e5f8a20'
+down_revision: Union[str, None] = '8e4b1f2a9c7d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Built concurrently, so reservations keep working while the indexes are built,
+    # CREATE INDEX CONCURRENTLY can not run inside the migration transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_products_reservations_product_id',
+            'products_reservations',
+            ['product_id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_reservations_pending',
+            'reservations',
+            ['id'],
+            unique=False,
+            postgresql_where=sa.text("status = 'pending'"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_reservations_pending', table_name='reservations', postgresql_concurrently=True
+        )
+        op.drop_index(
+            'ix_products_reservations_product_id',
+            table_name='products_reservations',
+            postgresql_concurrently=True,
+        )
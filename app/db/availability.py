@@ -0,0 +1,118 @@
+import asyncio
+import time
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.db.crud import get_products_availability
+from app.db.setup import async_session_factory, replica_session_factory
+from app.utils.logging import logger
+from settings import availability_settings
+
+
+@dataclass
+class SnapshotStats:
+    refreshes: int = 0
+    failed_refreshes: int = 0
+    products: int = 0
+
+
+class StockSnapshot:
+    """
+    In-process snapshot of the available stock of all products, loaded with one query
+    without row locks, so reads never wait for or block reservations.
+
+    `run` reloads the snapshot every `interval` seconds ahead of the staleness bound.
+    Reads of a snapshot older than `max_staleness`, e.g. before the first load or after
+    failed reloads, reload it first, concurrent reads share that one reload.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        interval: float,
+        max_staleness: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.max_staleness = max_staleness
+        self._clock = clock
+        self._available: Dict[int, int] = {}
+        self._loaded_at: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._stats = SnapshotStats()
+
+    def age(self) -> Optional[float]:
+        """
+        Seconds since the start of the query of the current snapshot, None before the first one.
+        """
+        return None if self._loaded_at is None else self._clock() - self._loaded_at
+
+    async def refresh(self) -> None:
+        """
+        Reloads the snapshot, or waits for the reload that is already running.
+        """
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._load())
+            self._refresh_task.add_done_callback(self._refresh_done)
+        # A cancelled reader must not cancel the reload the others wait for
+        await asyncio.shield(self._refresh_task)
+
+    async def get(self, product_ids: Iterable[int]) -> Tuple[Dict[int, int], float]:
+        """
+        Returns the available stock of the given products that exist and the age of
+        the snapshot it was read from.
+        """
+        age = self.age()
+        if age is None or age > self.max_staleness:
+            await self.refresh()
+            age = self.age()
+        available = self._available
+        return {
+            product_id: available[product_id]
+            for product_id in product_ids
+            if product_id in available
+        }, age
+
+    async def run(self) -> None:
+        """
+        Reloads the snapshot every `interval` seconds until the task is cancelled.
+        """
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Stock snapshot refresh failed")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> SnapshotStats:
+        return replace(self._stats)
+
+    async def _load(self) -> None:
+        started = self._clock()
+        try:
+            async with self.session_factory() as session:
+                available = await get_products_availability(None, session)
+        except Exception:
+            self._stats.failed_refreshes += 1
+            raise
+        self._available = available
+        self._loaded_at = started
+        self._stats.refreshes += 1
+        self._stats.products = len(available)
+
+    def _refresh_done(self, task: asyncio.Task) -> None:
+        self._refresh_task = None
+        if not task.cancelled():
+            # Retrieved here, so a failed reload nobody waited for is not reported again
+            task.exception()
+
+
+# Browse traffic is served from the replica when one is configured
+stock_snapshot = StockSnapshot(
+    replica_session_factory or async_session_factory,
+    interval=availability_settings.AVAILABILITY_REFRESH_INTERVAL_SECONDS,
+    max_staleness=availability_settings.AVAILABILITY_MAX_STALENESS_SECONDS,
+)
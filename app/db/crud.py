@@ -1,45 +1,204 @@
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
+from sqlalchemy import Row, and_, delete, exists, func, literal, literal_column, or_, text, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.interfaces import ORMOption
 from sqlalchemy.sql import select
 
-from app.db.models import Product, ProductReservation, Reservation, ReservationStatus
+from app.db.models import (
+    MAX_INTEGER,
+    IdempotencyKey,
+    OutboxEvent,
+    Product,
+    ProductReservation,
+    ProductStockBucket,
+    Reservation,
+    ReservationStatus,
+)
+from settings import db_settings, lock_settings
+
+# Loader options for the hot paths, they load only the columns the caller needs and raise
+# on access to anything else instead of issuing a lazy load
+PRODUCT_STOCK_ONLY = (load_only(Product.quantity, Product.stock_buckets, raiseload=True),)
+RESERVATION_STATUS_ONLY = (load_only(Reservation.status, raiseload=True),)
+PRODUCT_RESERVATION_QUANTITY_ONLY = (
+    load_only(
+        ProductReservation.reservation_id,
+        ProductReservation.product_id,
+        ProductReservation.reservation_quantity,
+        raiseload=True,
+    ),
+)
+
+# The status is rendered into the SQL instead of being sent as a parameter, otherwise
+# the partial index on pending reservations can not be used by generic plans
+IS_PENDING = Reservation.status == literal_column(f"'{ReservationStatus.PENDING.value}'")
+
+
+def _nowait() -> bool:
+    """
+    Row locks fail at once with NOWAIT, unless the connections are configured with
+    a lock_timeout, then locks are waited for until the timeout. Behind PgBouncer the
+    lock_timeout is not sent with the connection, so locks always fail at once there.
+    """
+    return lock_settings.LOCK_TIMEOUT_MS == 0 or db_settings.DB_PGBOUNCER_MODE
 
 
 async def get_product(
-    product_id: int, session: AsyncSession, lock: bool = True
+    product_id: int,
+    session: AsyncSession,
+    lock: bool = True,
+    options: Sequence[ORMOption] = (),
 ) -> Optional[Product]:
-    stmt = select(Product).where(Product.id == product_id)
+    stmt = select(Product).where(Product.id == product_id).options(*options)
     if lock:
-        stmt = stmt.with_for_update(nowait=True)
+        # The product may already be in the session from an unlocked read,
+        # so the locked read has to refresh it
+        stmt = stmt.with_for_update(nowait=_nowait()).execution_options(populate_existing=True)
     result = await session.execute(stmt)
     return result.scalar_one_or_none()
 
 
+async def get_products(
+    product_ids: Iterable[int],
+    session: AsyncSession,
+    lock: bool = True,
+    options: Sequence[ORMOption] = (),
+) -> Dict[int, Product]:
+    """
+    Fetches several products with one query. Rows are locked in ascending ID order, so
+    concurrent batches touching overlapping products always acquire locks in the same order.
+    """
+    stmt = (
+        select(Product)
+        .where(Product.id.in_(sorted(set(product_ids))))
+        .order_by(Product.id)
+        .options(*options)
+    )
+    if lock:
+        stmt = stmt.with_for_update(nowait=_nowait())
+    result = await session.execute(stmt)
+    return {product.id: product for product in result.scalars()}
+
+
 async def get_reservation(
-    reservation_id: int, session: AsyncSession, lock: bool = True
+    reservation_id: int,
+    session: AsyncSession,
+    lock: bool = True,
+    options: Sequence[ORMOption] = (),
 ) -> Optional[Reservation]:
-    stmt = select(Reservation).where(Reservation.id == reservation_id)
+    stmt = select(Reservation).where(Reservation.id == reservation_id).options(*options)
     if lock:
-        stmt = stmt.with_for_update(nowait=True)
+        stmt = stmt.with_for_update(nowait=_nowait())
     result = await session.execute(stmt)
     return result.scalar_one_or_none()
 
 
+async def get_reservation_details(reservation_id: int, session: AsyncSession) -> List[Row]:
+    """
+    Reads a reservation with all its lines and their products with one outer-joined query.
+
+    Returns:
+        List[Row]: One row per line ordered by product ID with the reservation status, product ID,
+            name, price, reserved quantity and date. A reservation without lines has one row
+            with None in the line columns, a missing reservation has no rows.
+    """
+    result = await session.execute(
+        select(
+            Reservation.status,
+            ProductReservation.product_id,
+            Product.name,
+            Product.price,
+            ProductReservation.reservation_quantity,
+            ProductReservation.date,
+        )
+        .outerjoin(ProductReservation, ProductReservation.reservation_id == Reservation.id)
+        .outerjoin(Product, Product.id == ProductReservation.product_id)
+        .where(Reservation.id == reservation_id)
+        .order_by(ProductReservation.product_id)
+    )
+    return list(result)
+
+
 async def get_product_reservation(
-    reservation_id: int, product_id: int, session: AsyncSession, lock: bool = True
+    reservation_id: int,
+    product_id: int,
+    session: AsyncSession,
+    lock: bool = True,
+    options: Sequence[ORMOption] = (),
 ) -> Optional[ProductReservation]:
-    stmt = select(ProductReservation).where(
-        ProductReservation.reservation_id == reservation_id,
-        ProductReservation.product_id == product_id,
+    stmt = (
+        select(ProductReservation)
+        .where(
+            ProductReservation.reservation_id == reservation_id,
+            ProductReservation.product_id == product_id,
+        )
+        .options(*options)
     )
     if lock:
-        stmt = stmt.with_for_update(nowait=True)
+        stmt = stmt.with_for_update(nowait=_nowait())
     result = await session.execute(stmt)
     return result.scalar_one_or_none()
 
 
+async def get_product_reservations(
+    reservation_id: int,
+    product_ids: Iterable[int],
+    session: AsyncSession,
+    lock: bool = True,
+    options: Sequence[ORMOption] = (),
+) -> Dict[int, ProductReservation]:
+    stmt = (
+        select(ProductReservation)
+        .where(
+            ProductReservation.reservation_id == reservation_id,
+            ProductReservation.product_id.in_(sorted(set(product_ids))),
+        )
+        .order_by(ProductReservation.product_id)
+        .options(*options)
+    )
+    if lock:
+        stmt = stmt.with_for_update(nowait=_nowait())
+    result = await session.execute(stmt)
+    return {
+        product_reservation.product_id: product_reservation
+        for product_reservation in result.scalars()
+    }
+
+
+async def get_products_availability(
+    product_ids: Optional[Iterable[int]], session: AsyncSession
+) -> Dict[int, int]:
+    """
+    Reads the available stock, the product quantity plus the sum of its buckets, of the given
+    products or of all products when `product_ids` is None, with one query and no row locks.
+
+    Returns:
+        Dict[int, int]: Available stock by product ID, missing products are left out.
+    """
+    bucket_stock = select(
+        ProductStockBucket.product_id, func.sum(ProductStockBucket.quantity).label("quantity")
+    ).group_by(ProductStockBucket.product_id)
+    stmt = select(Product.id, Product.quantity)
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        bucket_stock = bucket_stock.where(ProductStockBucket.product_id.in_(product_ids))
+        stmt = stmt.where(Product.id.in_(product_ids))
+    buckets = bucket_stock.subquery("bucket_stock")
+    result = await session.execute(
+        stmt.add_columns(func.coalesce(buckets.c.quantity, 0)).outerjoin(
+            buckets, buckets.c.product_id == Product.id
+        )
+    )
+    return {
+        product_id: quantity + in_buckets for product_id, quantity, in_buckets in result
+    }
+
+
 async def add_reservation(reservation_id: int, session: AsyncSession) -> Reservation:
     reservation = Reservation(id=reservation_id, status=ReservationStatus.PENDING)
     session.add(reservation)
@@ -59,3 +218,659 @@ async def add_product_reservation(
     session.add(product_reservation)
     await session.flush()
     return product_reservation
+
+
+async def add_product_reservations(
+    reservation_id: int, quantities: Dict[int, int], date: datetime, session: AsyncSession
+) -> List[ProductReservation]:
+    """
+    Adds several reservation lines with a single flush, `quantities` maps product ID to quantity.
+    """
+    product_reservations = [
+        ProductReservation(
+            reservation_id=reservation_id,
+            product_id=product_id,
+            reservation_quantity=quantity,
+            date=date,
+        )
+        for product_id, quantity in quantities.items()
+    ]
+    session.add_all(product_reservations)
+    await session.flush()
+    return product_reservations
+
+
+async def _lock_pending_reservation(reservation_id: int, session: AsyncSession) -> bool:
+    """
+    Locks the reservation row, a missing reservation is added as pending first.
+
+    Returns:
+        bool: False if the reservation is not pending.
+    """
+    reservation = await get_reservation(reservation_id, session, True, RESERVATION_STATUS_ONLY)
+    if reservation is None:
+        result = await session.execute(
+            postgresql_insert(Reservation)
+            .values(id=reservation_id, status=ReservationStatus.PENDING.value)
+            .on_conflict_do_nothing(index_elements=[Reservation.id])
+            .returning(Reservation.id)
+        )
+        if result.scalar_one_or_none() is not None:
+            return True
+        # Added by a concurrent transaction that has committed in the meantime
+        reservation = await get_reservation(
+            reservation_id, session, True, RESERVATION_STATUS_ONLY
+        )
+    return reservation is not None and reservation.status == ReservationStatus.PENDING
+
+
+async def reserve_product(
+    reservation_id: int, product_id: int, quantity: int, date: datetime, session: AsyncSession
+) -> Optional[int]:
+    """
+    Sets the reserved quantity of a product in a reservation.
+
+    Stock is checked and changed with one conditional
+    `UPDATE products SET quantity = quantity - :delta WHERE quantity >= :delta`, on PostgreSQL
+    the reservation line is upserted in the same statement via a data-modifying CTE. Before
+    that the product row and the reservation row are locked, in this order like the other
+    engines lock them, so the previous quantity and the status are read by a statement that
+    started after concurrent changes of the reservation were committed. Other dialects run
+    the statements one after another without row locks.
+
+    Products with stock buckets are not changed, their stock is not in the product row.
+
+    Returns:
+        Optional[int]: Remaining quantity of the product, or None if nothing was changed because
+            the product does not exist or has stock buckets, the reservation is not pending,
+            the product is already reserved with the same quantity or there is not enough
+            stock. A reservation added by the call is then left for the rollback.
+    """
+    previous_quantity = func.coalesce(
+        select(ProductReservation.reservation_quantity)
+        .where(
+            ProductReservation.reservation_id == reservation_id,
+            ProductReservation.product_id == product_id,
+        )
+        .scalar_subquery(),
+        0,
+    )
+    delta = quantity - previous_quantity
+    stock_update = (
+        update(Product)
+        .where(
+            Product.id == product_id,
+            Product.stock_buckets == 0,
+            Product.quantity >= delta,
+            previous_quantity != quantity,
+        )
+        .values(quantity=Product.quantity - delta)
+        .returning(Product.quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+    insert = postgresql_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    line_insert = insert(ProductReservation)
+    line_upsert_values = {
+        "reservation_quantity": line_insert.excluded.reservation_quantity,
+        "date": line_insert.excluded.date,
+    }
+    line_index = [ProductReservation.reservation_id, ProductReservation.product_id]
+
+    if insert is postgresql_insert:
+        locked_product = await session.execute(
+            select(Product.id)
+            .where(Product.id == product_id, Product.stock_buckets == 0)
+            .with_for_update(nowait=_nowait())
+        )
+        if locked_product.scalar_one_or_none() is None:
+            return None
+        if not await _lock_pending_reservation(reservation_id, session):
+            return None
+
+        stock = stock_update.cte("stock")
+        line = (
+            line_insert.from_select(
+                [
+                    ProductReservation.reservation_id,
+                    ProductReservation.product_id,
+                    ProductReservation.reservation_quantity,
+                    ProductReservation.date,
+                ],
+                select(
+                    literal(reservation_id),
+                    literal(product_id),
+                    literal(quantity),
+                    literal(date, ProductReservation.date.type),
+                ).where(exists(select(stock.c.quantity))),
+            )
+            .on_conflict_do_update(index_elements=line_index, set_=line_upsert_values)
+            .cte("line")
+        )
+        result = await session.execute(select(stock.c.quantity).add_cte(line))
+        return result.scalar_one_or_none()
+
+    reservation_closed = exists().where(
+        Reservation.id == reservation_id,
+        Reservation.status != ReservationStatus.PENDING.value,
+    )
+    result = await session.execute(stock_update.where(~reservation_closed))
+    remaining = result.scalar_one_or_none()
+    if remaining is None:
+        return None
+    await session.execute(
+        insert(Reservation)
+        .values(id=reservation_id, status=ReservationStatus.PENDING.value)
+        .on_conflict_do_nothing(index_elements=[Reservation.id])
+    )
+    await session.execute(
+        line_insert.values(
+            reservation_id=reservation_id,
+            product_id=product_id,
+            reservation_quantity=quantity,
+            date=date,
+        ).on_conflict_do_update(index_elements=line_index, set_=line_upsert_values)
+    )
+    return remaining
+
+
+async def upsert_products(
+    products: Sequence[Dict], add_quantity: bool, session: AsyncSession
+) -> List[int]:
+    """
+    Inserts or updates products with one multi-row `INSERT ... ON CONFLICT (id) DO UPDATE`,
+    every product is a dict with ID, name, price and quantity and the IDs have to be unique.
+    Existing products get the name and price, and the quantity replaces their stock or is
+    added to it with `add_quantity`. Only the given product rows are locked.
+
+    Products that keep their stock in buckets are not updated when the quantity replaces
+    the stock, their available stock is not the product quantity. Added quantities that
+    would make the stock exceed `MAX_INTEGER` are not added.
+
+    Returns:
+        List[int]: IDs of the inserted and updated products.
+    """
+    if not products:
+        return []
+    insert = postgresql_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    # Rows are locked in ascending ID order, like batch reservations lock them
+    stmt = insert(Product).values(sorted(products, key=lambda product: product["id"]))
+    quantity = (
+        Product.quantity + stmt.excluded.quantity if add_quantity else stmt.excluded.quantity
+    )
+    result = await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[Product.id],
+            set_={"name": stmt.excluded.name, "price": stmt.excluded.price, "quantity": quantity},
+            where=(
+                # Compared without the sum, which would overflow INTEGER on PostgreSQL
+                Product.quantity <= MAX_INTEGER - stmt.excluded.quantity
+                if add_quantity
+                else Product.stock_buckets == 0
+            ),
+        ).returning(Product.id)
+    )
+    return list(result.scalars())
+
+
+async def sync_product_id_sequence(session: AsyncSession) -> None:
+    """
+    Moves the PostgreSQL sequence of product IDs past the highest ID, products inserted with
+    explicit IDs do not advance it. Other dialects pick the next ID from the table.
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        await session.execute(
+            select(
+                func.setval(
+                    func.pg_get_serial_sequence("products", "id"),
+                    select(func.coalesce(func.max(Product.id), 1)).scalar_subquery(),
+                )
+            )
+        )
+
+
+def _split_stock(total: int, buckets: int) -> List[int]:
+    """
+    Splits the stock as evenly as possible, first buckets get the remainder.
+    """
+    share, remainder = divmod(total, buckets)
+    return [share + (1 if bucket < remainder else 0) for bucket in range(buckets)]
+
+
+async def _lock_stock_buckets(
+    product_id: int, session: AsyncSession, nowait: bool
+) -> Optional[Tuple[Product, List[ProductStockBucket]]]:
+    """
+    Locks the product row and all its buckets, always in this order and buckets in
+    ascending order, so the fallback path and the rebalancer can not deadlock each other.
+    """
+    product_result = await session.execute(
+        select(Product)
+        .where(Product.id == product_id)
+        .options(*PRODUCT_STOCK_ONLY)
+        .with_for_update(nowait=nowait)
+        .execution_options(populate_existing=True)
+    )
+    product = product_result.scalar_one_or_none()
+    if product is None:
+        return None
+
+    buckets_result = await session.execute(
+        select(ProductStockBucket)
+        .where(ProductStockBucket.product_id == product_id)
+        .order_by(ProductStockBucket.bucket)
+        .with_for_update(nowait=nowait)
+        .execution_options(populate_existing=True)
+    )
+    return product, list(buckets_result.scalars())
+
+
+def _redistribute_stock(
+    product: Product, buckets: List[ProductStockBucket], total: int
+) -> None:
+    for bucket, quantity in zip(buckets, _split_stock(total, len(buckets))):
+        bucket.quantity = quantity
+    product.quantity = 0
+
+
+async def set_stock_buckets(product_id: int, buckets: int, session: AsyncSession) -> bool:
+    """
+    Splits the stock of the product into `buckets` bucket rows, or moves all stock back into
+    the product row when `buckets` is 0. Available stock does not change.
+
+    Returns:
+        bool: False if the product does not exist.
+    """
+    locked = await _lock_stock_buckets(product_id, session, nowait=_nowait())
+    if locked is None:
+        return False
+
+    product, current_buckets = locked
+    total = product.quantity + sum(bucket.quantity for bucket in current_buckets)
+    for bucket in current_buckets:
+        await session.delete(bucket)
+    await session.flush()
+
+    product.stock_buckets = buckets
+    if buckets:
+        session.add_all(
+            ProductStockBucket(product_id=product_id, bucket=bucket, quantity=quantity)
+            for bucket, quantity in enumerate(_split_stock(total, buckets))
+        )
+        product.quantity = 0
+    else:
+        product.quantity = total
+    await session.flush()
+    return True
+
+
+async def rebalance_stock_buckets(product_id: int, session: AsyncSession) -> Optional[int]:
+    """
+    Spreads the stock of a bucketed product evenly over its buckets, including the stock
+    that was returned to the product row. The rows are locked with NOWAIT, a product that
+    is being reserved fails with a lock error instead of being waited for.
+
+    Returns:
+        Optional[int]: Total available stock, or None if the product has no buckets.
+    """
+    locked = await _lock_stock_buckets(product_id, session, nowait=True)
+    if locked is None or not locked[1]:
+        return None
+
+    product, buckets = locked
+    total = product.quantity + sum(bucket.quantity for bucket in buckets)
+    _redistribute_stock(product, buckets, total)
+    await session.flush()
+    return total
+
+
+async def get_unbalanced_bucketed_products(limit: int, session: AsyncSession) -> List[int]:
+    """
+    Returns IDs of up to `limit` bucketed products whose stock should be spread again: stock
+    was returned to the product row, e.g. by cancellations, or a bucket ran empty while
+    another one holds more than one unit. Only the bucket rows are scanned, products without
+    buckets are never read. No rows are locked.
+    """
+    bucket_stock = (
+        select(
+            ProductStockBucket.product_id,
+            func.min(ProductStockBucket.quantity).label("smallest"),
+            func.max(ProductStockBucket.quantity).label("largest"),
+        )
+        .group_by(ProductStockBucket.product_id)
+        .subquery("bucket_stock")
+    )
+    result = await session.execute(
+        select(Product.id)
+        .join(bucket_stock, Product.id == bucket_stock.c.product_id)
+        .where(
+            Product.stock_buckets > 0,
+            or_(
+                Product.quantity > 0,
+                and_(bucket_stock.c.smallest == 0, bucket_stock.c.largest > 1),
+            ),
+        )
+        .order_by(Product.id)
+        .limit(limit)
+    )
+    return list(result.scalars())
+
+
+async def move_bucket_stock(
+    product_id: int, buckets: int, delta: int, session: AsyncSession, start: int = 0
+) -> bool:
+    """
+    Takes `delta` units from the stock buckets of a product, or returns them when `delta`
+    is negative.
+
+    A single bucket is picked starting from `start` with `FOR UPDATE SKIP LOCKED`, so
+    concurrent reservations of one product lock different rows. If no unlocked bucket has
+    enough stock, all buckets and the product row are locked and the remaining stock is
+    rebalanced.
+
+    Returns:
+        bool: False if there is not enough stock in total.
+    """
+    if delta == 0:
+        return True
+
+    rotation = (ProductStockBucket.bucket - start + buckets) % buckets
+    candidate = (
+        select(ProductStockBucket.id)
+        .where(ProductStockBucket.product_id == product_id)
+        .order_by(rotation)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    if delta > 0:
+        candidate = candidate.where(ProductStockBucket.quantity >= delta)
+
+    result = await session.execute(
+        update(ProductStockBucket)
+        .where(ProductStockBucket.id == candidate.scalar_subquery())
+        .values(quantity=ProductStockBucket.quantity - delta)
+        .returning(ProductStockBucket.quantity)
+        .execution_options(synchronize_session=False)
+    )
+    if result.scalar_one_or_none() is not None:
+        return True
+
+    if delta < 0:
+        # Every bucket is locked right now, returned stock goes to the starting bucket
+        await session.execute(
+            update(ProductStockBucket)
+            .where(
+                ProductStockBucket.product_id == product_id,
+                ProductStockBucket.bucket == start % buckets,
+            )
+            .values(quantity=ProductStockBucket.quantity - delta)
+            .execution_options(synchronize_session=False)
+        )
+        return True
+
+    locked = await _lock_stock_buckets(product_id, session, nowait=_nowait())
+    if locked is None or not locked[1]:
+        return False
+
+    product, product_buckets = locked
+    total = product.quantity + sum(bucket.quantity for bucket in product_buckets)
+    if total < delta:
+        return False
+    _redistribute_stock(product, product_buckets, total - delta)
+    await session.flush()
+    return True
+
+
+async def release_reservations_stock(reservation_ids: Sequence[int], session: AsyncSession) -> int:
+    """
+    Returns the stock of all lines of the given reservations to their products with one
+    `UPDATE products ... FROM (SELECT product_id, sum(reservation_quantity) ... GROUP BY
+    product_id)`, on PostgreSQL the released units are returned by the same statement.
+    The caller has to lock the products before the reservations, see
+    `_lock_reservation_products`.
+
+    Returns:
+        int: Number of returned units.
+    """
+    if not reservation_ids:
+        return 0
+
+    released_lines = ProductReservation.reservation_id.in_(reservation_ids)
+    released = (
+        select(
+            ProductReservation.product_id,
+            func.sum(ProductReservation.reservation_quantity).label("quantity"),
+        )
+        .where(released_lines)
+        .group_by(ProductReservation.product_id)
+        .subquery("released")
+    )
+    stmt = (
+        update(Product)
+        .where(Product.id == released.c.product_id)
+        .values(quantity=Product.quantity + released.c.quantity)
+        .execution_options(synchronize_session=False)
+    )
+    if session.get_bind().dialect.name == "postgresql":
+        result = await session.execute(stmt.returning(released.c.quantity))
+        return sum(result.scalars())
+
+    # SQLite can not return columns of the FROM clause, the units are summed separately
+    await session.execute(stmt)
+    units = await session.scalar(
+        select(func.sum(ProductReservation.reservation_quantity)).where(released_lines)
+    )
+    return units or 0
+
+
+async def set_lock_timeout(lock_timeout_ms: int, session: AsyncSession) -> None:
+    """
+    Lets row locks of the current transaction wait up to `lock_timeout_ms` on PostgreSQL,
+    whatever the connections are configured with.
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        await session.execute(text(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}"))
+
+
+async def _lock_reservation_products(
+    reservation_ids: Sequence[int], session: AsyncSession, nowait: bool
+) -> None:
+    """
+    Locks the products of all lines of the reservations in ascending ID order. Products are
+    locked before reservations everywhere, like reservations lock them, so a cancellation
+    and a reservation can not deadlock each other.
+    """
+    await session.execute(
+        select(Product.id)
+        .where(
+            Product.id.in_(
+                select(ProductReservation.product_id).where(
+                    ProductReservation.reservation_id.in_(reservation_ids)
+                )
+            )
+        )
+        .order_by(Product.id)
+        .with_for_update(nowait=nowait)
+    )
+
+
+async def _cancel_pending_reservations(
+    reservation_ids: Sequence[int], session: AsyncSession, nowait: bool, *conditions
+) -> Tuple[List[int], int]:
+    if not reservation_ids:
+        return [], 0
+    await _lock_reservation_products(reservation_ids, session, nowait)
+    result = await session.execute(
+        update(Reservation)
+        .where(Reservation.id.in_(reservation_ids), IS_PENDING, *conditions)
+        .values(status=ReservationStatus.CANCELLED.value)
+        .returning(Reservation.id)
+        .execution_options(synchronize_session=False)
+    )
+    cancelled_ids = sorted(result.scalars())
+    units = await release_reservations_stock(cancelled_ids, session)
+    return cancelled_ids, units
+
+
+async def cancel_reservations(
+    reservation_ids: Sequence[int], session: AsyncSession
+) -> Tuple[List[int], int]:
+    """
+    Cancels the pending reservations among the given ones and returns their stock,
+    reservations in other statuses are left as they are.
+
+    Returns:
+        Tuple[List[int], int]: IDs of the cancelled reservations and the number of returned units.
+    """
+    return await _cancel_pending_reservations(reservation_ids, session, _nowait())
+
+
+def _is_expired(expired_before: datetime):
+    last_change = (
+        select(func.max(ProductReservation.date))
+        .where(ProductReservation.reservation_id == Reservation.id)
+        .scalar_subquery()
+    )
+    return last_change < expired_before
+
+
+async def get_expired_reservation_ids(
+    expired_before: datetime, limit: int, session: AsyncSession, after_id: int = 0
+) -> List[int]:
+    """
+    Returns IDs of up to `limit` pending reservations above `after_id` whose lines were all
+    last changed before `expired_before`, in ascending order. No rows are locked.
+    """
+    result = await session.execute(
+        select(Reservation.id)
+        .where(IS_PENDING, _is_expired(expired_before), Reservation.id > after_id)
+        .order_by(Reservation.id)
+        .limit(limit)
+    )
+    return list(result.scalars())
+
+
+async def cancel_expired_reservations(
+    reservation_ids: Sequence[int],
+    expired_before: datetime,
+    session: AsyncSession,
+    lock_timeout_ms: int = 0,
+) -> Tuple[List[int], int]:
+    """
+    Cancels the given reservations and returns their stock. Their products are locked first,
+    reservations that were changed or closed before the locks were taken are left as they are.
+    With `lock_timeout_ms` locked products are waited for up to that long instead of failing
+    at once.
+
+    Returns:
+        Tuple[List[int], int]: IDs of the cancelled reservations and the number of returned units.
+    """
+    if lock_timeout_ms:
+        await set_lock_timeout(lock_timeout_ms, session)
+    return await _cancel_pending_reservations(
+        reservation_ids, session, not lock_timeout_ms and _nowait(), _is_expired(expired_before)
+    )
+
+
+async def expire_reservations(
+    expired_before: datetime, limit: int, session: AsyncSession, lock_timeout_ms: int = 0
+) -> Tuple[List[int], int]:
+    """
+    Cancels up to `limit` pending reservations whose lines were all last changed before
+    `expired_before` and returns their stock.
+
+    Returns:
+        Tuple[List[int], int]: IDs of the cancelled reservations and the number of returned units.
+    """
+    expired_ids = await get_expired_reservation_ids(expired_before, limit, session)
+    return await cancel_expired_reservations(
+        expired_ids, expired_before, session, lock_timeout_ms
+    )
+
+
+async def get_idempotency_key(key: str, session: AsyncSession) -> Optional[IdempotencyKey]:
+    return await session.get(IdempotencyKey, key)
+
+
+async def add_idempotency_key(
+    key: str,
+    request_hash: str,
+    status_code: int,
+    response: str,
+    created_at: datetime,
+    session: AsyncSession,
+) -> IdempotencyKey:
+    """
+    Stores the response for the key. A concurrent request that stored the same key first
+    makes the flush fail with an IntegrityError, which rolls back the whole transaction.
+    """
+    idempotency_key = IdempotencyKey(
+        key=key,
+        request_hash=request_hash,
+        status_code=status_code,
+        response=response,
+        created_at=created_at,
+    )
+    session.add(idempotency_key)
+    await session.flush()
+    return idempotency_key
+
+
+async def delete_idempotency_keys(
+    created_before: datetime, limit: int, session: AsyncSession
+) -> int:
+    """
+    Deletes up to `limit` keys stored before `created_before`.
+
+    Returns:
+        int: Number of deleted keys.
+    """
+    expired = (
+        select(IdempotencyKey.key)
+        .where(IdempotencyKey.created_at < created_before)
+        .order_by(IdempotencyKey.created_at)
+        .limit(limit)
+    )
+    result = await session.execute(
+        delete(IdempotencyKey)
+        .where(IdempotencyKey.key.in_(expired))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+async def add_outbox_events(events: Sequence[Dict], session: AsyncSession) -> None:
+    """
+    Inserts outbox events with one executemany, every event is a dict with the event type,
+    reservation ID, payload and creation time.
+    """
+    if events:
+        await session.execute(OutboxEvent.__table__.insert(), list(events))
+
+
+async def claim_outbox_events(limit: int, session: AsyncSession) -> List[OutboxEvent]:
+    """
+    Locks up to `limit` of the oldest events with `FOR UPDATE SKIP LOCKED`, so several
+    relays can drain the outbox at the same time without delivering an event twice.
+    """
+    result = await session.execute(
+        select(OutboxEvent).order_by(OutboxEvent.id).limit(limit).with_for_update(skip_locked=True)
+    )
+    return list(result.scalars())
+
+
+async def delete_outbox_events(event_ids: Sequence[int], session: AsyncSession) -> int:
+    """
+    Deletes delivered events.
+
+    Returns:
+        int: Number of deleted events.
+    """
+    if not event_ids:
+        return 0
+    result = await session.execute(
+        delete(OutboxEvent)
+        .where(OutboxEvent.id.in_(event_ids))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
@@ -0,0 +1,142 @@
+import asyncio
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.db.crud import cancel_expired_reservations, get_expired_reservation_ids
+from app.db.locking import is_lock_not_available
+from app.db.models import OutboxEventType, ReservationStatus
+from app.db.outbox import cancellation_events, record_events
+from app.db.setup import async_session_factory
+from app.utils.cache import recent_reservation_writes, reservation_status_cache
+from app.utils.logging import logger
+from app.utils.subscriptions import reservation_status_subscriptions
+from settings import expiry_settings
+
+
+@dataclass
+class SweepResult:
+    reservations: int = 0
+    units: int = 0
+    # Batches skipped because their products stayed locked
+    skipped_batches: int = 0
+
+
+@dataclass
+class ExpiryStats:
+    sweeps: int = 0
+    failed_sweeps: int = 0
+    # Totals over all sweeps
+    reservations: int = 0
+    units: int = 0
+    skipped_batches: int = 0
+
+
+class ExpirySweeper:
+    """
+    Cancels pending reservations that were not changed for `ttl` and returns their stock.
+    Several workers or nodes can sweep at the same time, the products of a batch are locked
+    before its reservations, so a reservation that was cancelled or changed by another
+    transaction in the meantime is left as it is.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        ttl: timedelta,
+        batch_size: int,
+        interval: float,
+        lock_timeout_ms: int = 0,
+    ):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.interval = interval
+        self.lock_timeout_ms = lock_timeout_ms
+        self._stats = ExpiryStats()
+
+    async def sweep(self) -> SweepResult:
+        """
+        Cancels all reservations that expired before the sweep started, one batch
+        per transaction, so row locks are held only for one batch at a time. A batch whose
+        products stay locked for `lock_timeout_ms` is skipped, the sweep goes on with the
+        next one.
+        """
+        expired_before = datetime.now(timezone.utc) - self.ttl
+        result = SweepResult()
+        after_id = 0
+        while True:
+            async with self.session_factory() as session:
+                try:
+                    async with session.begin():
+                        expired_ids = await get_expired_reservation_ids(
+                            expired_before, self.batch_size, session, after_id
+                        )
+                        if not expired_ids:
+                            return result
+                        cancelled_ids, units = await cancel_expired_reservations(
+                            expired_ids, expired_before, session, self.lock_timeout_ms
+                        )
+                        await record_events(
+                            OutboxEventType.RESERVATION_CANCELLED,
+                            cancellation_events(cancelled_ids, "expired"),
+                            session,
+                        )
+                except DBAPIError as db_err:
+                    if not is_lock_not_available(db_err):
+                        raise
+                    logger.info(
+                        "Expiry batch of reservations %s-%s skipped on locked products",
+                        expired_ids[0],
+                        expired_ids[-1],
+                    )
+                    cancelled_ids, units = [], 0
+                    result.skipped_batches += 1
+            for reservation_id in cancelled_ids:
+                reservation_status_cache.set(reservation_id, ReservationStatus.CANCELLED.value)
+                recent_reservation_writes.set(reservation_id, True)
+                reservation_status_subscriptions.publish(
+                    reservation_id, ReservationStatus.CANCELLED.value
+                )
+            result.reservations += len(cancelled_ids)
+            result.units += units
+            if len(expired_ids) < self.batch_size:
+                return result
+            after_id = expired_ids[-1]
+
+    async def run(self) -> None:
+        """
+        Sweeps every `interval` seconds until the task is cancelled.
+        """
+        while True:
+            try:
+                result = await self.sweep()
+            except Exception:
+                self._stats.failed_sweeps += 1
+                logger.exception("Expiry sweep failed")
+            else:
+                self._stats.sweeps += 1
+                self._stats.reservations += result.reservations
+                self._stats.units += result.units
+                self._stats.skipped_batches += result.skipped_batches
+                if result.reservations:
+                    logger.info(
+                        "Expiry sweep cancelled %s reservations and released %s units",
+                        result.reservations,
+                        result.units,
+                    )
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> ExpiryStats:
+        return replace(self._stats)
+
+
+expiry_sweeper = ExpirySweeper(
+    async_session_factory,
+    ttl=timedelta(seconds=expiry_settings.RESERVATION_TTL_SECONDS),
+    batch_size=expiry_settings.EXPIRY_BATCH_SIZE,
+    interval=expiry_settings.EXPIRY_SWEEP_INTERVAL_SECONDS,
+    lock_timeout_ms=expiry_settings.EXPIRY_LOCK_TIMEOUT_MS,
+)
@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.db.crud import add_idempotency_key, delete_idempotency_keys, get_idempotency_key
+from app.db.setup import async_session_factory
+from app.utils.cache import TTLCache
+from app.utils.logging import logger
+from settings import idempotency_settings
+
+
+@dataclass(frozen=True)
+class IdempotentRequest:
+    key: str
+    request_hash: str
+
+    @classmethod
+    def from_dto(cls, key: str, dto: BaseModel) -> "IdempotentRequest":
+        return cls(key, hashlib.sha256(dto.model_dump_json().encode()).hexdigest())
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    request_hash: str
+    status_code: int
+    body: str
+
+
+# Idempotency key -> stored response, so repeated requests usually do not query the table
+stored_response_cache: TTLCache[str, StoredResponse] = TTLCache(
+    max_size=idempotency_settings.IDEMPOTENCY_CACHE_SIZE,
+    ttl=min(
+        idempotency_settings.IDEMPOTENCY_CACHE_TTL,
+        idempotency_settings.IDEMPOTENCY_KEY_TTL_SECONDS,
+    ),
+)
+
+
+async def find_stored_response(key: str, session: AsyncSession) -> Optional[StoredResponse]:
+    """
+    Looks up the response stored for the key in the cache, then in the table.
+    """
+    stored = stored_response_cache.get(key, None)
+    if stored is not None:
+        return stored
+
+    idempotency_key = await get_idempotency_key(key, session)
+    if idempotency_key is None:
+        return None
+    stored = StoredResponse(
+        idempotency_key.request_hash, idempotency_key.status_code, idempotency_key.response
+    )
+    stored_response_cache.set(key, stored)
+    return stored
+
+
+async def store_response(
+    request: IdempotentRequest, status_code: int, response: BaseModel, session: AsyncSession
+) -> None:
+    """
+    Adds the response to the table in the transaction of the session, it has to be cached
+    with `remember_response` once the transaction is committed.
+    """
+    await add_idempotency_key(
+        request.key,
+        request.request_hash,
+        status_code,
+        response.model_dump_json(),
+        datetime.now(timezone.utc),
+        session,
+    )
+
+
+def remember_response(request: IdempotentRequest, status_code: int, response: BaseModel) -> None:
+    stored_response_cache.set(
+        request.key,
+        StoredResponse(request.request_hash, status_code, response.model_dump_json()),
+    )
+
+
+@dataclass
+class CleanupStats:
+    runs: int = 0
+    failed_runs: int = 0
+    deleted: int = 0
+
+
+class IdempotencyKeyCleaner:
+    """
+    Deletes idempotency keys stored more than `ttl` ago, so keys are replayed
+    for at least `ttl` and at most `ttl` plus `interval`.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        ttl: timedelta,
+        batch_size: int,
+        interval: float,
+    ):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.interval = interval
+        self._stats = CleanupStats()
+
+    async def clean(self) -> int:
+        """
+        Deletes all keys that expired before the cleanup started, one batch per transaction.
+        """
+        created_before = datetime.now(timezone.utc) - self.ttl
+        deleted = 0
+        while True:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    batch = await delete_idempotency_keys(
+                        created_before, self.batch_size, session
+                    )
+            deleted += batch
+            if batch < self.batch_size:
+                return deleted
+
+    async def run(self) -> None:
+        """
+        Cleans up every `interval` seconds until the task is cancelled.
+        """
+        while True:
+            try:
+                deleted = await self.clean()
+            except Exception:
+                self._stats.failed_runs += 1
+                logger.exception("Idempotency key cleanup failed")
+            else:
+                self._stats.runs += 1
+                self._stats.deleted += deleted
+                if deleted:
+                    logger.info("Idempotency key cleanup deleted %s keys", deleted)
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> CleanupStats:
+        return replace(self._stats)
+
+
+idempotency_key_cleaner = IdempotencyKeyCleaner(
+    async_session_factory,
+    ttl=timedelta(seconds=idempotency_settings.IDEMPOTENCY_KEY_TTL_SECONDS),
+    batch_size=idempotency_settings.IDEMPOTENCY_CLEANUP_BATCH_SIZE,
+    interval=idempotency_settings.IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS,
+)
@@ -0,0 +1,99 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass, replace
+from typing import Awaitable, Callable, TypeVar
+
+from asyncpg.exceptions import LockNotAvailableError
+from sqlalchemy.exc import DBAPIError
+
+from settings import lock_settings
+
+T = TypeVar("T")
+
+
+def is_lock_not_available(db_err: DBAPIError) -> bool:
+    """
+    Checks if the database error is due to a lock not being available.
+    """
+    orig_exception = db_err.orig
+    return isinstance(orig_exception, LockNotAvailableError) or isinstance(
+        orig_exception.__cause__,  # type: ignore
+        LockNotAvailableError,
+    )
+
+
+@dataclass
+class LockWaitStats:
+    # Attempts that failed because a row was locked by another transaction
+    lock_conflicts: int = 0
+    retries: int = 0
+    # Requests that gave up after all retries or after the deadline
+    exhausted: int = 0
+    # Requests that hit at least one lock conflict and how long they took in total
+    waited_requests: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+
+
+class LockRetryPolicy:
+    """
+    Retries an operation that failed on a locked row, with exponential backoff and full
+    jitter, until the retries or the deadline are used up. The operation has to run
+    its own transaction, it is called again from scratch on every attempt.
+    """
+
+    def __init__(
+        self,
+        retries: int,
+        backoff: float,
+        deadline: float,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.deadline = deadline
+        self._sleep = sleep
+        self._clock = clock
+        self._stats = LockWaitStats()
+
+    async def run(self, operation: Callable[[], Awaitable[T]]) -> T:
+        started = self._clock()
+        attempt = 0
+        while True:
+            try:
+                result = await operation()
+            except DBAPIError as db_err:
+                if not is_lock_not_available(db_err):
+                    raise
+                self._stats.lock_conflicts += 1
+
+                elapsed = self._clock() - started
+                if attempt >= self.retries or elapsed >= self.deadline:
+                    self._stats.exhausted += 1
+                    self._record_wait(elapsed)
+                    raise
+                delay = min(random.uniform(0, self.backoff * 2**attempt), self.deadline - elapsed)
+                attempt += 1
+                self._stats.retries += 1
+                await self._sleep(delay)
+            else:
+                if attempt:
+                    self._record_wait(self._clock() - started)
+                return result
+
+    def _record_wait(self, seconds: float) -> None:
+        self._stats.waited_requests += 1
+        self._stats.wait_seconds_total += seconds
+        self._stats.wait_seconds_max = max(self._stats.wait_seconds_max, seconds)
+
+    def stats(self) -> LockWaitStats:
+        return replace(self._stats)
+
+
+lock_retry_policy = LockRetryPolicy(
+    retries=lock_settings.LOCK_RETRIES,
+    backoff=lock_settings.LOCK_RETRY_BACKOFF_MS / 1000,
+    deadline=lock_settings.LOCK_RETRY_DEADLINE_MS / 1000,
+)
@@ -2,9 +2,12 @@ from datetime import datetime
 from enum import Enum
 from typing import List
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String, UniqueConstraint, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
+# Largest value of the Integer columns, INTEGER is 32 bit on PostgreSQL
+MAX_INTEGER = 2**31 - 1
+
 
 class ReservationStatus(str, Enum):
     PENDING = "pending"
@@ -12,6 +15,12 @@ class ReservationStatus(str, Enum):
     CANCELLED = "cancelled"
 
 
+class OutboxEventType(str, Enum):
+    RESERVATION_UPDATED = "reservation.updated"
+    RESERVATION_CONFIRMED = "reservation.confirmed"
+    RESERVATION_CANCELLED = "reservation.cancelled"
+
+
 class Base(DeclarativeBase):
     pass
 
@@ -30,11 +39,17 @@ class ProductReservation(Base):
         nullable=False,
     )
 
-    reservation: Mapped["Reservation"] = relationship(lazy="selectin")
-    product: Mapped["Product"] = relationship(lazy="selectin")
+    # Relationships are never loaded implicitly, queries that need them have to ask for them
+    # with loader options (e.g. joinedload), otherwise access raises an error
+    reservation: Mapped["Reservation"] = relationship(
+        back_populates="product_reservations", lazy="raise"
+    )
+    product: Mapped["Product"] = relationship(back_populates="product_reservations", lazy="raise")
 
     __table_args__ = (
         UniqueConstraint("reservation_id", "product_id", name="uq_reservation_product"),
+        # Lines of a product, the unique constraint only serves lookups by reservation
+        Index("ix_products_reservations_product_id", "product_id"),
     )
 
 
@@ -44,7 +59,19 @@ class Reservation(Base):
     status: Mapped[ReservationStatus] = mapped_column(String, nullable=False)
 
     product_reservations: Mapped[List["ProductReservation"]] = relationship(
-        back_populates="reservation", lazy="selectin"
+        back_populates="reservation", lazy="raise"
+    )
+
+    __table_args__ = (
+        # Only pending reservations are scanned by status (expiry, cancellation), and they are
+        # a small share of all reservations. The planner uses the index only for queries that
+        # compare the status with the literal 'pending', see `crud.IS_PENDING`.
+        Index(
+            "ix_reservations_pending",
+            "id",
+            postgresql_where=text("status = 'pending'"),
+            sqlite_where=text("status = 'pending'"),
+        ),
     )
 
 
@@ -54,7 +81,58 @@ class Product(Base):
     name: Mapped[str] = mapped_column(String)
     price: Mapped[int] = mapped_column(Integer)
     quantity: Mapped[int] = mapped_column(Integer)
+    # Number of stock buckets the product stock is split into, 0 means all stock is kept
+    # in `quantity`. Available stock is always `quantity` plus the sum of all buckets.
+    stock_buckets: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
 
     product_reservations: Mapped[List["ProductReservation"]] = relationship(
-        back_populates="product", lazy="selectin"
+        back_populates="product", lazy="raise"
+    )
+
+
+class ProductStockBucket(Base):
+    __tablename__ = "product_stock_buckets"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    product_id: Mapped[int] = mapped_column(Integer, ForeignKey("products.id"), nullable=False)
+    bucket: Mapped[int] = mapped_column(Integer, nullable=False)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    __table_args__ = (UniqueConstraint("product_id", "bucket", name="uq_product_bucket"),)
+
+
+class IdempotencyKey(Base):
+    """
+    First successful response to a request sent with an `Idempotency-Key` header,
+    written in the same transaction as the reservation it answers.
+    """
+
+    __tablename__ = "idempotency_keys"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    # Hash of the request body, a key can only be repeated with the same request
+    request_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    status_code: Mapped[int] = mapped_column(Integer, nullable=False)
+    response: Mapped[str] = mapped_column(String, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
     )
+
+
+class OutboxEvent(Base):
+    """
+    Change of a reservation, written in the same transaction as the change and deleted
+    once the outbox relay delivered it.
+    """
+
+    __tablename__ = "outbox_events"
+
+    # Events are claimed in ID order, consumers use the ID to drop redelivered events
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    event_type: Mapped[OutboxEventType] = mapped_column(String(64), nullable=False)
+    reservation_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    # JSON object with the data of the event
+    payload: Mapped[str] = mapped_column(String, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
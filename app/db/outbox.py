@@ -0,0 +1,221 @@
+import asyncio
+import json
+import os
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Protocol, Sequence, Tuple
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.db.crud import add_outbox_events, claim_outbox_events, delete_outbox_events
+from app.db.models import OutboxEvent, OutboxEventType, ReservationStatus
+from app.db.setup import async_session_factory
+from app.utils.logging import logger
+from settings import outbox_settings
+
+
+async def record_events(
+    event_type: OutboxEventType, events: Iterable[Tuple[int, Dict]], session: AsyncSession
+) -> None:
+    """
+    Adds events to the outbox in the transaction of the session, `events` are pairs of
+    reservation ID and event data. Does nothing while the outbox is disabled.
+    """
+    if not outbox_settings.OUTBOX_ENABLED:
+        return
+    created_at = datetime.now(timezone.utc)
+    await add_outbox_events(
+        [
+            {
+                "event_type": event_type.value,
+                "reservation_id": reservation_id,
+                "payload": json.dumps(data, default=str),
+                "created_at": created_at,
+            }
+            for reservation_id, data in events
+        ],
+        session,
+    )
+
+
+def cancellation_events(
+    reservation_ids: Sequence[int], reason: str
+) -> List[Tuple[int, Dict]]:
+    """
+    Events of cancelled reservations for `record_events`, the reason is "cancelled"
+    for cancellations by clients and "expired" for the expiry sweeper.
+    """
+    data = {"status": ReservationStatus.CANCELLED.value, "reason": reason}
+    return [(reservation_id, data) for reservation_id in reservation_ids]
+
+
+def _created_at(event: OutboxEvent) -> datetime:
+    # SQLite returns naive datetimes, they are stored in UTC
+    if event.created_at.tzinfo is None:
+        return event.created_at.replace(tzinfo=timezone.utc)
+    return event.created_at
+
+
+def _to_ndjson(events: Sequence[OutboxEvent]) -> bytes:
+    """
+    Serialises the events as newline-delimited JSON, one object per line.
+    """
+    return b"".join(
+        b'{"id":%d,"type":%s,"reservation_id":%d,"created_at":%s,"data":%s}\n'
+        % (
+            event.id,
+            json.dumps(OutboxEventType(event.event_type).value).encode(),
+            event.reservation_id,
+            json.dumps(_created_at(event).isoformat()).encode(),
+            # Payloads are stored as JSON already
+            event.payload.encode(),
+        )
+        for event in events
+    )
+
+
+class OutboxSink(Protocol):
+    async def publish(self, body: bytes) -> None:
+        """
+        Delivers a batch of events serialised as NDJSON, raises if it was not delivered.
+        """
+
+    async def close(self) -> None: ...
+
+
+class FileSink:
+    """
+    Appends the events to an NDJSON file, every batch is synced to disk before
+    the events are deleted from the outbox.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def publish(self, body: bytes) -> None:
+        await asyncio.to_thread(self._append, body)
+
+    def _append(self, body: bytes) -> None:
+        with open(self.path, "ab") as file:
+            file.write(body)
+            file.flush()
+            os.fsync(file.fileno())
+
+    async def close(self) -> None:
+        pass
+
+
+class WebhookSink:
+    """
+    POSTs every batch as an `application/x-ndjson` body, any response other than 2xx
+    fails the batch. Connections are kept alive between batches.
+    """
+
+    def __init__(self, url: str, timeout: float, client: Optional[httpx.AsyncClient] = None):
+        self.url = url
+        self._client = client or httpx.AsyncClient(timeout=timeout)
+
+    async def publish(self, body: bytes) -> None:
+        response = await self._client.post(
+            self.url, content=body, headers={"Content-Type": "application/x-ndjson"}
+        )
+        response.raise_for_status()
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+@dataclass
+class RelayStats:
+    batches: int = 0
+    failed_runs: int = 0
+    published: int = 0
+    # Seconds from writing to delivering the oldest event of the last batch,
+    # 0 after a relay run found the outbox empty
+    lag_seconds: float = 0.0
+
+
+class OutboxRelay:
+    """
+    Delivers outbox events to the sink in batches and deletes them in the transaction that
+    claimed them. Events are delivered at least once: a batch whose deletion fails after
+    it was delivered is delivered again.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        sink: OutboxSink,
+        batch_size: int,
+        interval: float,
+    ):
+        self.session_factory = session_factory
+        self.sink = sink
+        self.batch_size = batch_size
+        self.interval = interval
+        self._stats = RelayStats()
+
+    async def relay(self) -> int:
+        """
+        Delivers batches until the outbox is empty, one batch per transaction.
+
+        Returns:
+            int: Number of delivered events.
+        """
+        published = 0
+        while True:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    events = await claim_outbox_events(self.batch_size, session)
+                    if events:
+                        await self.sink.publish(_to_ndjson(events))
+                        await delete_outbox_events([event.id for event in events], session)
+
+            if not events:
+                self._stats.lag_seconds = 0.0
+                return published
+            self._stats.batches += 1
+            self._stats.published += len(events)
+            self._stats.lag_seconds = (
+                datetime.now(timezone.utc) - min(_created_at(event) for event in events)
+            ).total_seconds()
+            published += len(events)
+            if len(events) < self.batch_size:
+                return published
+
+    async def run(self) -> None:
+        """
+        Drains the outbox every `interval` seconds until the task is cancelled.
+        """
+        while True:
+            try:
+                published = await self.relay()
+            except Exception:
+                self._stats.failed_runs += 1
+                logger.exception("Outbox relay failed")
+            else:
+                if published:
+                    logger.info("Outbox relay delivered %s events", published)
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> RelayStats:
+        return replace(self._stats)
+
+
+def _create_sink() -> OutboxSink:
+    if outbox_settings.OUTBOX_SINK == "webhook":
+        if not outbox_settings.OUTBOX_WEBHOOK_URL:
+            raise ValueError("OUTBOX_WEBHOOK_URL is required for the webhook outbox sink")
+        return WebhookSink(
+            outbox_settings.OUTBOX_WEBHOOK_URL, outbox_settings.OUTBOX_WEBHOOK_TIMEOUT_SECONDS
+        )
+    return FileSink(outbox_settings.OUTBOX_FILE_PATH)
+
+
+outbox_relay = OutboxRelay(
+    async_session_factory,
+    _create_sink(),
+    batch_size=outbox_settings.OUTBOX_BATCH_SIZE,
+    interval=outbox_settings.OUTBOX_RELAY_INTERVAL_SECONDS,
+)
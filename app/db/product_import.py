@@ -0,0 +1,113 @@
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.crud import sync_product_id_sequence, upsert_products
+from app.db.locking import is_lock_not_available, lock_retry_policy
+from app.db.models import MAX_INTEGER
+from app.utils.dto import ProductImportRow
+from app.utils.parsers import Record
+
+QUANTITY_OVERFLOW = f"Quantity would make the stock exceed {MAX_INTEGER}"
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    imported: int = 0
+    failed: int = 0
+    # Line number and reason of the first `max_errors` failed rows
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+
+class ProductImport:
+    """
+    Upserts parsed product rows in chunks of `chunk_size`, every chunk with one statement in
+    its own transaction, so only the products of the current chunk are locked and at most
+    one chunk is held in memory. Rows that can not be imported are counted and reported,
+    the other rows are imported anyway.
+    """
+
+    def __init__(
+        self, session: AsyncSession, add_quantity: bool, chunk_size: int, max_errors: int
+    ):
+        self.session = session
+        self.add_quantity = add_quantity
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.result = ImportResult()
+        # Product ID -> line number and row, a repeated product replaces its row,
+        # or adds its quantity with `add_quantity`
+        self._chunk: Dict[int, Tuple[int, Dict]] = {}
+
+    async def run(self, records: AsyncIterator[Record]) -> ImportResult:
+        async for line_number, record in records:
+            self.result.rows += 1
+            if isinstance(record, ValueError):
+                self._fail(line_number, str(record))
+                continue
+            try:
+                row = ProductImportRow.model_validate(record)
+            except ValidationError as exc:
+                error = exc.errors()[0]
+                location = ".".join(str(part) for part in error["loc"])
+                self._fail(line_number, f"{location}: {error['msg']}")
+                continue
+
+            previous = self._chunk.get(row.product_id)
+            quantity = row.quantity
+            if previous and self.add_quantity:
+                quantity += previous[1]["quantity"]
+                if quantity > MAX_INTEGER:
+                    self._fail(line_number, QUANTITY_OVERFLOW)
+                    continue
+            self._chunk[row.product_id] = (
+                line_number,
+                {"id": row.product_id, "name": row.name, "price": row.price, "quantity": quantity},
+            )
+            if len(self._chunk) >= self.chunk_size:
+                await self._flush()
+
+        await self._flush()
+        if self.result.imported:
+            async with self.session.begin():
+                await sync_product_id_sequence(self.session)
+        return self.result
+
+    async def _flush(self) -> None:
+        chunk, self._chunk = self._chunk, {}
+        if not chunk:
+            return
+
+        async def upsert() -> List[int]:
+            async with self.session.begin():
+                return await upsert_products(
+                    [row for _, row in chunk.values()], self.add_quantity, self.session
+                )
+
+        try:
+            imported = set(await lock_retry_policy.run(upsert))
+        except DBAPIError as db_err:
+            if not is_lock_not_available(db_err):
+                raise db_err
+            for line_number, _ in chunk.values():
+                self._fail(line_number, "Product is locked by another transaction")
+            return
+
+        self.result.imported += len(imported)
+        message = (
+            QUANTITY_OVERFLOW
+            if self.add_quantity
+            else "Product keeps its stock in buckets, import it with mode=add"
+        )
+        for product_id, (line_number, _) in chunk.items():
+            if product_id not in imported:
+                self._fail(line_number, message)
+
+    def _fail(self, line_number: int, message: str) -> None:
+        self.result.failed += 1
+        if len(self.result.errors) < self.max_errors:
+            self.result.errors.append((line_number, message))
@@ -1,47 +1,274 @@
+"""
+Synthetic data generator for benchmarks and query plan tests.
+
+Generates products, reservations and their lines and inserts them with bulk Core inserts,
+`--chunk-size` rows per statement and one transaction per chunk, so the data is never held
+in memory as a whole. Products of reservation lines are picked uniformly or with a Zipf
+distribution over a shuffled popularity order. Line dates are spread over `--days` days
+before `--end-date`, lines of pending reservations over the last `--pending-max-age`
+seconds, so the expiry sweeper does not cancel them right after seeding. The output only
+depends on the arguments, the same `--seed` and `--end-date` always generate the same rows.
+Nothing is inserted if the database already has products, without arguments a small
+initial data set dated now is created:
+
+    python -m app.db.seed
+    python -m app.db.seed --products 100000 --reservations 5000000 --skew zipf
+    python -m app.db.seed --db-url sqlite+aiosqlite:///bench.db --create-tables --products 1000
+    python -m app.db.seed --end-date 2025-01-01T00:00:00+00:00 --reservations 1000
+"""
+
+import argparse
 import asyncio
-from datetime import datetime
+import bisect
+import itertools
+import random
+import time
+from dataclasses import dataclass, fields
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Table, func, select
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 
-from sqlalchemy import select
+from app.db.models import Base, Product, ProductReservation, Reservation, ReservationStatus
+from settings import db_settings
 
-from app.db.models import Product, ProductReservation, Reservation
-from app.db.setup import async_session_factory
+@dataclass
+class SeedConfig:
+    products: int = 3
+    reservations: int = 1
+    lines_per_reservation: int = 1
+    skew: str = "uniform"
+    zipf_exponent: float = 1.1
+    stock: int = 1_000
+    max_price: int = 1_000
+    max_quantity: int = 3
+    pending_ratio: float = 0.1
+    cancelled_ratio: float = 0.2
+    days: int = 30
+    pending_max_age: int = 60
+    # Date of the newest lines, the current time if not set
+    end_date: Optional[datetime] = None
+    seed: int = 1
+    chunk_size: int = 10_000
 
 
-async def seed_data():
+class ProductPicker:
     """
-    Creates initial data if it doesn't exist id DB.
-    NB! Use only if db already created with alembic
+    Picks distinct product IDs for reservation lines. With Zipf skew the product of rank r
+    is picked with probability proportional to 1 / r ** exponent, ranks are assigned to a
+    shuffled order of the products, so hot products are spread over the ID range.
     """
-    async with async_session_factory() as session:
-        result = await session.execute(select(Product).limit(1))
-        product = result.scalars().first()
 
-        if product is not None:
-            print("Data already exists. No seeding required.")
-            return
+    def __init__(self, config: SeedConfig, rng: random.Random):
+        self.products = config.products
+        self.rng = rng
+        self.ranked_ids: Optional[List[int]] = None
+        self.cum_weights: List[float] = []
+        if config.skew == "zipf":
+            self.ranked_ids = list(range(1, config.products + 1))
+            rng.shuffle(self.ranked_ids)
+            self.cum_weights = list(
+                itertools.accumulate(
+                    1 / rank**config.zipf_exponent for rank in range(1, config.products + 1)
+                )
+            )
+
+    def pick(self) -> int:
+        if self.ranked_ids is None:
+            return 1 + int(self.rng.random() * self.products)
+        point = self.rng.random() * self.cum_weights[-1]
+        return self.ranked_ids[bisect.bisect_right(self.cum_weights, point, hi=self.products - 1)]
+
+    def basket(self, size: int) -> List[int]:
+        """
+        Returns `size` distinct product IDs.
+        """
+        size = min(size, self.products)
+        basket: Dict[int, None] = {}
+        while len(basket) < size:
+            basket[self.pick()] = None
+        return list(basket)
+
+
+def generate_products(config: SeedConfig, rng: random.Random) -> Iterator[Dict]:
+    for product_id in range(1, config.products + 1):
+        yield {
+            "id": product_id,
+            "name": f"Product {product_id}",
+            "price": 1 + int(rng.random() * config.max_price),
+            "quantity": config.stock,
+        }
 
-        print("Seeding initial data...")
 
-        products = [
-            Product(name="Product 1", price=100, quantity=10),
-            Product(name="Product 2", price=200, quantity=5),
-            Product(name="Product 3", price=300, quantity=15),
+def generate_reservations(
+    config: SeedConfig, rng: random.Random
+) -> Iterator[Tuple[Dict, List[Dict]]]:
+    """
+    Yields every reservation with its lines, all lines of a reservation have the same date.
+    Random integers are drawn from `rng.random()`, `randint` would take most of the time.
+    """
+    picker = ProductPicker(config, rng)
+    end_date = config.end_date or datetime.now(timezone.utc)
+    span_seconds = config.days * 24 * 60 * 60
+    for reservation_id in range(1, config.reservations + 1):
+        draw = rng.random()
+        if draw < config.pending_ratio:
+            status = ReservationStatus.PENDING
+        elif draw < config.pending_ratio + config.cancelled_ratio:
+            status = ReservationStatus.CANCELLED
+        else:
+            status = ReservationStatus.CONFIRMED
+        age = config.pending_max_age if status == ReservationStatus.PENDING else span_seconds
+        date = end_date - timedelta(seconds=int(rng.random() * age))
+        lines = [
+            {
+                "reservation_id": reservation_id,
+                "product_id": product_id,
+                "reservation_quantity": 1 + int(rng.random() * config.max_quantity),
+                "date": date,
+            }
+            for product_id in picker.basket(config.lines_per_reservation)
         ]
-        reservation = Reservation(status="pending")
-        products_reservation = ProductReservation(
-            reservation=reservation,
-            product=products[0],
-            reservation_quantity=1,
-            date=datetime.now(),
-        )
+        yield {"id": reservation_id, "status": status.value}, lines
+
+
+def chunks(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+async def insert_products(engine: AsyncEngine, config: SeedConfig, rng: random.Random) -> int:
+    table: Table = Product.__table__
+    inserted = 0
+    for chunk in chunks(generate_products(config, rng), config.chunk_size):
+        async with engine.begin() as connection:
+            await connection.execute(table.insert(), chunk)
+        inserted += len(chunk)
+    return inserted
+
+
+async def insert_reservations(
+    engine: AsyncEngine, config: SeedConfig, rng: random.Random
+) -> Tuple[int, int]:
+    """
+    Inserts reservations together with their lines, a chunk holds about `chunk_size` lines.
+    """
+    reservations_table: Table = Reservation.__table__
+    lines_table: Table = ProductReservation.__table__
+    per_chunk = max(1, config.chunk_size // max(1, config.lines_per_reservation))
+    reservations = lines = 0
+    for chunk in chunks(generate_reservations(config, rng), per_chunk):
+        reservation_rows = [reservation for reservation, _ in chunk]
+        line_rows = [line for _, reservation_lines in chunk for line in reservation_lines]
+        async with engine.begin() as connection:
+            await connection.execute(reservations_table.insert(), reservation_rows)
+            if line_rows:
+                await connection.execute(lines_table.insert(), line_rows)
+        reservations += len(reservation_rows)
+        lines += len(line_rows)
+    return reservations, lines
+
+
+async def sync_id_sequences(engine: AsyncEngine) -> None:
+    """
+    Moves the PostgreSQL ID sequences past the explicitly inserted IDs.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    async with engine.begin() as connection:
+        for table in (Product.__table__, Reservation.__table__):
+            await connection.execute(
+                select(
+                    func.setval(
+                        func.pg_get_serial_sequence(table.name, "id"),
+                        select(func.coalesce(func.max(table.c.id), 1)).scalar_subquery(),
+                    )
+                )
+            )
+
+
+async def seed_data(config: SeedConfig, engine: AsyncEngine) -> bool:
+    """
+    Creates the synthetic data if the DB has no products yet, returns whether it did.
+    NB! The tables have to exist, create them with alembic
+    """
+    async with engine.connect() as connection:
+        existing = await connection.scalar(select(Product.id).limit(1))
+    if existing is not None:
+        print("Data already exists. No seeding required.")
+        return False
+
+    print(
+        f"Seeding {config.products} products and {config.reservations} reservations "
+        f"with {config.lines_per_reservation} lines each..."
+    )
+    rng = random.Random(config.seed)
+    started = time.perf_counter()
+    products = await insert_products(engine, config, rng)
+    reservations, lines = await insert_reservations(engine, config, rng)
+    await sync_id_sequences(engine)
+    seconds = time.perf_counter() - started
+    print(
+        f"Seeding completed: {products} products, {reservations} reservations and {lines} lines "
+        f"in {seconds:.1f}s ({(products + reservations + lines) / max(seconds, 1e-9):.0f} rows/s)."
+    )
+    return True
+
+
+def parse_date(value: str) -> datetime:
+    """
+    Parses an ISO 8601 date, dates without a time zone are UTC.
+    """
+    date = datetime.fromisoformat(value)
+    return date if date.tzinfo else date.replace(tzinfo=timezone.utc)
+
 
-        session.add_all([*products, reservation, products_reservation])
-        await session.commit()
-        print("Seeding completed.")
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    defaults = SeedConfig()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db-url", default=db_settings.DB_URL)
+    parser.add_argument("--create-tables", action="store_true", help="Create missing tables")
+    parser.add_argument("--products", type=int, default=defaults.products)
+    parser.add_argument("--reservations", type=int, default=defaults.reservations)
+    parser.add_argument(
+        "--lines-per-reservation", type=int, default=defaults.lines_per_reservation
+    )
+    parser.add_argument("--skew", choices=("uniform", "zipf"), default=defaults.skew)
+    parser.add_argument("--zipf-exponent", type=float, default=defaults.zipf_exponent)
+    parser.add_argument("--stock", type=int, default=defaults.stock)
+    parser.add_argument("--max-price", type=int, default=defaults.max_price)
+    parser.add_argument("--max-quantity", type=int, default=defaults.max_quantity)
+    parser.add_argument("--pending-ratio", type=float, default=defaults.pending_ratio)
+    parser.add_argument("--cancelled-ratio", type=float, default=defaults.cancelled_ratio)
+    parser.add_argument("--days", type=int, default=defaults.days, help="Spread of line dates")
+    parser.add_argument(
+        "--pending-max-age",
+        type=int,
+        default=defaults.pending_max_age,
+        help="Spread of line dates of pending reservations in seconds",
+    )
+    parser.add_argument("--end-date", type=parse_date, help="Date of the newest lines")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--chunk-size", type=int, default=defaults.chunk_size)
+    args = parser.parse_args(argv)
+    if args.products < 1 and args.reservations:
+        parser.error("--reservations needs at least one product")
+    return args
 
 
-async def main():
-    await seed_data()
+async def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    config = SeedConfig(**{field.name: getattr(args, field.name) for field in fields(SeedConfig)})
+    engine = create_async_engine(args.db_url, echo=False)
+    try:
+        if args.create_tables:
+            async with engine.begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+        await seed_data(config, engine)
+    finally:
+        await engine.dispose()
 
 
 if __name__ == "__main__":
@@ -1,9 +1,68 @@
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from settings import DBSettings, LockSettings, db_settings, lock_settings
+
+
+def _prepared_statement_name() -> str:
+    return f"__asyncpg_{uuid4()}__"
+
+
+def engine_options(db: DBSettings, lock: LockSettings) -> Dict[str, Any]:
+    """
+    Builds the `create_async_engine` keyword arguments for the pool and asyncpg settings.
+    """
+    if db.DB_PGBOUNCER_MODE:
+        # PgBouncer pools the connections, prepared statements must not outlive a transaction
+        return {
+            "poolclass": NullPool,
+            "connect_args": {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": _prepared_statement_name,
+            },
+        }
+
+    connect_args: Dict[str, Any] = {
+        "statement_cache_size": db.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": db.DB_PREPARED_STATEMENT_CACHE_SIZE,
+    }
+    if lock.LOCK_TIMEOUT_MS:
+        # Row locks are waited for up to the timeout instead of failing at once with NOWAIT
+        connect_args["server_settings"] = {"lock_timeout": str(lock.LOCK_TIMEOUT_MS)}
 
-from settings import db_settings
+    return {
+        "pool_size": db.DB_POOL_SIZE,
+        "max_overflow": db.DB_MAX_OVERFLOW,
+        "pool_timeout": db.DB_POOL_TIMEOUT,
+        "pool_recycle": db.DB_POOL_RECYCLE,
+        "pool_pre_ping": db.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
 
-async_engine = create_async_engine(db_settings.DB_URL, echo=False)
+
+async_engine = create_async_engine(
+    db_settings.DB_URL, echo=False, **engine_options(db_settings, lock_settings)
+)
 
 async_session_factory = async_sessionmaker(
     async_engine, class_=AsyncSession, expire_on_commit=False
 )
+
+# Read-only endpoints use the replica when it is configured, otherwise the primary
+replica_engine = (
+    create_async_engine(
+        db_settings.DB_REPLICA_URL, echo=False, **engine_options(db_settings, lock_settings)
+    )
+    if db_settings.DB_REPLICA_URL
+    else None
+)
+
+replica_session_factory: Optional[async_sessionmaker[AsyncSession]] = (
+    async_sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+    if replica_engine is not None
+    else None
+)
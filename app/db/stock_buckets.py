@@ -0,0 +1,91 @@
+import asyncio
+from dataclasses import dataclass, replace
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.db.crud import get_unbalanced_bucketed_products, rebalance_stock_buckets
+from app.db.locking import is_lock_not_available
+from app.db.setup import async_session_factory
+from app.utils.logging import logger
+from settings import reservation_settings
+
+
+@dataclass
+class RebalanceStats:
+    runs: int = 0
+    failed_runs: int = 0
+    # Products whose stock was spread over their buckets again
+    rebalanced: int = 0
+
+
+class StockBucketRebalancer:
+    """
+    Spreads the stock of bucketed products evenly over their buckets again when stock was
+    returned to the product row, where reservations do not take it from, or when a bucket
+    ran empty. Every product is rebalanced in its own transaction, so its bucket rows are
+    locked only briefly.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        batch_size: int,
+        interval: float,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.interval = interval
+        self._stats = RebalanceStats()
+
+    async def rebalance(self) -> int:
+        """
+        Rebalances up to `batch_size` products, products locked by another transaction
+        are left for the next run.
+
+        Returns:
+            int: Number of rebalanced products.
+        """
+        async with self.session_factory() as session:
+            async with session.begin():
+                product_ids = await get_unbalanced_bucketed_products(self.batch_size, session)
+
+        rebalanced = 0
+        for product_id in product_ids:
+            try:
+                async with self.session_factory() as session:
+                    async with session.begin():
+                        if await rebalance_stock_buckets(product_id, session) is not None:
+                            rebalanced += 1
+            except DBAPIError as db_err:
+                if not is_lock_not_available(db_err):
+                    raise
+                logger.info("Stock buckets of product %s are locked, retrying next run", product_id)
+        return rebalanced
+
+    async def run(self) -> None:
+        """
+        Rebalances every `interval` seconds until the task is cancelled.
+        """
+        while True:
+            try:
+                rebalanced = await self.rebalance()
+            except Exception:
+                self._stats.failed_runs += 1
+                logger.exception("Stock bucket rebalance failed")
+            else:
+                self._stats.runs += 1
+                self._stats.rebalanced += rebalanced
+                if rebalanced:
+                    logger.info("Rebalanced the stock buckets of %s products", rebalanced)
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> RebalanceStats:
+        return replace(self._stats)
+
+
+stock_bucket_rebalancer = StockBucketRebalancer(
+    async_session_factory,
+    batch_size=reservation_settings.STOCK_BUCKET_REBALANCE_BATCH_SIZE,
+    interval=reservation_settings.STOCK_BUCKET_REBALANCE_INTERVAL_SECONDS,
+)
@@ -1,6 +1,23 @@
-from app.db.setup import async_session_factory
+from app.db.setup import async_session_factory, replica_session_factory
+from app.utils.metrics import metrics
 
 
 async def get_db_session():
-    async with async_session_factory() as session:
-        yield session
+    metrics.inc_gauge("db_sessions_in_flight")
+    try:
+        async with async_session_factory() as session:
+            yield session
+    finally:
+        metrics.inc_gauge("db_sessions_in_flight", value=-1)
+
+
+async def get_db_read_session():
+    """
+    Session for read-only endpoints, it uses the replica when one is configured.
+    """
+    metrics.inc_gauge("db_sessions_in_flight")
+    try:
+        async with (replica_session_factory or async_session_factory)() as session:
+            yield session
+    finally:
+        metrics.inc_gauge("db_sessions_in_flight", value=-1)
@@ -1,77 +1,192 @@
-from typing import Callable
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Iterable, List
 
 import uvicorn
-from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.responses import JSONResponse
-
-from app.routes import reservation_router
+from sqlalchemy.pool import QueuePool
+
+from app.db.availability import stock_snapshot
+from app.db.expiry import expiry_sweeper
+from app.db.idempotency import idempotency_key_cleaner
+from app.db.locking import lock_retry_policy
+from app.db.outbox import outbox_relay
+from app.db.setup import async_engine
+from app.db.stock_buckets import stock_bucket_rebalancer
+from app.middleware import LoggingMiddleware
+from app.routes import product_router, reservation_router
 from app.utils.exceptions import ReservationException
-from app.utils.logging import logger
-from settings import backend_settings
+from app.utils.cache import reservation_status_cache
+from app.utils.logging import NonBlockingQueueHandler, logger
+from app.utils.metrics import METRICS_CONTENT_TYPE, Sample, metrics
+from app.utils.responses import DefaultResponse
+from app.utils.subscriptions import reservation_status_subscriptions
+from settings import (
+    availability_settings,
+    backend_settings,
+    expiry_settings,
+    idempotency_settings,
+    logging_settings,
+    metrics_settings,
+    outbox_settings,
+    reservation_settings,
+)
+
+
+def collect_service_stats() -> Iterable[Sample]:
+    """
+    Reads the stats of the connection pool, the status cache, the status subscriptions,
+    the lock retry policy, the expiry sweeper, the idempotency key cleaner, the stock snapshot,
+    the stock bucket rebalancer, the outbox relay and the log writer.
+    """
+    pool = async_engine.pool
+    # Pools without connection limits, e.g. the one used by SQLite, have no size
+    if isinstance(pool, QueuePool):
+        yield "db_pool_size", (), pool.size()
+        yield "db_pool_checked_out", (), pool.checkedout()
+        yield "db_pool_overflow", (), max(pool.overflow(), 0)
+
+    cache_stats = reservation_status_cache.stats()
+    yield "status_cache_size", (), cache_stats.size
+    for event in ("hits", "misses", "evictions", "expirations"):
+        yield "status_cache_events_total", (("event", event),), getattr(cache_stats, event)
+
+    subscription_stats = reservation_status_subscriptions.stats()
+    yield "status_waiters", (), subscription_stats.subscriptions
+    yield "status_waiter_wakeups_total", (), subscription_stats.wakeups
+    yield "status_waiters_rejected_total", (), subscription_stats.rejected
+
+    lock_stats = lock_retry_policy.stats()
+    yield "lock_conflicts_total", (), lock_stats.lock_conflicts
+    yield "lock_retries_total", (), lock_stats.retries
+    yield "lock_retries_exhausted_total", (), lock_stats.exhausted
+    yield "lock_waited_requests_total", (), lock_stats.waited_requests
+    yield "lock_wait_seconds_total", (), lock_stats.wait_seconds_total
+    yield "lock_wait_seconds_max", (), lock_stats.wait_seconds_max
+
+    sweeper_stats = expiry_sweeper.stats()
+    yield "expired_reservations_total", (), sweeper_stats.reservations
+    yield "expiry_sweeps_failed_total", (), sweeper_stats.failed_sweeps
+    yield "expiry_batches_skipped_total", (), sweeper_stats.skipped_batches
+
+    yield "idempotency_keys_deleted_total", (), idempotency_key_cleaner.stats().deleted
+
+    snapshot_stats = stock_snapshot.stats()
+    yield "stock_snapshot_refreshes_total", (), snapshot_stats.refreshes
+    yield "stock_snapshot_refreshes_failed_total", (), snapshot_stats.failed_refreshes
+    snapshot_age = stock_snapshot.age()
+    if snapshot_age is not None:
+        yield "stock_snapshot_age_seconds", (), snapshot_age
+
+    rebalance_stats = stock_bucket_rebalancer.stats()
+    yield "stock_buckets_rebalanced_total", (), rebalance_stats.rebalanced
+    yield "stock_bucket_rebalances_failed_total", (), rebalance_stats.failed_runs
+
+    relay_stats = outbox_relay.stats()
+    yield "outbox_events_published_total", (), relay_stats.published
+    yield "outbox_batches_total", (), relay_stats.batches
+    yield "outbox_relay_runs_failed_total", (), relay_stats.failed_runs
+    yield "outbox_lag_seconds", (), relay_stats.lag_seconds
+
+    yield "log_records_dropped_total", (), sum(
+        handler.dropped
+        for handler in logger.handlers
+        if isinstance(handler, NonBlockingQueueHandler)
+    )
+
+
+async def write_metrics_snapshots() -> None:
+    while True:
+        await asyncio.sleep(metrics_settings.METRICS_FLUSH_INTERVAL_SECONDS)
+        try:
+            metrics.write_snapshot()
+        except OSError:
+            logger.exception("Writing metrics snapshot failed")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts the background tasks of the worker and cancels them on shutdown.
+    """
+    tasks: List[asyncio.Task] = []
+    if expiry_settings.EXPIRY_SWEEPER_ENABLED:
+        tasks.append(asyncio.create_task(expiry_sweeper.run()))
+    if availability_settings.AVAILABILITY_REFRESH_ENABLED:
+        tasks.append(asyncio.create_task(stock_snapshot.run()))
+    if reservation_settings.STOCK_BUCKET_REBALANCE_ENABLED:
+        tasks.append(asyncio.create_task(stock_bucket_rebalancer.run()))
+    if idempotency_settings.IDEMPOTENCY_CLEANUP_ENABLED:
+        tasks.append(asyncio.create_task(idempotency_key_cleaner.run()))
+    if outbox_settings.OUTBOX_ENABLED and outbox_settings.OUTBOX_RELAY_ENABLED:
+        tasks.append(asyncio.create_task(outbox_relay.run()))
+    if metrics_settings.METRICS_ENABLED and metrics.directory:
+        tasks.append(asyncio.create_task(write_metrics_snapshots()))
+
+    yield
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await outbox_relay.sink.close()
+
 
 app = FastAPI(
     title="Goods Reservation API",
     version="0.1.0",
     docs_url="/docs",
+    lifespan=lifespan,
+    default_response_class=DefaultResponse,
 )
 app.include_router(reservation_router)
+app.include_router(product_router)
+app.add_middleware(LoggingMiddleware, body_max_bytes=logging_settings.LOG_BODY_MAX_BYTES)
+metrics.add_callback(collect_service_stats)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """
+    Returns the metrics in the Prometheus text format.
+    """
+    if not metrics_settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(content=metrics.collect(), media_type=METRICS_CONTENT_TYPE)
 
 
 @app.exception_handler(ReservationException)
 async def reservation_exception_handler(request, exc: ReservationException):
     logger.error(
-        f"Reservation Exception: {exc.__class__.__name__} - "
-        f"Status Code: {exc.status_code} - "
-        f"Message: {exc.response.message} - "
-        f"Reservation ID: {exc.response.reservation_id}"
+        "Reservation Exception: %s - Status Code: %s - Message: %s - Reservation ID: %s",
+        exc.__class__.__name__,
+        exc.status_code,
+        exc.message,
+        exc.reservation_id,
+        # Bursts of the same exception, e.g. lock conflicts, are summarized
+        extra={"aggregate_key": exc.__class__.__name__},
+    )
+    metrics.inc("http_exceptions_total", (("exception", exc.__class__.__name__),))
+    # The body is rendered by the exception, most error bodies are serialised ahead of time
+    return Response(
+        content=exc.render(), status_code=exc.status_code, media_type="application/json"
     )
-    return JSONResponse(status_code=exc.status_code, content=exc.response.model_dump())
 
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc: HTTPException):
     logger.error(
-        f"HTTP Exception: Status {exc.status_code} - "
-        f"Detail: {exc.detail} - "
-        f"URL: {request.method} {request.url}"
+        "HTTP Exception: Status %s - Detail: %s - URL: %s %s",
+        exc.status_code,
+        exc.detail,
+        request.method,
+        request.url,
     )
     return JSONResponse(
         status_code=exc.status_code, content={"status": "error", "message": exc.detail}
     )
 
 
-@app.middleware("http")
-async def logging_middleware(request: Request, call_next: Callable) -> Response:
-    """
-    Logs the incoming request and outgoing response for the current HTTP request.
-
-    This middleware function is responsible for logging the details of the incoming HTTP request
-    and the outgoing HTTP response. It logs the request method, URL,
-    and the client's IP address and port. After the request is processed, it also logs the
-    response status code, request method, and URL.
-
-    """
-    log_message = (
-        f" - Request: {request.method} {request.url} - "
-        f"Client: {request.client.host}:{request.client.port}"  # type: ignore
-    )
-
-    # Additional logging for POST and PUT requests (not sure if it's right, because of sensitive data)
-    if request.method in ["POST", "PUT"]:
-        body = await request.body()
-        if body:
-            log_message += f" - Body: {body.decode('utf-8')}"
-
-    logger.info(log_message)
-    response = await call_next(request)
-
-    logger.info(
-        f"Response: Status {response.status_code} - Method: {request.method} - URL: {request.url}"
-    )
-
-    return response
-
-
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
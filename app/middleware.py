@@ -0,0 +1,99 @@
+import logging
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.logging import logger, truncate_body
+from app.utils.metrics import metrics
+
+
+class LoggingMiddleware:
+    """
+    Pure ASGI middleware that logs one line per HTTP request with the method, path, status,
+    duration and request and response sizes, and adds a `Server-Timing` header.
+    The duration and status are also recorded in the request metrics per route template.
+
+    Up to `body_max_bytes` of POST and PUT bodies are copied from the `receive` stream
+    while the application reads it, the body is never buffered by the middleware.
+    """
+
+    def __init__(self, app: ASGIApp, body_max_bytes: int = 0):
+        self.app = app
+        self.body_max_bytes = body_max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        method = scope["method"]
+        capture_body = (
+            self.body_max_bytes > 0
+            and method in ("POST", "PUT")
+            and logger.isEnabledFor(logging.INFO)
+        )
+        body_prefix = bytearray()
+        request_bytes = 0
+        response_bytes = 0
+        status_code = 500
+
+        async def receive_with_tee() -> Message:
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                request_bytes += len(chunk)
+                if capture_body and len(body_prefix) < self.body_max_bytes:
+                    body_prefix.extend(chunk[: self.body_max_bytes - len(body_prefix)])
+            return message
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code, response_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", f"app;dur={_elapsed_ms(started):.2f}")
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_with_tee, send_with_timing)
+        except Exception as exc:
+            metrics.inc("http_exceptions_total", (("exception", exc.__class__.__name__),))
+            raise
+        finally:
+            duration_ms = _elapsed_ms(started)
+            route = scope.get("route")
+            # Route templates keep the number of label values bounded, unlike raw paths
+            route_labels = (("method", method), ("route", route.path if route else "unmatched"))
+            metrics.inc("http_requests_total", route_labels + (("status", str(status_code)),))
+            metrics.observe("http_request_duration_seconds", route_labels, duration_ms / 1000)
+
+            if logger.isEnabledFor(logging.INFO):
+                client = scope.get("client")
+                logger.info(
+                    "Request: %s %s - Status %s - %.2fms",
+                    method,
+                    scope["path"],
+                    status_code,
+                    duration_ms,
+                    extra={
+                        "method": method,
+                        "path": scope["path"],
+                        "status_code": status_code,
+                        "duration_ms": round(duration_ms, 3),
+                        "request_bytes": request_bytes,
+                        "response_bytes": response_bytes,
+                        "client": f"{client[0]}:{client[1]}" if client else None,
+                        "body": truncate_body(bytes(body_prefix), request_bytes)
+                        if capture_body and request_bytes
+                        else None,
+                    },
+                )
+
+
+def _elapsed_ms(started: float) -> float:
+    return (time.perf_counter() - started) * 1000
@@ -1,44 +1,419 @@
-from typing import Annotated
+import asyncio
+import hashlib
+import random
+import time
+from datetime import datetime
+from typing import (
+    Annotated,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
-from asyncpg.exceptions import LockNotAvailableError
-from fastapi import APIRouter, Depends
-from sqlalchemy.exc import DBAPIError
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Row
+from sqlalchemy.exc import DBAPIError, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
 
 from app.db.crud import (
+    PRODUCT_RESERVATION_QUANTITY_ONLY,
+    PRODUCT_STOCK_ONLY,
+    RESERVATION_STATUS_ONLY,
     add_product_reservation,
+    add_product_reservations,
     add_reservation,
+    cancel_reservations,
     get_product,
     get_product_reservation,
+    get_product_reservations,
+    get_products,
+    get_products_availability,
     get_reservation,
+    get_reservation_details,
+    move_bucket_stock,
+    reserve_product,
+    set_stock_buckets,
+)
+from app.db.availability import stock_snapshot
+from app.db.idempotency import (
+    IdempotentRequest,
+    find_stored_response,
+    remember_response,
+    store_response,
+)
+from app.db.locking import is_lock_not_available, lock_retry_policy
+from app.db.models import OutboxEventType, Product, ProductReservation, ReservationStatus
+from app.db.outbox import cancellation_events, record_events
+from app.db.product_import import ProductImport
+from app.db.setup import async_session_factory, replica_session_factory
+from app.dependencies import get_db_read_session, get_db_session
+from app.utils.cache import MISSING, recent_reservation_writes, reservation_status_cache
+from app.utils.coalescing import RequestCoalescer
+from app.utils.dto import (
+    BatchCancelDTO,
+    BatchCancelResponse,
+    BatchReservationDTO,
+    BatchReservationResponse,
+    ProductAvailability,
+    ProductAvailabilityResponse,
+    ProductImportError,
+    ProductImportResponse,
+    ReservationDTO,
+    ReservationDetailsResponse,
+    ReservationItemResponse,
+    ReservationLineResponse,
+    ReservationResponse,
+    StockBucketsDTO,
+    StockBucketsResponse,
 )
-from app.db.models import ReservationStatus
-from app.dependencies import get_db_session
-from app.utils.dto import ReservationDTO, ReservationResponse
 from app.utils.exceptions import (
+    BatchReservationException,
+    IdempotencyKeyReusedException,
     NotEnoughProductsException,
     ProductIsReservedException,
     ProductNotFoundException,
     ReservationClosedException,
+    ReservationException,
     ReservationIsLockedException,
     ReservationNotFoundException,
 )
 from app.utils.logging import logger
+from app.utils.metrics import metrics
+from app.utils.parsers import iter_csv_records, iter_ndjson_records
+from app.utils.subscriptions import (
+    Subscription,
+    SubscriptionLimitError,
+    reservation_status_subscriptions,
+)
+from settings import (
+    availability_settings,
+    cache_settings,
+    import_settings,
+    reservation_settings,
+    status_push_settings,
+)
+
+T = TypeVar("T")
 
 reservation_router = APIRouter(prefix="/reservation", tags=["reservation"])
+product_router = APIRouter(prefix="/products", tags=["products"])
+
+
+def _remember_write(reservation_id: int, status: ReservationStatus) -> None:
+    """
+    Caches the new status of a changed reservation and reads it from the primary
+    for a while, so the client that changed it does not see a stale replica.
+    Requests waiting for a status change of the reservation are woken.
+    """
+    reservation_status_cache.set(reservation_id, status.value)
+    recent_reservation_writes.set(reservation_id, True)
+    reservation_status_subscriptions.publish(reservation_id, status.value)
+
+
+def _update_event(
+    reservation_id: int, quantities: Dict[int, int], timestamp: datetime
+) -> Tuple[int, Dict]:
+    """
+    Reservation ID and data of the `reservation.updated` outbox event of applied lines,
+    `quantities` maps product ID to the reserved quantity.
+    """
+    return reservation_id, {
+        "status": ReservationStatus.PENDING.value,
+        "lines": [
+            {"product_id": product_id, "quantity": quantity}
+            for product_id, quantity in quantities.items()
+        ],
+        "timestamp": timestamp.isoformat(),
+    }
+
+
+async def _make_reservation_orm(
+    reservation_dto: ReservationDTO,
+    session: AsyncSession,
+    idempotent_request: Optional[IdempotentRequest] = None,
+) -> ReservationResponse:
+    """
+    Makes a reservation by locking product, reservation and reservation line rows one by one.
+    """
+    async with session.begin():
+        # With stock buckets enabled the product row is read without a lock,
+        # it is locked afterwards only if the product keeps its stock in the row
+        use_buckets = reservation_settings.STOCK_BUCKETS_ENABLED
+        product = await get_product(
+            reservation_dto.product_id, session, not use_buckets, PRODUCT_STOCK_ONLY
+        )
+        if not product:
+            logger.error("Product with id %s not found", reservation_dto.product_id)
+            raise ProductNotFoundException(reservation_dto.reservation_id)
+        if use_buckets and not product.stock_buckets:
+            product = await get_product(
+                reservation_dto.product_id, session, True, PRODUCT_STOCK_ONLY
+            )
+
+        return await _apply_reservation(reservation_dto, product, session, idempotent_request)
+
+
+async def _apply_reservation(
+    reservation_dto: ReservationDTO,
+    product: Product,
+    session: AsyncSession,
+    idempotent_request: Optional[IdempotentRequest] = None,
+) -> ReservationResponse:
+    """
+    Applies a reservation line in the transaction of the session and commits it. The product
+    row has to be locked already, unless the product keeps its stock in buckets.
+    """
+    reservation = await get_reservation(
+        reservation_dto.reservation_id, session, True, RESERVATION_STATUS_ONLY
+    )
+    if not reservation:
+        logger.info(
+            "Reservation with id %s not found, adding new one.", reservation_dto.reservation_id
+        )
+        reservation = await add_reservation(reservation_dto.reservation_id, session)
+
+    elif reservation.status != ReservationStatus.PENDING:
+        logger.info("Reservation with id %s is not pending", reservation_dto.reservation_id)
+        raise ReservationClosedException(reservation_dto.reservation_id)
+
+    product_in_reservation = await get_product_reservation(
+        reservation_dto.reservation_id,
+        reservation_dto.product_id,
+        session,
+        True,
+        PRODUCT_RESERVATION_QUANTITY_ONLY,
+    )
+
+    change = 0
+    if product_in_reservation:
+        logger.info(
+            "Product %s is reserved for reservation %s. "
+            "Checking if it's reservation amount change",
+            reservation_dto.product_id,
+            reservation_dto.reservation_id,
+        )
+
+        if product_in_reservation.reservation_quantity == reservation_dto.quantity:
+            logger.error(
+                "Product with id %s is already reserved for reservation id %s "
+                "with the same quantity",
+                reservation_dto.product_id,
+                reservation_dto.reservation_id,
+            )
+            raise ProductIsReservedException(reservation_dto.reservation_id)
+        else:
+            logger.info(
+                "Changing amount of product id %s in reservation id %s",
+                reservation_dto.product_id,
+                reservation_dto.reservation_id,
+            )
+            change = product_in_reservation.reservation_quantity - reservation_dto.quantity
+    else:
+        product_in_reservation = await add_product_reservation(
+            reservation_dto.reservation_id,
+            reservation_dto.product_id,
+            reservation_dto.quantity,
+            reservation_dto.timestamp,
+            session,
+        )
+        change = -reservation_dto.quantity
+
+    if product.stock_buckets:
+        enough_products = await move_bucket_stock(
+            product.id,
+            product.stock_buckets,
+            -change,
+            session,
+            random.randrange(product.stock_buckets),
+        )
+    else:
+        enough_products = product.quantity + change >= 0
+
+    if not enough_products:
+        logger.error(
+            "Not enough products for reservation. Change: %s, quantity of product %s",
+            change,
+            product.quantity,
+        )
+        raise NotEnoughProductsException(reservation_dto.reservation_id)
+    else:
+        if not product.stock_buckets:
+            product.quantity += change
+        product_in_reservation.reservation_quantity = reservation_dto.quantity
+        product_in_reservation.date = reservation_dto.timestamp
+        response = ReservationResponse(
+            status="success",
+            message="Reservation created/updated",
+            reservation_id=reservation_dto.reservation_id,
+        )
+        if idempotent_request:
+            await store_response(idempotent_request, 200, response, session)
+        await record_events(
+            OutboxEventType.RESERVATION_UPDATED,
+            [
+                _update_event(
+                    reservation_dto.reservation_id,
+                    {reservation_dto.product_id: reservation_dto.quantity},
+                    reservation_dto.timestamp,
+                )
+            ],
+            session,
+        )
+        await session.flush()
+        await session.commit()
+        logger.info(
+            "Reservation was created/updated successfully. Product: %s Quantity Change: %s",
+            product.id,
+            change,
+        )
+
+    return response
+
+
+async def _make_reservation_atomic(
+    reservation_dto: ReservationDTO,
+    session: AsyncSession,
+    idempotent_request: Optional[IdempotentRequest] = None,
+) -> ReservationResponse:
+    """
+    Makes a reservation with a single conditional statement. Failure reasons are looked up
+    only when the statement did not change anything. Products with stock buckets are
+    reserved from their buckets like the "orm" engine does.
+    """
+    async with session.begin():
+        remaining = await reserve_product(
+            reservation_dto.reservation_id,
+            reservation_dto.product_id,
+            reservation_dto.quantity,
+            reservation_dto.timestamp,
+            session,
+        )
+        if remaining is None:
+            product = await get_product(
+                reservation_dto.product_id, session, False, PRODUCT_STOCK_ONLY
+            )
+            if not product:
+                logger.error("Product with id %s not found", reservation_dto.product_id)
+                raise ProductNotFoundException(reservation_dto.reservation_id)
+            if product.stock_buckets:
+                return await _apply_reservation(
+                    reservation_dto, product, session, idempotent_request
+                )
+
+            reservation = await get_reservation(
+                reservation_dto.reservation_id, session, False, RESERVATION_STATUS_ONLY
+            )
+            if reservation and reservation.status != ReservationStatus.PENDING:
+                logger.info("Reservation with id %s is not pending", reservation_dto.reservation_id)
+                raise ReservationClosedException(reservation_dto.reservation_id)
+
+            product_in_reservation = await get_product_reservation(
+                reservation_dto.reservation_id,
+                reservation_dto.product_id,
+                session,
+                False,
+                PRODUCT_RESERVATION_QUANTITY_ONLY,
+            )
+            if (
+                product_in_reservation
+                and product_in_reservation.reservation_quantity == reservation_dto.quantity
+            ):
+                logger.error(
+                    "Product with id %s is already reserved for reservation id %s "
+                    "with the same quantity",
+                    reservation_dto.product_id,
+                    reservation_dto.reservation_id,
+                )
+                raise ProductIsReservedException(reservation_dto.reservation_id)
+
+            logger.error(
+                "Not enough products for reservation. Product: %s Requested quantity: %s",
+                reservation_dto.product_id,
+                reservation_dto.quantity,
+            )
+            raise NotEnoughProductsException(reservation_dto.reservation_id)
+
+        response = ReservationResponse(
+            status="success",
+            message="Reservation created/updated",
+            reservation_id=reservation_dto.reservation_id,
+        )
+        if idempotent_request:
+            await store_response(idempotent_request, 200, response, session)
+        await record_events(
+            OutboxEventType.RESERVATION_UPDATED,
+            [
+                _update_event(
+                    reservation_dto.reservation_id,
+                    {reservation_dto.product_id: reservation_dto.quantity},
+                    reservation_dto.timestamp,
+                )
+            ],
+            session,
+        )
+        await session.commit()
+        logger.info(
+            "Reservation was created/updated successfully. Product: %s Remaining quantity: %s",
+            reservation_dto.product_id,
+            remaining,
+        )
+
+    return response
+
+
+async def _replay_stored_response(
+    idempotent_request: IdempotentRequest, reservation_id: int, session: AsyncSession
+) -> Optional[Response]:
+    """
+    Returns the response stored for the idempotency key of the request, if there is one.
+
+    Raises:
+        IdempotencyKeyReusedException: If the key was stored for a different request.
+    """
+    async with session.begin():
+        stored = await find_stored_response(idempotent_request.key, session)
+    if stored is None:
+        return None
+    if stored.request_hash != idempotent_request.request_hash:
+        raise IdempotencyKeyReusedException(reservation_id)
+
+    metrics.inc("idempotent_replays_total")
+    return Response(
+        stored.body,
+        status_code=stored.status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
 
 
 @reservation_router.post("/make", response_model=ReservationResponse)
 async def make_reservation(
-    reservation_dto: ReservationDTO, session: Annotated[AsyncSession, Depends(get_db_session)]
-) -> ReservationResponse:
+    reservation_dto: ReservationDTO,
+    session: Annotated[AsyncSession, Depends(get_db_session)],
+    idempotency_key: Annotated[Optional[str], Header(max_length=255)] = None,
+) -> Union[ReservationResponse, Response]:
     """
     Creates a new reservation or updates an existing one for a given product and quantity.
+
+    With an `Idempotency-Key` header the first successful response is stored with the
+    reservation, requests repeated with the same key get the stored response
+    without changing anything. Failed requests are not stored, they can be retried.
     \f
     Args:
         reservation_dto (ReservationDTO): The reservation details, including the reservation ID,
             product ID, and quantity.
         session (AsyncSession): The database session to use for the operation.
+        idempotency_key (Optional[str]): Key of the request, repeated by client retries.
 
     Returns:
         ReservationResponse: A response object containing the status, message, and reservation ID.
@@ -50,121 +425,670 @@ async def make_reservation(
         NotEnoughProductsException: If the requested quantity exceeds the
             available product quantity.
         ReservationIsLockedException: If the reservation is locked due to a database error.
+        IdempotencyKeyReusedException: If the idempotency key was used for another request.
     """
+    idempotent_request = None
+    if idempotency_key:
+        idempotent_request = IdempotentRequest.from_dto(idempotency_key, reservation_dto)
+        replay = await _replay_stored_response(
+            idempotent_request, reservation_dto.reservation_id, session
+        )
+        if replay:
+            return replay
+
     try:
-        async with session.begin():
-            product = await get_product(reservation_dto.product_id, session, True)
-            if not product:
-                logger.error(f"Product with id {reservation_dto.product_id} not found")
-                raise ProductNotFoundException(reservation_dto.reservation_id)
+        if reservation_settings.RESERVATION_ENGINE == "coalesced":
+            response = await reservation_coalescer.submit(
+                reservation_dto.product_id, reservation_dto
+            )
+            # Groups are applied in sessions of their own, so the response is stored
+            # right after its group instead of in the same transaction
+            if idempotent_request:
+                async with session.begin():
+                    await store_response(idempotent_request, 200, response, session)
+        else:
+            if (
+                reservation_settings.RESERVATION_ENGINE == "atomic"
+                and not reservation_settings.STOCK_BUCKETS_ENABLED
+            ):
+                engine = _make_reservation_atomic
+            else:
+                engine = _make_reservation_orm
+            # Conflicts on locked rows are retried here according to the lock settings,
+            # so the client gets 423 only after the retries are used up
+            response = await lock_retry_policy.run(
+                lambda: engine(reservation_dto, session, idempotent_request)
+            )
+        _remember_write(reservation_dto.reservation_id, ReservationStatus.PENDING)
+        if idempotent_request:
+            remember_response(idempotent_request, 200, response)
+        return response
 
-            reservation = await get_reservation(reservation_dto.reservation_id, session, True)
-            if not reservation:
-                logger.info(
-                    f"Reservation with id {reservation_dto.reservation_id} not found, "
-                    "adding new one."
-                )
-                reservation = await add_reservation(reservation_dto.reservation_id, session)
+    except (ReservationException, IntegrityError):
+        # A concurrent request with the same key may have stored its response first,
+        # its reservation then makes this one fail or its key makes this insert fail
+        if idempotent_request:
+            replay = await _replay_stored_response(
+                idempotent_request, reservation_dto.reservation_id, session
+            )
+            if replay:
+                return replay
+        raise
 
-            elif reservation.status != ReservationStatus.PENDING:
-                logger.info(f"Reservation with id {reservation_dto.reservation_id} is not pending")
-                raise ReservationClosedException(reservation_dto.reservation_id)
+    except DBAPIError as db_err:
+        if is_lock_not_available(db_err):
+            raise ReservationIsLockedException(reservation_dto.reservation_id)
+        else:
+            raise db_err
 
-            product_in_reservation = await get_product_reservation(
-                reservation_dto.reservation_id, reservation_dto.product_id, session, True
-            )
 
-            change = 0
-            if product_in_reservation:
-                logger.info(
-                    f"Product {reservation_dto.product_id} is reserved for reservation {reservation_dto.reservation_id}. "  # noqa
-                    f"Checking if it's reservation amount change"
-                )
+def _get_line_change(
+    reservation_id: int,
+    quantity: int,
+    product: Optional[Product],
+    product_in_reservation: Optional[ProductReservation],
+) -> int:
+    """
+    Calculates the change of product quantity for a single reservation line.
+
+    Raises:
+        ProductNotFoundException: If the product of the line does not exist.
+        ProductIsReservedException: If the product is already reserved with the same quantity.
+        NotEnoughProductsException: If the requested quantity exceeds the
+            available product quantity.
+    """
+    if not product:
+        raise ProductNotFoundException(reservation_id)
+
+    if product_in_reservation:
+        if product_in_reservation.reservation_quantity == quantity:
+            raise ProductIsReservedException(reservation_id)
+        change = product_in_reservation.reservation_quantity - quantity
+    else:
+        change = -quantity
+
+    # Stock of bucketed products is checked when it is taken from the buckets
+    if not product.stock_buckets and product.quantity + change < 0:
+        raise NotEnoughProductsException(reservation_id)
+    return change
+
+
+async def _apply_coalesced_reservations(
+    product_id: int, reservation_dtos: List[ReservationDTO], session: AsyncSession
+) -> List[Union[ReservationResponse, ReservationException]]:
+    """
+    Applies reservations of one product in arrival order within one transaction,
+    the product row is locked once for all of them. Every reservation is applied in its
+    own savepoint, so a failed reservation, including one whose rows are locked or were
+    inserted concurrently, does not change anything and does not affect the others.
+    """
+    results: List[Union[ReservationResponse, ReservationException]] = []
+    async with session.begin():
+        product = await get_product(product_id, session, True, PRODUCT_STOCK_ONLY)
+        for reservation_dto in reservation_dtos:
+            try:
+                async with session.begin_nested():
+                    if not product:
+                        raise ProductNotFoundException(reservation_dto.reservation_id)
+
+                    reservation = await get_reservation(
+                        reservation_dto.reservation_id, session, True, RESERVATION_STATUS_ONLY
+                    )
+                    if reservation and reservation.status != ReservationStatus.PENDING:
+                        raise ReservationClosedException(reservation_dto.reservation_id)
 
-                if product_in_reservation.reservation_quantity == reservation_dto.quantity:
-                    logger.error(
-                        f"Product with id {reservation_dto.product_id} is already reserved for "
-                        f"reservation id {reservation_dto.reservation_id} with the same quantity"
+                    product_in_reservation = await get_product_reservation(
+                        reservation_dto.reservation_id,
+                        product_id,
+                        session,
+                        True,
+                        PRODUCT_RESERVATION_QUANTITY_ONLY,
                     )
-                    raise ProductIsReservedException(reservation_dto.reservation_id)
-                else:
-                    logger.info(
-                        f"Changing amount of product id {reservation_dto.product_id} "
-                        f"in reservation id {reservation_dto.reservation_id}"
+                    change = _get_line_change(
+                        reservation_dto.reservation_id,
+                        reservation_dto.quantity,
+                        product,
+                        product_in_reservation,
                     )
-                    change = product_in_reservation.reservation_quantity - reservation_dto.quantity
+                    if not product.stock_buckets:
+                        product.quantity += change
+                    elif not await move_bucket_stock(
+                        product_id,
+                        product.stock_buckets,
+                        -change,
+                        session,
+                        random.randrange(product.stock_buckets),
+                    ):
+                        raise NotEnoughProductsException(reservation_dto.reservation_id)
+
+                    if not reservation:
+                        await add_reservation(reservation_dto.reservation_id, session)
+                    if product_in_reservation:
+                        product_in_reservation.reservation_quantity = reservation_dto.quantity
+                        product_in_reservation.date = reservation_dto.timestamp
+                    else:
+                        await add_product_reservation(
+                            reservation_dto.reservation_id,
+                            product_id,
+                            reservation_dto.quantity,
+                            reservation_dto.timestamp,
+                            session,
+                        )
+            except ReservationException as exc:
+                results.append(exc)
+            except IntegrityError:
+                # A concurrent request inserted the same reservation or line first
+                results.append(ReservationIsLockedException(reservation_dto.reservation_id))
+            except DBAPIError as db_err:
+                if not is_lock_not_available(db_err):
+                    raise db_err
+                results.append(ReservationIsLockedException(reservation_dto.reservation_id))
             else:
-                product_in_reservation = await add_product_reservation(
+                results.append(
+                    ReservationResponse(
+                        status="success",
+                        message="Reservation created/updated",
+                        reservation_id=reservation_dto.reservation_id,
+                    )
+                )
+
+        await record_events(
+            OutboxEventType.RESERVATION_UPDATED,
+            [
+                _update_event(
                     reservation_dto.reservation_id,
-                    reservation_dto.product_id,
-                    reservation_dto.quantity,
+                    {product_id: reservation_dto.quantity},
                     reservation_dto.timestamp,
-                    session,
                 )
-                change = -reservation_dto.quantity
+                for reservation_dto, result in zip(reservation_dtos, results)
+                if isinstance(result, ReservationResponse)
+            ],
+            session,
+        )
+        await session.flush()
+        await session.commit()
 
-            if product.quantity + change < 0:
-                logger.error(
-                    f"Not enough products for reservation."
-                    f"Change: {change}, quantity of product {product.quantity}:"
+    logger.info(
+        "Coalesced reservations of product %s were applied. Successful: %s of %s",
+        product_id,
+        sum(isinstance(result, ReservationResponse) for result in results),
+        len(results),
+    )
+    return results
+
+
+async def _make_coalesced_reservations(
+    product_id: int, reservation_dtos: List[ReservationDTO]
+) -> List[Union[ReservationResponse, ReservationException]]:
+    """
+    Processes one group of the reservation coalescer in its own session, the group spans
+    several requests, so it can not use the session of any of them.
+    """
+    async with async_session_factory() as session:
+        try:
+            return await lock_retry_policy.run(
+                lambda: _apply_coalesced_reservations(product_id, reservation_dtos, session)
+            )
+        except DBAPIError as db_err:
+            if is_lock_not_available(db_err):
+                return [
+                    ReservationIsLockedException(reservation_dto.reservation_id)
+                    for reservation_dto in reservation_dtos
+                ]
+            raise db_err
+
+
+reservation_coalescer: RequestCoalescer[int, ReservationDTO, ReservationResponse] = (
+    RequestCoalescer(
+        _make_coalesced_reservations,
+        window=reservation_settings.COALESCE_WINDOW_MS / 1000,
+        max_batch=reservation_settings.COALESCE_MAX_BATCH,
+    )
+)
+
+
+async def _make_batch_reservation(
+    batch_dto: BatchReservationDTO, session: AsyncSession
+) -> BatchReservationResponse:
+    """
+    Applies all lines of a batch reservation in one transaction.
+    """
+    reservation_id = batch_dto.reservation_id
+    product_ids = [line.product_id for line in batch_dto.lines]
+    async with session.begin():
+        # Products are locked with one query in ascending ID order, so overlapping
+        # batches can not deadlock each other.
+        products = await get_products(product_ids, session, True, PRODUCT_STOCK_ONLY)
+
+        reservation = await get_reservation(
+            reservation_id, session, True, RESERVATION_STATUS_ONLY
+        )
+        if not reservation:
+            logger.info("Reservation with id %s not found, adding new one.", reservation_id)
+            reservation = await add_reservation(reservation_id, session)
+        elif reservation.status != ReservationStatus.PENDING:
+            logger.info("Reservation with id %s is not pending", reservation_id)
+            raise ReservationClosedException(reservation_id)
+
+        products_in_reservation = await get_product_reservations(
+            reservation_id, product_ids, session, True, PRODUCT_RESERVATION_QUANTITY_ONLY
+        )
+
+        changes: Dict[int, int] = {}
+        lines: List[ReservationLineResponse] = []
+        first_failure: Optional[ReservationException] = None
+        for line in batch_dto.lines:
+            try:
+                changes[line.product_id] = _get_line_change(
+                    reservation_id,
+                    line.quantity,
+                    products.get(line.product_id),
+                    products_in_reservation.get(line.product_id),
+                )
+            except ReservationException as exc:
+                first_failure = first_failure or exc
+                lines.append(
+                    ReservationLineResponse(
+                        product_id=line.product_id,
+                        status=exc.response.status,
+                        message=exc.response.message,
+                    )
                 )
-                raise NotEnoughProductsException(reservation_dto.reservation_id)
             else:
-                product.quantity += change
-                product_in_reservation.reservation_quantity = reservation_dto.quantity
-                product_in_reservation.date = reservation_dto.timestamp
-                await session.flush()
-                await session.commit()
-                logger.info(
-                    f"Reservation was created/updated successfully. "
-                    f"Product: {product.id} Quantity Change: {change}"  # noqa
+                lines.append(
+                    ReservationLineResponse(
+                        product_id=line.product_id,
+                        status="success",
+                        message="Reservation line is valid",
+                    )
+                )
+
+        if first_failure:
+            logger.error(
+                "Batch reservation %s failed, %s of %s lines can not be applied",
+                reservation_id,
+                sum(line.status == "error" for line in lines),
+                len(lines),
+            )
+            raise BatchReservationException(first_failure.status_code, reservation_id, lines)
+
+        new_lines: Dict[int, int] = {}
+        for line_index, line in enumerate(batch_dto.lines):
+            product = products[line.product_id]
+            if not product.stock_buckets:
+                product.quantity += changes[line.product_id]
+            elif not await move_bucket_stock(
+                product.id,
+                product.stock_buckets,
+                -changes[line.product_id],
+                session,
+                random.randrange(product.stock_buckets),
+            ):
+                not_enough = NotEnoughProductsException(reservation_id)
+                lines[line_index] = ReservationLineResponse(
+                    product_id=line.product_id,
+                    status=not_enough.response.status,
+                    message=not_enough.response.message,
                 )
+                raise BatchReservationException(not_enough.status_code, reservation_id, lines)
+
+            product_in_reservation = products_in_reservation.get(line.product_id)
+            if product_in_reservation:
+                product_in_reservation.reservation_quantity = line.quantity
+                product_in_reservation.date = batch_dto.timestamp
+            else:
+                new_lines[line.product_id] = line.quantity
 
-            return ReservationResponse(
-                status="success",
-                message="Reservation created/updated",
-                reservation_id=reservation_dto.reservation_id,
+        if new_lines:
+            await add_product_reservations(
+                reservation_id, new_lines, batch_dto.timestamp, session
             )
+        await record_events(
+            OutboxEventType.RESERVATION_UPDATED,
+            [
+                _update_event(
+                    reservation_id,
+                    {line.product_id: line.quantity for line in batch_dto.lines},
+                    batch_dto.timestamp,
+                )
+            ],
+            session,
+        )
+        await session.flush()
+        await session.commit()
+        _remember_write(reservation_id, ReservationStatus.PENDING)
+        logger.info(
+            "Batch reservation %s was created/updated successfully. Lines: %s",
+            reservation_id,
+            len(lines),
+        )
+
+        return BatchReservationResponse(
+            status="success",
+            message="Reservation created/updated",
+            reservation_id=reservation_id,
+            lines=[
+                ReservationLineResponse(
+                    product_id=line.product_id,
+                    status="success",
+                    message="Reservation line created/updated",
+                )
+                for line in batch_dto.lines
+            ],
+        )
+
+
+@reservation_router.post("/make/batch", response_model=BatchReservationResponse)
+async def make_batch_reservation(
+    batch_dto: BatchReservationDTO, session: Annotated[AsyncSession, Depends(get_db_session)]
+) -> BatchReservationResponse:
+    """
+    Creates or updates several product lines of one reservation in a single transaction.
+    Either all lines are applied or none of them.
+    \f
+    Args:
+        batch_dto (BatchReservationDTO): The reservation ID, the timestamp and the lines
+            with product ID and quantity.
+        session (AsyncSession): The database session to use for the operation.
+
+    Returns:
+        BatchReservationResponse: A response object containing the status, message,
+            reservation ID and the result of every line.
+
+    Raises:
+        ReservationClosedException: If the reservation is not in the pending state.
+        BatchReservationException: If at least one of the lines can not be applied, the status
+            code is taken from the first failed line.
+        ReservationIsLockedException: If one of the rows is locked by another transaction.
+    """
+    try:
+        return await lock_retry_policy.run(lambda: _make_batch_reservation(batch_dto, session))
 
     except DBAPIError as db_err:
-        # Check if the error is due to a lock not being available
-        orig_exception = db_err.orig
-        if isinstance(orig_exception, LockNotAvailableError) or isinstance(
-            orig_exception.__cause__,  # type: ignore
-            LockNotAvailableError,
-        ):
-            raise ReservationIsLockedException(reservation_dto.reservation_id)
+        if is_lock_not_available(db_err):
+            raise ReservationIsLockedException(batch_dto.reservation_id)
         else:
             raise db_err
 
 
+async def _read_reservation(
+    reservation_id: int,
+    session: AsyncSession,
+    read: Callable[[AsyncSession], Awaitable[Optional[T]]],
+) -> Optional[T]:
+    """
+    Reads a reservation with `read` from the replica when one is configured, `read` returns
+    None for a missing reservation. Reservations this worker changed recently and reservations
+    missing on the replica, which can be new ones it did not receive yet, are read from
+    the primary.
+    """
+    if replica_session_factory is None or recent_reservation_writes.get(reservation_id) is MISSING:
+        found = await read(session)
+        if found is not None or replica_session_factory is None:
+            return found
+        metrics.inc("replica_fallbacks_total", (("reason", "missing"),))
+    else:
+        metrics.inc("replica_fallbacks_total", (("reason", "recent_write"),))
+
+    async with async_session_factory() as primary_session:
+        return await read(primary_session)
+
+
+async def _read_reservation_status(reservation_id: int, session: AsyncSession) -> Optional[str]:
+    async def read(read_session: AsyncSession) -> Optional[str]:
+        reservation = await get_reservation(
+            reservation_id, read_session, False, RESERVATION_STATUS_ONLY
+        )
+        return ReservationStatus(reservation.status).value if reservation else None
+
+    return await _read_reservation(reservation_id, session, read)
+
+
+async def _cached_status(reservation_id: int, session: AsyncSession) -> Optional[str]:
+    """
+    Returns the status of a reservation from the status cache, misses are read and cached,
+    missing reservations for a shorter time. None means the reservation does not exist.
+    """
+    status = reservation_status_cache.get(reservation_id)
+    if status is MISSING:
+        status = await _read_reservation_status(reservation_id, session)
+        if status is not None:
+            reservation_status_cache.set(reservation_id, status)
+        else:
+            reservation_status_cache.set(
+                reservation_id, None, cache_settings.STATUS_CACHE_NEGATIVE_TTL
+            )
+    return status
+
+
+def _subscribe_to_status(reservation_id: int) -> Subscription[int, str]:
+    try:
+        return reservation_status_subscriptions.subscribe(reservation_id)
+    except SubscriptionLimitError:
+        raise HTTPException(status_code=503, detail="Too many requests are waiting")
+
+
+async def _wait_for_status_change(
+    reservation_id: int, session: AsyncSession, wait: float
+) -> Optional[str]:
+    """
+    Returns the status of the reservation once it is no longer pending, or after `wait`
+    seconds. Changes made by this worker wake the request at once, changes of other workers
+    are seen by the one read at the end.
+    """
+    # Subscribed before reading, so a change committed in between is not missed
+    with _subscribe_to_status(reservation_id) as subscription:
+        status = await _cached_status(reservation_id, session)
+        if status != ReservationStatus.PENDING.value:
+            return status
+        # The connection goes back to the pool while the request waits
+        await session.close()
+
+        deadline = asyncio.get_running_loop().time() + wait
+        while (remaining := deadline - asyncio.get_running_loop().time()) > 0:
+            changed = await subscription.wait(remaining)
+            if changed is None:
+                break
+            if changed != ReservationStatus.PENDING.value:
+                return changed
+    return await _cached_status(reservation_id, session)
+
+
+def _status_response(reservation_id: int, status: str) -> ReservationResponse:
+    return ReservationResponse(
+        status="success",
+        message=f"Reservation status: {status}",
+        reservation_id=reservation_id,
+    )
+
+
 @reservation_router.get("/status/{reservation_id}", response_model=ReservationResponse)
 async def check_reservation_status(
-    reservation_id: int, session: Annotated[AsyncSession, Depends(get_db_session)]
+    reservation_id: int,
+    session: Annotated[AsyncSession, Depends(get_db_read_session)],
+    wait: Annotated[float, Query(ge=0, le=status_push_settings.STATUS_MAX_WAIT_SECONDS)] = 0,
 ):
     """
     Retrieves the status of a reservation by the given reservation ID.
+    Statuses are served from an in-process cache, missing reservations are cached for
+    a shorter time. Cache misses are read from the replica when one is configured.
+
+    With `wait` the request is a long poll: the status of a pending reservation is returned
+    once it changes, or after `wait` seconds, without querying the database in between.
     \f
 
     Args:
         reservation_id (int): The ID of the reservation to check.
-        session (AsyncSession): The database session to use for the operation.
+        session (AsyncSession): The read-only database session to use for the operation.
+        wait (float): Seconds to wait for a pending reservation to change its status.
 
     Returns:
         ReservationResponse: A response object containing the status of the reservation.
 
     Raises:
         ReservationNotFoundException: If the reservation with the given ID is not found.
+        HTTPException: If too many requests are waiting already.
     """
+    if wait:
+        status = await _wait_for_status_change(reservation_id, session, wait)
+    else:
+        status = await _cached_status(reservation_id, session)
 
-    reservation = await get_reservation(reservation_id, session, False)
-    if not reservation:
+    if status is None:
         raise ReservationNotFoundException(reservation_id)
 
-    return ReservationResponse(
+    return _status_response(reservation_id, status)
+
+
+def _status_event(reservation_id: int, status: str) -> bytes:
+    return b"event: status\ndata: %s\n\n" % _status_response(
+        reservation_id, status
+    ).model_dump_json().encode()
+
+
+async def _status_events(
+    reservation_id: int, status: str, subscription: Subscription[int, str]
+) -> AsyncIterator[bytes]:
+    """
+    Sends the current status and every change until the reservation is no longer pending.
+    Idle streams get a comment line every heartbeat and re-read the status every recheck
+    interval in a session of their own, no connection is held in between.
+    """
+    loop = asyncio.get_running_loop()
+    heartbeat = status_push_settings.STATUS_STREAM_HEARTBEAT_SECONDS
+    recheck = status_push_settings.STATUS_STREAM_RECHECK_SECONDS
+    next_recheck = loop.time() + recheck
+    with subscription:
+        yield _status_event(reservation_id, status)
+        while status == ReservationStatus.PENDING.value:
+            timeout = min(heartbeat, next_recheck - loop.time()) if recheck else heartbeat
+            changed = await subscription.wait(max(timeout, 0))
+            if changed is None and recheck and loop.time() >= next_recheck:
+                next_recheck = loop.time() + recheck
+                async with (replica_session_factory or async_session_factory)() as session:
+                    changed = await _cached_status(reservation_id, session)
+            if changed is None:
+                yield b": keep-alive\n\n"
+            elif changed != status:
+                status = changed
+                yield _status_event(reservation_id, status)
+
+
+@reservation_router.get("/status/{reservation_id}/stream")
+async def stream_reservation_status(
+    reservation_id: int, session: Annotated[AsyncSession, Depends(get_db_read_session)]
+) -> StreamingResponse:
+    """
+    Streams the status of a reservation as Server-Sent Events: a `status` event with
+    the current status, then one for every change. The stream ends once the reservation
+    is confirmed or cancelled.
+    \f
+
+    Args:
+        reservation_id (int): The ID of the reservation to watch.
+        session (AsyncSession): The read-only database session to use for the first read.
+
+    Returns:
+        StreamingResponse: `text/event-stream` with the status events.
+
+    Raises:
+        ReservationNotFoundException: If the reservation with the given ID is not found.
+        HTTPException: If too many requests are waiting already.
+    """
+    subscription = _subscribe_to_status(reservation_id)
+    try:
+        status = await _cached_status(reservation_id, session)
+    except BaseException:
+        subscription.close()
+        raise
+    finally:
+        # The stream reads in sessions of its own, the connection is not held while it is open
+        await session.close()
+    if status is None:
+        subscription.close()
+        raise ReservationNotFoundException(reservation_id)
+
+    return StreamingResponse(
+        _status_events(reservation_id, status, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Closes the subscription also if the stream never started
+        background=BackgroundTask(subscription.close),
+    )
+
+
+def _details_etag(rows: List[Row]) -> str:
+    """
+    Strong ETag of a reservation, a hash of every value its details are built from,
+    so it changes with the status, any line or the name or price of a reserved product.
+    """
+    digest = hashlib.blake2b(repr([tuple(row) for row in rows]).encode(), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, a weak validator matches its strong one
+    return any(
+        candidate.strip().removeprefix("W/") in ("*", etag)
+        for candidate in if_none_match.split(",")
+    )
+
+
+@reservation_router.get("/{reservation_id}", response_model=ReservationDetailsResponse)
+async def reservation_details(
+    reservation_id: int,
+    response: Response,
+    session: Annotated[AsyncSession, Depends(get_db_read_session)],
+    if_none_match: Annotated[Optional[str], Header()] = None,
+):
+    """
+    Returns a reservation with all its lines, read with one joined query.
+
+    The response has a strong `ETag`, a request with a matching `If-None-Match` header
+    gets an empty 304 response, the details are then not built or serialised.
+    \f
+
+    Args:
+        reservation_id (int): The ID of the reservation.
+        response (Response): The response, it gets the ETag header.
+        session (AsyncSession): The read-only database session to use for the operation.
+        if_none_match (Optional[str]): ETags of the details the client already has.
+
+    Raises:
+        ReservationNotFoundException: If the reservation with the given ID is not found.
+
+    Returns:
+        ReservationDetailsResponse: The reservation status and its lines.
+    """
+
+    async def read(read_session: AsyncSession) -> Optional[List[Row]]:
+        return await get_reservation_details(reservation_id, read_session) or None
+
+    rows = await _read_reservation(reservation_id, session, read)
+    if not rows:
+        raise ReservationNotFoundException(reservation_id)
+
+    etag = _details_etag(rows)
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    return ReservationDetailsResponse(
         status="success",
-        message=f"Reservation status: {reservation.status}",
+        message="Reservation details",
         reservation_id=reservation_id,
+        reservation_status=ReservationStatus(rows[0].status).value,
+        lines=[
+            ReservationItemResponse(
+                product_id=row.product_id,
+                name=row.name,
+                price=row.price,
+                quantity=row.reservation_quantity,
+                date=row.date,
+            )
+            for row in rows
+            if row.product_id is not None
+        ],
     )
 
 
@@ -187,17 +1111,314 @@ async def confirm_reservation(
     Returns:
         ReservationResponse: A response object containing the status of the closed reservation.
     """
-    reservation = await get_reservation(reservation_id, session, True)
+    reservation = await get_reservation(reservation_id, session, True, RESERVATION_STATUS_ONLY)
     if not reservation:
         raise ReservationNotFoundException(reservation_id)
     if reservation.status != ReservationStatus.PENDING:
         raise ReservationClosedException(reservation_id)
 
     reservation.status = ReservationStatus.CONFIRMED
+    await record_events(
+        OutboxEventType.RESERVATION_CONFIRMED,
+        [(reservation_id, {"status": ReservationStatus.CONFIRMED.value})],
+        session,
+    )
     await session.flush()
     await session.commit()
+    _remember_write(reservation_id, ReservationStatus.CONFIRMED)
     return ReservationResponse(
         status="success",
         message="Reservation confirmed",
         reservation_id=reservation_id,
     )
+
+
+async def _cancel_reservations(
+    reservation_ids: Sequence[int], session: AsyncSession
+) -> Tuple[List[int], int]:
+    """
+    Cancels the pending reservations among the given ones in one transaction.
+    """
+    async with session.begin():
+        cancelled_ids, units = await cancel_reservations(reservation_ids, session)
+        await record_events(
+            OutboxEventType.RESERVATION_CANCELLED,
+            cancellation_events(cancelled_ids, "cancelled"),
+            session,
+        )
+    for reservation_id in cancelled_ids:
+        _remember_write(reservation_id, ReservationStatus.CANCELLED)
+    return cancelled_ids, units
+
+
+@reservation_router.put("/cancel/{reservation_id}", response_model=ReservationResponse)
+async def cancel_reservation(
+    reservation_id: int, session: Annotated[AsyncSession, Depends(get_db_session)]
+):
+    """
+    Cancels a pending reservation with the given reservation ID and returns its stock.
+    \f
+
+    Args:
+        reservation_id (int): The ID of the reservation to cancel.
+        session (AsyncSession): The database session to use for the operation.
+
+    Raises:
+        ReservationNotFoundException: If the reservation with the given ID is not found.
+        ReservationClosedException: If the reservation is not in the pending status.
+        ReservationIsLockedException: If one of the rows is locked by another transaction.
+
+    Returns:
+        ReservationResponse: A response object containing the status of the cancelled reservation.
+    """
+    try:
+        cancelled_ids, _ = await lock_retry_policy.run(
+            lambda: _cancel_reservations([reservation_id], session)
+        )
+    except DBAPIError as db_err:
+        if is_lock_not_available(db_err):
+            raise ReservationIsLockedException(reservation_id)
+        else:
+            raise db_err
+
+    if not cancelled_ids:
+        reservation = await get_reservation(
+            reservation_id, session, False, RESERVATION_STATUS_ONLY
+        )
+        if not reservation:
+            raise ReservationNotFoundException(reservation_id)
+        raise ReservationClosedException(reservation_id)
+
+    return ReservationResponse(
+        status="success",
+        message="Reservation cancelled",
+        reservation_id=reservation_id,
+    )
+
+
+@reservation_router.post("/cancel/batch", response_model=BatchCancelResponse)
+async def cancel_reservations_batch(
+    batch_dto: BatchCancelDTO, session: Annotated[AsyncSession, Depends(get_db_session)]
+) -> BatchCancelResponse:
+    """
+    Cancels many pending reservations and returns their stock. Reservations are processed
+    in chunks of CANCEL_CHUNK_SIZE, each chunk flips the statuses with one statement and
+    releases the stock with one aggregated update in its own transaction.
+    \f
+
+    Args:
+        batch_dto (BatchCancelDTO): The IDs of the reservations to cancel.
+        session (AsyncSession): The database session to use for the operation.
+
+    Returns:
+        BatchCancelResponse: The cancelled, skipped and locked reservation IDs and
+            the number of returned units.
+    """
+    # Sorted IDs keep the lock order the same for overlapping cleanup jobs
+    reservation_ids = sorted(set(batch_dto.reservation_ids))
+    chunk_size = reservation_settings.CANCEL_CHUNK_SIZE
+    cancelled: List[int] = []
+    locked: List[int] = []
+    released_units = 0
+
+    for start in range(0, len(reservation_ids), chunk_size):
+        chunk = reservation_ids[start : start + chunk_size]
+        try:
+            cancelled_ids, units = await lock_retry_policy.run(
+                lambda: _cancel_reservations(chunk, session)
+            )
+        except DBAPIError as db_err:
+            if not is_lock_not_available(db_err):
+                raise db_err
+            logger.info("Reservations %s..%s are locked, skipping the chunk", chunk[0], chunk[-1])
+            locked.extend(chunk)
+            continue
+        cancelled.extend(cancelled_ids)
+        released_units += units
+
+    cancelled_set = set(cancelled)
+    locked_set = set(locked)
+    skipped = [
+        reservation_id
+        for reservation_id in reservation_ids
+        if reservation_id not in cancelled_set and reservation_id not in locked_set
+    ]
+    return BatchCancelResponse(
+        status="success" if not locked else "partial",
+        message=f"Cancelled {len(cancelled)} of {len(reservation_ids)} reservations",
+        cancelled=cancelled,
+        skipped=skipped,
+        locked=locked,
+        released_units=released_units,
+    )
+
+
+@product_router.get("/availability", response_model=ProductAvailabilityResponse)
+async def get_availability(
+    ids: Annotated[str, Query(pattern=r"^\d+(,\d+)*$", description="Comma-separated IDs")],
+    session: Annotated[AsyncSession, Depends(get_db_session)],
+    fresh: bool = False,
+) -> ProductAvailabilityResponse:
+    """
+    Returns the available stock of several products, e.g. `?ids=1,2,3`.
+
+    The stock is read from an in-process snapshot that is at most
+    AVAILABILITY_MAX_STALENESS_SECONDS old, with `fresh=true` it is read from the database
+    with one query. Neither takes row locks, so reservations are never blocked.
+    \f
+
+    Args:
+        ids (str): Comma-separated product IDs, at most AVAILABILITY_MAX_IDS.
+        session (AsyncSession): The database session to use for fresh reads.
+        fresh (bool): Read the stock from the database instead of the snapshot.
+
+    Raises:
+        HTTPException: If more than AVAILABILITY_MAX_IDS products are requested.
+
+    Returns:
+        ProductAvailabilityResponse: The available stock of the existing products and the IDs
+            of the missing ones.
+    """
+    product_ids = list(dict.fromkeys(int(product_id) for product_id in ids.split(",")))
+    if len(product_ids) > availability_settings.AVAILABILITY_MAX_IDS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {availability_settings.AVAILABILITY_MAX_IDS} products per request",
+        )
+
+    if fresh:
+        available = await get_products_availability(product_ids, session)
+        age = 0.0
+    else:
+        available, age = await stock_snapshot.get(product_ids)
+
+    return ProductAvailabilityResponse(
+        status="success",
+        products=[
+            ProductAvailability(product_id=product_id, available=available[product_id])
+            for product_id in product_ids
+            if product_id in available
+        ],
+        missing=[product_id for product_id in product_ids if product_id not in available],
+        age_seconds=round(age, 3),
+    )
+
+
+@product_router.put("/{product_id}/stock-buckets", response_model=StockBucketsResponse)
+async def set_product_stock_buckets(
+    product_id: int,
+    buckets_dto: StockBucketsDTO,
+    session: Annotated[AsyncSession, Depends(get_db_session)],
+) -> StockBucketsResponse:
+    """
+    Splits the stock of a product into `buckets` bucket rows, so concurrent reservations of it
+    lock different rows, or moves all stock back into the product row with `buckets=0`.
+    Available stock does not change. The product row and its buckets are locked while the
+    stock is moved.
+    \f
+
+    Args:
+        product_id (int): The ID of the product.
+        buckets_dto (StockBucketsDTO): The number of buckets.
+        session (AsyncSession): The database session to use for the operation.
+
+    Raises:
+        HTTPException: If the product does not exist or stays locked by other transactions.
+
+    Returns:
+        StockBucketsResponse: The product and its number of buckets.
+    """
+    try:
+        async with session.begin():
+            found = await set_stock_buckets(product_id, buckets_dto.buckets, session)
+    except DBAPIError as db_err:
+        if not is_lock_not_available(db_err):
+            raise db_err
+        raise HTTPException(status_code=423, detail="Product is locked, try again later")
+    if not found:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    logger.info("Stock of product %s is kept in %s buckets", product_id, buckets_dto.buckets)
+    return StockBucketsResponse(
+        status="success",
+        message=f"Stock is kept in {buckets_dto.buckets} buckets",
+        product_id=product_id,
+        buckets=buckets_dto.buckets,
+    )
+
+
+IMPORT_PARSERS = {
+    "text/csv": iter_csv_records,
+    "application/x-ndjson": iter_ndjson_records,
+    "application/jsonl": iter_ndjson_records,
+}
+
+
+@product_router.post("/import", response_model=ProductImportResponse)
+async def import_products(
+    request: Request,
+    session: Annotated[AsyncSession, Depends(get_db_session)],
+    mode: Literal["set", "add"] = "set",
+) -> ProductImportResponse:
+    """
+    Imports products from a streamed CSV (`text/csv`, with a header line) or NDJSON
+    (`application/x-ndjson`) body with the fields product_id, name, price and quantity.
+
+    The body is parsed as it arrives and upserted in chunks of IMPORT_CHUNK_SIZE rows,
+    every chunk in its own transaction, so reservations of other products are never blocked.
+    With `mode=set` the quantity replaces the stock of existing products, with `mode=add`
+    it is added to it. Rows that can not be imported are reported, the others are imported.
+    \f
+
+    Args:
+        request (Request): The request with the streamed body.
+        session (AsyncSession): The database session to use for the operation.
+        mode (str): "set" to replace the stock, "add" to restock.
+
+    Raises:
+        HTTPException: If the content type is neither CSV nor NDJSON.
+
+    Returns:
+        ProductImportResponse: Counts of the read, imported and failed rows, the first failed
+            rows and the import rate.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    parser = IMPORT_PARSERS.get(content_type)
+    if parser is None:
+        raise HTTPException(
+            status_code=415, detail="Body has to be text/csv or application/x-ndjson"
+        )
+
+    started = time.perf_counter()
+    product_import = ProductImport(
+        session,
+        add_quantity=mode == "add",
+        chunk_size=import_settings.IMPORT_CHUNK_SIZE,
+        max_errors=import_settings.IMPORT_MAX_ERRORS,
+    )
+    result = await product_import.run(
+        parser(request.stream(), import_settings.IMPORT_MAX_LINE_BYTES)
+    )
+    seconds = time.perf_counter() - started
+    metrics.inc("imported_products_total", value=result.imported)
+    logger.info(
+        "Imported %s products from %s rows in %.2fs, %s rows failed",
+        result.imported,
+        result.rows,
+        seconds,
+        result.failed,
+    )
+
+    return ProductImportResponse(
+        status="success" if not result.failed else "partial",
+        message=f"Imported {result.imported} products from {result.rows} rows",
+        rows=result.rows,
+        imported=result.imported,
+        failed=result.failed,
+        errors=[
+            ProductImportError(line=line_number, message=message)
+            for line_number, message in result.errors
+        ],
+        seconds=round(seconds, 3),
+        rows_per_second=round(result.rows / seconds, 1) if seconds else 0.0,
+    )
@@ -0,0 +1,103 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Generic, Hashable, Optional, Tuple, TypeVar
+
+from settings import cache_settings, db_settings
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+# Returned by TTLCache.get on a miss, so that None can be cached as a regular value
+MISSING: Any = object()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    size: int = 0
+
+
+class TTLCache(Generic[K, V]):
+    """
+    Bounded in-process cache with per-entry TTL and least recently used eviction.
+
+    It is not shared between workers, so entries written by other processes are seen
+    only after the local entry expires.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[K, Tuple[float, V]] = OrderedDict()
+        self._stats = CacheStats()
+
+    def get(self, key: K, default: Any = MISSING) -> V:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self._stats.expirations += 1
+            self._stats.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self._stats.hits += 1
+        return value
+
+    def set(self, key: K, value: V, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.max_size <= 0:
+            self._entries.pop(key, None)
+            return
+
+        self._entries[key] = (self._clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    def invalidate(self, key: K) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            hits=self._stats.hits,
+            misses=self._stats.misses,
+            evictions=self._stats.evictions,
+            expirations=self._stats.expirations,
+            size=len(self._entries),
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Reservation ID -> reservation status, None means the reservation does not exist
+reservation_status_cache: TTLCache[int, Optional[str]] = TTLCache(
+    max_size=cache_settings.STATUS_CACHE_SIZE,
+    ttl=cache_settings.STATUS_CACHE_TTL,
+)
+
+# Reservation ID -> True for reservations changed by this worker, they are read from the primary
+# instead of the replica until the replica has most likely caught up
+recent_reservation_writes: TTLCache[int, bool] = TTLCache(
+    max_size=cache_settings.STATUS_CACHE_SIZE,
+    ttl=db_settings.DB_REPLICA_READ_YOUR_WRITES_SECONDS,
+)
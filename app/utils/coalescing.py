@@ -0,0 +1,94 @@
+import asyncio
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+K = TypeVar("K", bound=Hashable)
+I = TypeVar("I")  # noqa: E741
+R = TypeVar("R")
+
+# Processes one batch of items with the same key, returns one result or exception per item
+BatchProcessor = Callable[[K, List[I]], Awaitable[Sequence[Union[R, BaseException]]]]
+
+
+class RequestCoalescer(Generic[K, I, R]):
+    """
+    Collects concurrent items with the same key and processes them as one batch.
+
+    A batch is processed when `window` seconds passed since its first item or when it reaches
+    `max_batch` items. Only one batch per key is processed at a time, items that arrive
+    in the meantime form the next batch, which starts as soon as the current one is done.
+    Every caller gets its own result or exception, in arrival order within a batch.
+    """
+
+    def __init__(self, process: BatchProcessor, window: float, max_batch: int):
+        self.process = process
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: Dict[K, List[Tuple[I, asyncio.Future]]] = {}
+        self._timers: Dict[K, asyncio.TimerHandle] = {}
+        self._running: Set[K] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, key: K, item: I) -> R:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((item, future))
+
+        if len(batch) >= self.max_batch:
+            self._flush(key)
+        elif len(batch) == 1 and key not in self._running:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key: K) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        if key in self._running:
+            # The next batch starts when the running one is done
+            return
+
+        batch = self._pending.pop(key, None)
+        if not batch:
+            return
+        self._running.add(key)
+        task = asyncio.create_task(self._run(key, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: K, batch: List[Tuple[I, asyncio.Future]]) -> None:
+        try:
+            results: Sequence[Union[R, BaseException]] = await self.process(
+                key, [item for item, _ in batch]
+            )
+        except Exception as exc:
+            results = [exc] * len(batch)
+        finally:
+            self._running.discard(key)
+            if key in self._pending:
+                self._flush(key)
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                # The caller went away, e.g. the client disconnected
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    @property
+    def pending(self) -> int:
+        return sum(len(batch) for batch in self._pending.values())
@@ -1,7 +1,9 @@
 from datetime import datetime
-from typing import Annotated
+from typing import Annotated, List
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+
+from app.db.models import MAX_INTEGER
 
 
 class ReservationDTO(BaseModel):
@@ -11,7 +13,123 @@ class ReservationDTO(BaseModel):
     timestamp: Annotated[datetime, Field(gt=datetime(1970, 1, 1))]
 
 
+class ReservationLineDTO(BaseModel):
+    product_id: Annotated[int, Field(gt=0, description="Product ID must be greater than 0")]
+    quantity: Annotated[int, Field(gt=0, description="Quantity must be greater than 0")]
+
+
+class BatchReservationDTO(BaseModel):
+    reservation_id: Annotated[int, Field(gt=0, description="Reservation ID must be greater than 0")]
+    lines: Annotated[
+        List[ReservationLineDTO],
+        Field(min_length=1, description="Reservation lines, one per product"),
+    ]
+    timestamp: Annotated[datetime, Field(gt=datetime(1970, 1, 1))]
+
+    @field_validator("lines")
+    @classmethod
+    def check_unique_products(cls, lines: List[ReservationLineDTO]) -> List[ReservationLineDTO]:
+        product_ids = [line.product_id for line in lines]
+        if len(product_ids) != len(set(product_ids)):
+            raise ValueError("Each product can appear only once in a batch")
+        return lines
+
+
+class BatchCancelDTO(BaseModel):
+    reservation_ids: Annotated[
+        List[Annotated[int, Field(gt=0)]],
+        Field(min_length=1, max_length=100_000, description="IDs of reservations to cancel"),
+    ]
+
+
 class ReservationResponse(BaseModel):
     status: str
     message: str
     reservation_id: int
+
+
+class ReservationLineResponse(BaseModel):
+    product_id: int
+    status: str
+    message: str
+
+
+class BatchReservationResponse(ReservationResponse):
+    lines: List[ReservationLineResponse]
+
+
+class ReservationItemResponse(BaseModel):
+    product_id: int
+    name: str
+    price: int
+    quantity: int
+    date: datetime
+
+
+class ReservationDetailsResponse(ReservationResponse):
+    reservation_status: str
+    lines: List[ReservationItemResponse]
+
+
+class BatchCancelResponse(BaseModel):
+    status: str
+    message: str
+    cancelled: List[int]
+    # Missing reservations and reservations that are not pending
+    skipped: List[int]
+    # Reservations of chunks that stayed locked by other transactions, can be sent again
+    locked: List[int]
+    released_units: int
+
+
+class ProductAvailability(BaseModel):
+    product_id: int
+    available: int
+
+
+class ProductAvailabilityResponse(BaseModel):
+    status: str
+    products: List[ProductAvailability]
+    # Requested products that do not exist
+    missing: List[int]
+    # Age of the stock snapshot the quantities were read from, 0 for fresh reads
+    age_seconds: float
+
+
+class StockBucketsDTO(BaseModel):
+    buckets: Annotated[
+        int, Field(ge=0, le=1024, description="Number of stock buckets, 0 turns them off")
+    ]
+
+
+class StockBucketsResponse(BaseModel):
+    status: str
+    message: str
+    product_id: int
+    buckets: int
+
+
+class ProductImportRow(BaseModel):
+    product_id: Annotated[
+        int, Field(gt=0, le=MAX_INTEGER, description="Product ID must be greater than 0")
+    ]
+    name: Annotated[str, Field(min_length=1)]
+    price: Annotated[int, Field(ge=0, le=MAX_INTEGER)]
+    quantity: Annotated[int, Field(ge=0, le=MAX_INTEGER)]
+
+
+class ProductImportError(BaseModel):
+    line: int
+    message: str
+
+
+class ProductImportResponse(BaseModel):
+    status: str
+    message: str
+    rows: int
+    imported: int
+    failed: int
+    # The first IMPORT_MAX_ERRORS failed rows
+    errors: List[ProductImportError]
+    seconds: float
+    rows_per_second: float
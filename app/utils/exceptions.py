@@ -1,80 +1,104 @@
 # Custom exception class accepting ReservationResponse
-from app.utils.dto import ReservationResponse
+from functools import cached_property
+from typing import List
+
+from app.utils.dto import BatchReservationResponse, ReservationLineResponse, ReservationResponse
 
 
 class ReservationException(Exception):
     def __init__(self, status_code: int, response: ReservationResponse):
         self.status_code = status_code
         self.response = response
+        self.message = response.message
+        self.reservation_id = response.reservation_id
 
+    def render(self) -> bytes:
+        """
+        Returns the JSON body of the error response.
+        """
+        return self.response.model_dump_json().encode()
 
-class ProductNotFoundException(ReservationException):
-    def __init__(self, reservation_id: int):
-        super().__init__(
-            404,
-            ReservationResponse(
-                status="error",
-                message="Product not found",
-                reservation_id=reservation_id,
-            ),
-        )
 
+class FixedMessageReservationException(ReservationException):
+    """
+    Exception with the same status code and message for every reservation. The start of
+    its JSON body is serialised once per class, raising it builds no response model
+    and rendering it only appends the reservation ID.
+    """
 
-class ProductIsReservedException(ReservationException):
-    def __init__(self, reservation_id: int):
-        super().__init__(
-            409,
-            ReservationResponse(
-                status="error",
-                message="This product is already reserved",
-                reservation_id=reservation_id,
-            ),
-        )
+    status_code: int
+    message: str
+    _body_prefix: bytes
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        body = (
+            ReservationResponse(status="error", message=cls.message, reservation_id=0)
+            .model_dump_json()
+            .encode()
+        )
+        # The reservation ID is the last field, only "0}" is left out
+        cls._body_prefix = body[: -len(b"0}")]
 
-class ReservationClosedException(ReservationException):
     def __init__(self, reservation_id: int):
-        super().__init__(
-            409,
-            ReservationResponse(
-                status="error",
-                message="Reservation is closed or confirmed",
-                reservation_id=reservation_id,
-            ),
+        Exception.__init__(self, reservation_id)
+        self.reservation_id = reservation_id
+
+    @cached_property
+    def response(self) -> ReservationResponse:
+        return ReservationResponse(
+            status="error", message=self.message, reservation_id=self.reservation_id
         )
 
+    def render(self) -> bytes:
+        return b"%s%d}" % (self._body_prefix, self.reservation_id)
 
-class NotEnoughProductsException(ReservationException):
-    def __init__(self, reservation_id: int):
-        super().__init__(
-            422,
-            ReservationResponse(
-                status="error",
-                message="Not enough products available",
-                reservation_id=reservation_id,
-            ),
-        )
 
+class ProductNotFoundException(FixedMessageReservationException):
+    status_code = 404
+    message = "Product not found"
 
-class ReservationIsLockedException(ReservationException):
-    def __init__(self, reservation_id: int):
-        super().__init__(
-            423,
-            ReservationResponse(
-                status="error",
-                message="Reservation is locked by another transaction",
-                reservation_id=reservation_id,
-            ),
-        )
 
+class ProductIsReservedException(FixedMessageReservationException):
+    status_code = 409
+    message = "This product is already reserved"
 
-class ReservationNotFoundException(ReservationException):
-    def __init__(self, reservation_id: int):
+
+class ReservationClosedException(FixedMessageReservationException):
+    status_code = 409
+    message = "Reservation is closed or confirmed"
+
+
+class NotEnoughProductsException(FixedMessageReservationException):
+    status_code = 422
+    message = "Not enough products available"
+
+
+class ReservationIsLockedException(FixedMessageReservationException):
+    status_code = 423
+    message = "Reservation is locked by another transaction"
+
+
+class ReservationNotFoundException(FixedMessageReservationException):
+    status_code = 404
+    message = "Reservation not found"
+
+
+class IdempotencyKeyReusedException(FixedMessageReservationException):
+    status_code = 422
+    message = "Idempotency key was already used for a different request"
+
+
+class BatchReservationException(ReservationException):
+    def __init__(
+        self, status_code: int, reservation_id: int, lines: List[ReservationLineResponse]
+    ):
         super().__init__(
-            404,
-            ReservationResponse(
+            status_code,
+            BatchReservationResponse(
                 status="error",
-                message="Reservation not found",
+                message="Batch reservation failed, no lines were applied",
                 reservation_id=reservation_id,
+                lines=lines,
             ),
         )
@@ -1,20 +1,257 @@
+import atexit
+import json
 import logging
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler
+from typing import Any, Callable, Dict, Hashable, List, Mapping, Optional
+
+from settings import logging_settings
+
+# Attributes every LogRecord has, everything else was passed with `extra` and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_STOP = object()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line, fields passed with `extra` are included.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key != "aggregate_key":
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a share of the records of the given levels, e.g. {"INFO": 0.1} keeps
+    every tenth info record on average. Levels that are not listed are always kept.
+    """
+
+    def __init__(self, rates: Mapping[str, float], rand: Callable[[], float] = random.random):
+        super().__init__()
+        self.rates = {logging.getLevelName(level.upper()): rate for level, rate in rates.items()}
+        self._rand = rand
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno)
+        return rate is None or rate >= 1 or self._rand() < rate
+
+
+class ErrorAggregator:
+    """
+    Writes the first of repeated identical records and counts the rest, at the end
+    of every `interval` one summary record per repeated record is written instead.
+
+    Records are identical when they have the same logger, level and message template,
+    or the same `aggregate_key` passed with `extra`. Only records of `level` and above
+    are aggregated.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        level: int = logging.WARNING,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.interval = interval
+        self.level = level
+        self._clock = clock
+        # Key -> [window start, suppressed records, first record]
+        self._windows: Dict[Hashable, List[Any]] = {}
+
+    def admit(self, record: logging.LogRecord) -> bool:
+        if self.interval <= 0 or record.levelno < self.level:
+            return True
+
+        key = getattr(record, "aggregate_key", None) or (record.name, record.levelno, record.msg)
+        window = self._windows.get(key)
+        if window is None:
+            self._windows[key] = [self._clock(), 0, record]
+            return True
+        window[1] += 1
+        return False
+
+    def due(self, force: bool = False) -> List[logging.LogRecord]:
+        """
+        Closes the finished windows and returns their summary records.
+        """
+        now = self._clock()
+        summaries = []
+        for key, (started, suppressed, first) in list(self._windows.items()):
+            if not force and now - started < self.interval:
+                continue
+            del self._windows[key]
+            if suppressed:
+                summaries.append(self._summary(first, suppressed, now - started))
+        return summaries
+
+    @staticmethod
+    def _summary(first: logging.LogRecord, suppressed: int, seconds: float) -> logging.LogRecord:
+        """
+        Records are grouped by their message template, so the summary shows the template
+        instead of the values of the first record. Records grouped by `aggregate_key` may
+        have different templates, their summary shows the first message and says so.
+        """
+        summary = logging.makeLogRecord(vars(first))
+        if getattr(first, "aggregate_key", None):
+            summary.msg = "%s (first of %d similar records in %.1fs)"
+            summary.args = (first.getMessage(), suppressed + 1, seconds)
+        else:
+            summary.msg = "%s (repeated %d more times in %.1fs)"
+            summary.args = (str(first.msg), suppressed, seconds)
+        summary.exc_info = None
+        summary.exc_text = None
+        summary.created = time.time()
+        summary.repeated = suppressed
+        return summary
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Puts records on a bounded queue without formatting them, records that do not fit
+    are dropped and counted instead of blocking the event loop.
+
+    Messages are formatted by the writer thread, so arguments should not be mutated
+    after they were logged.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            # Tracebacks keep frames alive, they are rendered right away
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogWriter:
+    """
+    Background thread that takes records from the queue, aggregates repeated errors
+    and writes the records with `handler`.
+    """
+
+    def __init__(
+        self,
+        log_queue: queue.Queue,
+        handler: logging.Handler,
+        aggregator: Optional[ErrorAggregator] = None,
+        tick: float = 1.0,
+    ):
+        self.queue = log_queue
+        self.handler = handler
+        self.aggregator = aggregator
+        self.tick = tick
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Writes the queued records and the pending summaries and stops the thread.
+        """
+        if self._thread is None:
+            return
+        self.queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                record = self.queue.get(timeout=self.tick)
+            except queue.Empty:
+                record = None
+
+            if record is _STOP:
+                self._write_summaries(force=True)
+                try:
+                    self.handler.flush()
+                except (OSError, ValueError):
+                    # The stream can already be closed at interpreter exit
+                    pass
+                return
+            if record is not None and (self.aggregator is None or self.aggregator.admit(record)):
+                self.handler.handle(record)
+            self._write_summaries()
+
+    def _write_summaries(self, force: bool = False) -> None:
+        if self.aggregator is not None:
+            for summary in self.aggregator.due(force):
+                self.handler.handle(summary)
+
+
+def truncate_body(body_prefix: bytes, size: int) -> str:
+    """
+    Decodes the logged prefix of a request body, the size of the whole body is
+    appended when the prefix is shorter.
+    """
+    text = body_prefix.decode("utf-8", errors="replace")
+    if size > len(body_prefix):
+        return f"{text}... ({size} bytes)"
+    return text
 
 
 def setup_logging():
     """
     Setups logging configuration.
+
+    Records are put on a queue by the calling code and written by
+    a background thread, so slow writes never block the event loop.
     """
-    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if logging_settings.LOG_FORMAT == "json":
+        formatter: logging.Formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
 
+    log_queue: queue.Queue = queue.Queue(logging_settings.LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(logging_settings.LOG_SAMPLE_RATES))
+
+    aggregator = ErrorAggregator(
+        interval=logging_settings.LOG_AGGREGATE_INTERVAL_SECONDS,
+        level=logging.getLevelName(logging_settings.LOG_AGGREGATE_LEVEL.upper()),
+    )
+    log_writer = LogWriter(log_queue, console_handler, aggregator)
+    log_writer.start()
+
     logger = logging.getLogger("reservation_app")
-    logger.setLevel(logging.INFO)
-    logger.addHandler(console_handler)
+    logger.setLevel(logging_settings.LOG_LEVEL.upper())
+    logger.addHandler(queue_handler)
 
-    return logger
+    return logger, log_writer
 
 
-logger = setup_logging()
+logger, log_writer = setup_logging()
+atexit.register(log_writer.stop)
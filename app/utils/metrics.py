@@ -0,0 +1,247 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from settings import metrics_settings
+
+Labels = Tuple[Tuple[str, str], ...]
+# Name, labels and value read at collection time
+Sample = Tuple[str, Labels, float]
+
+# Upper bounds in seconds, tuned for requests that take from one to a few hundred milliseconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsRegistry:
+    """
+    In-process counters, histograms and gauges rendered in the Prometheus text format.
+
+    Updates are plain dictionary operations on the event loop thread, there are no locks.
+    With a shared `directory` every worker writes its snapshot to its own file and
+    a scrape of any worker merges the snapshots of all workers: counters and histograms
+    are summed over all files, gauges only over files of workers that are still alive.
+    """
+
+    def __init__(
+        self,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        directory: Optional[str] = None,
+        stale_after: float = 60,
+    ):
+        self.buckets = tuple(buckets)
+        self.directory = directory
+        self.stale_after = stale_after
+        self._descriptions: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        # Per bucket counts (not cumulative), then sum and count
+        self._histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        self._callbacks: List[Callable[[], Iterable[Sample]]] = []
+
+    def describe(self, name: str, metric_type: str, help_text: str) -> None:
+        self._descriptions[name] = (metric_type, help_text)
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1) -> None:
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def inc_gauge(self, name: str, labels: Labels = (), value: float = 1) -> None:
+        key = (name, labels)
+        self._gauges[key] = self._gauges.get(key, 0) + value
+
+    def observe(self, name: str, labels: Labels, value: float) -> None:
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = [0.0] * (len(self.buckets) + 3)
+        # The last bucket before sum and count is +Inf
+        histogram[bisect_left(self.buckets, value)] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+    def add_callback(self, callback: Callable[[], Iterable[Sample]]) -> None:
+        """
+        Registers a function that returns samples of existing stats, it is called on every
+        collection. Samples of metrics described as counters are counters, others are gauges.
+        """
+        self._callbacks.append(callback)
+
+    def snapshot(self) -> dict:
+        counters = [[name, list(key), value] for (name, key), value in self._counters.items()]
+        gauges = [[name, list(key), value] for (name, key), value in self._gauges.items()]
+        for callback in self._callbacks:
+            for name, labels, value in callback():
+                is_counter = self._descriptions.get(name, ("gauge",))[0] == "counter"
+                (counters if is_counter else gauges).append([name, list(labels), value])
+        return {
+            "counters": counters,
+            "histograms": [
+                [name, list(labels), histogram]
+                for (name, labels), histogram in self._histograms.items()
+            ],
+            "gauges": gauges,
+        }
+
+    def write_snapshot(self) -> None:
+        """
+        Writes the snapshot of this worker to the shared directory.
+        """
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f"metrics-{os.getpid()}.json")
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w") as snapshot_file:
+            json.dump(self.snapshot(), snapshot_file)
+        os.replace(temporary_path, path)
+
+    def collect(self) -> str:
+        """
+        Renders the metrics of this worker, or of all workers with a shared directory.
+        """
+        if not self.directory:
+            return self.render([self.snapshot()], [True])
+
+        self.write_snapshot()
+        snapshots, alive = [], []
+        now = time.time()
+        for file_name in sorted(os.listdir(self.directory)):
+            if not file_name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, file_name)
+            try:
+                with open(path) as snapshot_file:
+                    snapshots.append(json.load(snapshot_file))
+                alive.append(now - os.path.getmtime(path) < self.stale_after)
+            except (OSError, ValueError):
+                # The file was removed or is being replaced by its worker
+                continue
+        return self.render(snapshots, alive)
+
+    def render(self, snapshots: List[dict], alive: List[bool]) -> str:
+        counters: Dict[Tuple[str, Labels], float] = {}
+        gauges: Dict[Tuple[str, Labels], float] = {}
+        histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        for snapshot, is_alive in zip(snapshots, alive):
+            for name, labels, value in snapshot["counters"]:
+                key = (name, _labels(labels))
+                counters[key] = counters.get(key, 0) + value
+            if is_alive:
+                for name, labels, value in snapshot["gauges"]:
+                    key = (name, _labels(labels))
+                    gauges[key] = gauges.get(key, 0) + value
+            for name, labels, values in snapshot["histograms"]:
+                key = (name, _labels(labels))
+                merged = histograms.setdefault(key, [0.0] * len(values))
+                for index, value in enumerate(values):
+                    merged[index] += value
+
+        lines: List[str] = []
+        for metric_type, samples in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({name for name, _ in samples}):
+                lines.extend(self._header(name, metric_type))
+                for (sample_name, labels), value in sorted(samples.items()):
+                    if sample_name == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for name in sorted({name for name, _ in histograms}):
+            lines.extend(self._header(name, "histogram"))
+            for (sample_name, labels), values in sorted(histograms.items()):
+                if sample_name != name:
+                    continue
+                cumulative = 0.0
+                for bound, count in zip((*self.buckets, "+Inf"), values):
+                    cumulative += count
+                    bucket_labels = labels + (("le", str(bound)),)
+                    lines.append(
+                        f"{name}_bucket{_format_labels(bucket_labels)} {_format_value(cumulative)}"
+                    )
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(values[-2])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {_format_value(values[-1])}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, name: str, metric_type: str) -> List[str]:
+        _, help_text = self._descriptions.get(name, (metric_type, name))
+        return [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+
+
+def _labels(labels: Iterable[Sequence[str]]) -> Labels:
+    return tuple((key, value) for key, value in labels)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+metrics = MetricsRegistry(
+    directory=metrics_settings.METRICS_DIR,
+    stale_after=metrics_settings.METRICS_FLUSH_INTERVAL_SECONDS * 3,
+)
+metrics.describe("http_requests_total", "counter", "HTTP requests by method, route and status")
+metrics.describe(
+    "http_request_duration_seconds", "histogram", "HTTP request duration by method and route"
+)
+metrics.describe("http_exceptions_total", "counter", "Exceptions raised by requests, by class")
+metrics.describe("db_sessions_in_flight", "gauge", "Database sessions held by requests")
+metrics.describe("db_pool_size", "gauge", "Connections kept by the pool")
+metrics.describe("replica_fallbacks_total", "counter", "Replica reads sent to the primary")
+metrics.describe("db_pool_checked_out", "gauge", "Pool connections in use")
+metrics.describe("db_pool_overflow", "gauge", "Connections opened above the pool size")
+metrics.describe("status_cache_size", "gauge", "Entries in the reservation status cache")
+metrics.describe("status_cache_events_total", "counter", "Reservation status cache events")
+metrics.describe("status_waiters", "gauge", "Requests waiting for a status change")
+metrics.describe("status_waiter_wakeups_total", "counter", "Waiting requests woken by a change")
+metrics.describe(
+    "status_waiters_rejected_total", "counter", "Waiting requests rejected over the limit"
+)
+metrics.describe("lock_conflicts_total", "counter", "Attempts that failed on a locked row")
+metrics.describe("lock_retries_total", "counter", "Retries after a lock conflict")
+metrics.describe("lock_retries_exhausted_total", "counter", "Requests that gave up on a lock")
+metrics.describe(
+    "lock_waited_requests_total", "counter", "Requests that hit at least one lock conflict"
+)
+metrics.describe(
+    "lock_wait_seconds_total", "counter", "Time requests spent on lock conflicts and retries"
+)
+metrics.describe(
+    "lock_wait_seconds_max", "gauge", "Longest lock wait of a request, summed over workers"
+)
+metrics.describe("expired_reservations_total", "counter", "Reservations cancelled by the sweeper")
+metrics.describe("expiry_sweeps_failed_total", "counter", "Expiry sweeps that failed")
+metrics.describe(
+    "expiry_batches_skipped_total", "counter", "Expiry batches skipped on locked products"
+)
+metrics.describe("idempotent_replays_total", "counter", "Responses replayed for idempotency keys")
+metrics.describe("idempotency_keys_deleted_total", "counter", "Expired idempotency keys deleted")
+metrics.describe("stock_snapshot_refreshes_total", "counter", "Reloads of the stock snapshot")
+metrics.describe(
+    "stock_snapshot_refreshes_failed_total", "counter", "Failed reloads of the stock snapshot"
+)
+metrics.describe("stock_snapshot_age_seconds", "gauge", "Age of the stock snapshot")
+metrics.describe(
+    "stock_buckets_rebalanced_total", "counter", "Bucketed products whose stock was spread again"
+)
+metrics.describe(
+    "stock_bucket_rebalances_failed_total", "counter", "Stock bucket rebalance runs that failed"
+)
+metrics.describe("imported_products_total", "counter", "Products inserted or updated by imports")
+metrics.describe("outbox_events_published_total", "counter", "Outbox events delivered")
+metrics.describe("outbox_batches_total", "counter", "Outbox batches delivered")
+metrics.describe("outbox_relay_runs_failed_total", "counter", "Outbox relay runs that failed")
+metrics.describe(
+    "outbox_lag_seconds", "gauge", "Delivery delay of the oldest event in the last outbox batch"
+)
+metrics.describe("log_records_dropped_total", "counter", "Log records dropped on a full queue")
@@ -0,0 +1,110 @@
+import csv
+import json
+from typing import AsyncIterator, Dict, List, Tuple, Union
+
+# Line number of a record and its fields, or the reason it could not be parsed
+Record = Tuple[int, Union[Dict[str, object], ValueError]]
+
+
+def _decode(line: bytes, line_number: int) -> Union[str, ValueError]:
+    try:
+        text = line.decode()
+    except UnicodeDecodeError as exc:
+        return ValueError(f"Line is not valid UTF-8: {exc.reason}")
+    if line_number == 1:
+        text = text.removeprefix("\ufeff")
+    return text.removesuffix("\r")
+
+
+async def iter_lines(
+    chunks: AsyncIterator[bytes], max_line_bytes: int
+) -> AsyncIterator[Tuple[int, Union[str, ValueError]]]:
+    """
+    Splits a byte stream into decoded lines, at most one incomplete line is buffered.
+    Lines longer than `max_line_bytes` are dropped as they arrive and reported as a ValueError.
+    """
+    too_long = ValueError(f"Line is longer than {max_line_bytes} bytes")
+    buffer = b""
+    skipping = False
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if skipping or len(line) > max_line_bytes:
+                skipping = False
+                yield line_number, too_long
+            else:
+                yield line_number, _decode(line, line_number)
+        if len(buffer) > max_line_bytes:
+            skipping = True
+            buffer = b""
+
+    if skipping:
+        yield line_number + 1, too_long
+    elif buffer:
+        yield line_number + 1, _decode(buffer, line_number + 1)
+
+
+async def iter_ndjson_records(
+    chunks: AsyncIterator[bytes], max_line_bytes: int
+) -> AsyncIterator[Record]:
+    """
+    Parses newline-delimited JSON objects as they arrive, blank lines are skipped.
+    """
+    async for line_number, line in iter_lines(chunks, max_line_bytes):
+        if isinstance(line, ValueError):
+            yield line_number, line
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield line_number, ValueError(f"Invalid JSON: {exc.msg}")
+            continue
+        if not isinstance(record, dict):
+            yield line_number, ValueError("Line is not a JSON object")
+        else:
+            yield line_number, record
+
+
+async def iter_csv_records(
+    chunks: AsyncIterator[bytes], max_line_bytes: int
+) -> AsyncIterator[Record]:
+    """
+    Parses CSV rows with a header line as they arrive. Quoted fields may span lines,
+    a record ends at the first line break outside of quotes.
+    """
+    header: List[str] = []
+    record_lines: List[str] = []
+    record_start = 0
+    async for line_number, line in iter_lines(chunks, max_line_bytes):
+        if isinstance(line, ValueError):
+            record_lines = []
+            yield line_number, line
+            continue
+        if not record_lines:
+            record_start = line_number
+        record_lines.append(line)
+        text = "\n".join(record_lines)
+        # Escaped quotes come in pairs, an odd count means a quoted field continues
+        if text.count('"') % 2:
+            continue
+        record_lines = []
+        if not text.strip():
+            continue
+
+        fields = next(csv.reader([text]))
+        if not header:
+            header = [name.strip() for name in fields]
+        elif len(fields) != len(header):
+            yield record_start, ValueError(
+                f"Expected {len(header)} fields, got {len(fields)}"
+            )
+        else:
+            yield record_start, dict(zip(header, fields))
+
+    if record_lines:
+        yield record_start, ValueError("Unterminated quoted field")
@@ -0,0 +1,5 @@
+from fastapi.responses import ORJSONResponse
+
+# Responses of the routes are encoded with orjson, it encodes the response models several
+# times faster than the json module used by JSONResponse
+DefaultResponse = ORJSONResponse
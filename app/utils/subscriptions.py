@@ -0,0 +1,135 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, Generic, Hashable, Optional, Set, TypeVar
+
+from settings import status_push_settings
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class SubscriptionLimitError(Exception):
+    pass
+
+
+@dataclass
+class SubscriptionStats:
+    subscriptions: int = 0
+    wakeups: int = 0
+    rejected: int = 0
+
+
+class Subscription(Generic[K, V]):
+    """
+    Receives the values published for one key until it is closed. Only the latest value
+    is kept, a subscriber that was busy while several values were published gets the last one.
+    """
+
+    __slots__ = ("key", "_registry", "_value", "_event")
+
+    def __init__(self, key: K, registry: "SubscriptionRegistry[K, V]"):
+        self.key = key
+        self._registry: Optional[SubscriptionRegistry[K, V]] = registry
+        self._value: Any = None
+        self._event = asyncio.Event()
+
+    async def wait(self, timeout: float) -> Optional[V]:
+        """
+        Returns the next published value, or None if nothing was published in `timeout` seconds.
+        """
+        if not self._event.is_set():
+            try:
+                async with asyncio.timeout(timeout):
+                    await self._event.wait()
+            except TimeoutError:
+                return None
+        self._event.clear()
+        return self._value
+
+    def close(self) -> None:
+        if self._registry is not None:
+            self._registry._remove(self)
+            self._registry = None
+
+    def _publish(self, value: V) -> None:
+        self._value = value
+        self._event.set()
+
+    def __enter__(self) -> "Subscription[K, V]":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class SubscriptionRegistry(Generic[K, V]):
+    """
+    In-process registry of coroutines waiting for values published for a key, e.g. requests
+    waiting for a status change. Waiting costs no polling, publishing wakes only
+    the subscribers of the key.
+
+    At most `max_subscriptions` are open at a time, so idle waiters use bounded memory.
+    Values are published only within the process, other workers do not see them.
+    """
+
+    def __init__(self, max_subscriptions: int):
+        self.max_subscriptions = max_subscriptions
+        self._subscriptions: Dict[K, Set[Subscription[K, V]]] = {}
+        self._count = 0
+        self._stats = SubscriptionStats()
+
+    def subscribe(self, key: K) -> Subscription[K, V]:
+        """
+        Opens a subscription to the values published for the key from now on, it has to be
+        closed, e.g. by using it as a context manager.
+
+        Raises:
+            SubscriptionLimitError: If `max_subscriptions` are open already.
+        """
+        if self._count >= self.max_subscriptions:
+            self._stats.rejected += 1
+            raise SubscriptionLimitError(f"{self._count} subscriptions are open")
+        subscription: Subscription[K, V] = Subscription(key, self)
+        self._subscriptions.setdefault(key, set()).add(subscription)
+        self._count += 1
+        return subscription
+
+    def publish(self, key: K, value: V) -> int:
+        """
+        Wakes all subscribers of the key with the value.
+
+        Returns:
+            int: Number of woken subscribers.
+        """
+        subscribers = self._subscriptions.get(key)
+        if not subscribers:
+            return 0
+        for subscription in subscribers:
+            subscription._publish(value)
+        self._stats.wakeups += len(subscribers)
+        return len(subscribers)
+
+    def stats(self) -> SubscriptionStats:
+        return SubscriptionStats(
+            subscriptions=self._count,
+            wakeups=self._stats.wakeups,
+            rejected=self._stats.rejected,
+        )
+
+    def _remove(self, subscription: Subscription[K, V]) -> None:
+        subscribers = self._subscriptions.get(subscription.key)
+        if subscribers is None or subscription not in subscribers:
+            return
+        subscribers.remove(subscription)
+        self._count -= 1
+        if not subscribers:
+            del self._subscriptions[subscription.key]
+
+    def __len__(self) -> int:
+        return self._count
+
+
+# Reservation ID -> new status, published after every committed status change of this worker
+reservation_status_subscriptions: SubscriptionRegistry[int, str] = SubscriptionRegistry(
+    max_subscriptions=status_push_settings.STATUS_MAX_WAITERS
+)
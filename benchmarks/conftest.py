@@ -0,0 +1,20 @@
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+MICRO_DIR = Path(__file__).parent / "micro"
+
+
+def pytest_ignore_collect(collection_path: Path, config: pytest.Config) -> Optional[bool]:
+    """
+    Keeps the microbenchmarks out of the regular test run,
+    they are collected only when their directory or one of their files is passed to pytest.
+    """
+    if collection_path != MICRO_DIR:
+        return None
+    for arg in config.args:
+        target = (config.invocation_params.dir / arg.split("::")[0]).resolve()
+        if target == MICRO_DIR or MICRO_DIR in target.parents:
+            return None
+    return True
@@ -0,0 +1,125 @@
+"""
+Compares requests per second of the previous error responses, a pydantic response model
+built in every exception and encoded by JSONResponse, with the preallocated error bodies
+and the orjson default response class, on an error-heavy workload.
+
+A closed loop keeps `--concurrency` requests in flight against a minimal app with the
+reservation route, `--error-share` of the requests fail with 423 like under flash-sale load.
+The app runs in process over httpx's ASGI transport, so the numbers contain no network time:
+
+    python -m benchmarks.error_responses --requests 20000 --error-share 0.9
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from httpx import ASGITransport, AsyncClient
+
+from app.main import reservation_exception_handler
+from app.utils.dto import ReservationDTO, ReservationResponse
+from app.utils.exceptions import ReservationException, ReservationIsLockedException
+from app.utils.logging import logger
+from app.utils.responses import DefaultResponse
+
+
+class EagerLockedException(ReservationException):
+    """
+    The previous exception, it builds its response model when it is raised.
+    """
+
+    def __init__(self, reservation_id: int):
+        super().__init__(
+            423,
+            ReservationResponse(
+                status="error",
+                message="Reservation is locked by another transaction",
+                reservation_id=reservation_id,
+            ),
+        )
+
+
+async def previous_exception_handler(request, exc: ReservationException):
+    return JSONResponse(status_code=exc.status_code, content=exc.response.model_dump())
+
+
+def make_app(preallocated: bool, error_share: float) -> FastAPI:
+    app = FastAPI(default_response_class=DefaultResponse if preallocated else JSONResponse)
+    locked_exception = ReservationIsLockedException if preallocated else EagerLockedException
+    app.add_exception_handler(
+        ReservationException,
+        reservation_exception_handler if preallocated else previous_exception_handler,
+    )
+
+    @app.post("/reservation/make", response_model=ReservationResponse)
+    async def make(reservation_dto: ReservationDTO) -> ReservationResponse:
+        if reservation_dto.reservation_id % 1000 < error_share * 1000:
+            raise locked_exception(reservation_dto.reservation_id)
+        return ReservationResponse(
+            status="success",
+            message="Reservation created/updated",
+            reservation_id=reservation_dto.reservation_id,
+        )
+
+    return app
+
+
+async def run(app: FastAPI, requests: int, concurrency: int) -> dict:
+    remaining = iter(range(requests))
+    status_codes = {}
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+
+        async def connection() -> None:
+            for number in remaining:
+                response = await client.post(
+                    "/reservation/make",
+                    json={
+                        "reservation_id": number + 1,
+                        "product_id": 1,
+                        "quantity": 1,
+                        "timestamp": "2025-01-01T00:00:00Z",
+                    },
+                )
+                status_codes[response.status_code] = status_codes.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(connection() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests_per_second": round(requests / elapsed, 1),
+        "statuses": {str(status): count for status, count in sorted(status_codes.items())},
+    }
+
+
+async def main(requests: int, concurrency: int, error_share: float) -> dict:
+    previous = await run(make_app(False, error_share), requests, concurrency)
+    preallocated = await run(make_app(True, error_share), requests, concurrency)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "error_share": error_share,
+        "default_response_class": DefaultResponse.__name__,
+        "previous": previous,
+        "preallocated": preallocated,
+        "speedup": round(
+            preallocated["requests_per_second"] / previous["requests_per_second"], 2
+        ),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--error-share", type=float, default=0.9)
+    args = parser.parse_args()
+    # Both apps log the same error lines, they are left out to compare the responses only
+    logger.setLevel(logging.CRITICAL)
+    result = asyncio.run(main(args.requests, args.concurrency, args.error_share))
+    print(json.dumps(result, indent=2))
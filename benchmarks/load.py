@@ -0,0 +1,316 @@
+"""
+Contention-aware load generator for the reservation API.
+
+Every virtual user repeatedly opens a reservation: it reserves a basket of products with
+`/reservation/make`, polls `/reservation/status` and confirms a share of the reservations
+with `/reservation/confirm`. Products are picked with a Zipf distribution, so a few hot
+products get most of the traffic like in production.
+
+By default the app runs in process over httpx's ASGI transport against `--db-url`, with
+`--base-url` a running server is load tested instead, `--db-url` must then point to its
+database. Products are seeded into the database before the run and checked for oversells
+after it, SQLite takes no row locks, so its stock is only exact with --concurrency 1.
+Results are printed and written as JSON, so runs can be compared across commits:
+
+    python -m benchmarks.load --db-url postgresql+asyncpg://... --zipf 1.2 --concurrency 64
+    python -m benchmarks.load --db-url sqlite+aiosqlite:///load.db --sessions 500
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app import routes
+from app.db.models import (
+    Base,
+    Product,
+    ProductReservation,
+    ProductStockBucket,
+    Reservation,
+    ReservationStatus,
+)
+from app.dependencies import get_db_read_session, get_db_session
+from app.main import app
+from settings import db_settings
+
+ENDPOINTS = ("make", "status", "confirm")
+
+
+@dataclass
+class EndpointStats:
+    latencies: List[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+
+    def summary(self, seconds: float) -> dict:
+        latencies = sorted(self.latencies)
+        requests = len(latencies)
+
+        def percentile(share: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(int(requests * share), requests - 1)] * 1000, 3)
+
+        return {
+            "requests": requests,
+            "requests_per_second": round(requests / seconds, 1),
+            "latency_ms_p50": percentile(0.50),
+            "latency_ms_p95": percentile(0.95),
+            "latency_ms_p99": percentile(0.99),
+            "rate_423": round(self.statuses[423] / requests, 4) if requests else 0,
+            "rate_422": round(self.statuses[422] / requests, 4) if requests else 0,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+        }
+
+
+class ZipfSampler:
+    """
+    Picks product IDs with probability proportional to 1 / rank ** exponent,
+    the first product is the most popular one. An exponent of 0 is uniform.
+    """
+
+    def __init__(self, product_ids: List[int], exponent: float, rng: random.Random):
+        self.product_ids = product_ids
+        self.cum_weights = list(
+            itertools.accumulate(1 / rank**exponent for rank in range(1, len(product_ids) + 1))
+        )
+        self.rng = rng
+
+    def basket(self, size: int) -> List[int]:
+        """
+        Returns `size` distinct product IDs.
+        """
+        size = min(size, len(self.product_ids))
+        basket: Dict[int, None] = {}
+        while len(basket) < size:
+            for product_id in self.rng.choices(
+                self.product_ids, cum_weights=self.cum_weights, k=size - len(basket)
+            ):
+                basket[product_id] = None
+        return list(basket)
+
+
+async def seed_products(
+    session_factory: async_sessionmaker, products: int, stock: int
+) -> Dict[int, int]:
+    """
+    Adds the benchmark products and returns their IDs with the initial stock.
+    """
+    async with session_factory() as session:
+        rows = [
+            Product(name=f"Load test product {number}", price=100, quantity=stock)
+            for number in range(products)
+        ]
+        session.add_all(rows)
+        await session.commit()
+        return {row.id: stock for row in rows}
+
+
+async def check_stock(session_factory: async_sessionmaker, initial: Dict[int, int]) -> dict:
+    """
+    Checks that no stock was lost or oversold: for every product the stock left in the row
+    and its buckets plus the quantity held by reservations that are not cancelled
+    must be its initial stock, and no stock may be negative.
+    """
+    product_ids = list(initial)
+    async with session_factory() as session:
+        left = dict(
+            (
+                await session.execute(
+                    select(Product.id, Product.quantity).where(Product.id.in_(product_ids))
+                )
+            ).all()
+        )
+        in_buckets = dict(
+            (
+                await session.execute(
+                    select(ProductStockBucket.product_id, func.sum(ProductStockBucket.quantity))
+                    .where(ProductStockBucket.product_id.in_(product_ids))
+                    .group_by(ProductStockBucket.product_id)
+                )
+            ).all()
+        )
+        negative_buckets = await session.scalar(
+            select(func.count()).where(
+                ProductStockBucket.product_id.in_(product_ids), ProductStockBucket.quantity < 0
+            )
+        )
+        reserved = dict(
+            (
+                await session.execute(
+                    select(
+                        ProductReservation.product_id,
+                        func.sum(ProductReservation.reservation_quantity),
+                    )
+                    .join(Reservation, Reservation.id == ProductReservation.reservation_id)
+                    .where(
+                        ProductReservation.product_id.in_(product_ids),
+                        Reservation.status != ReservationStatus.CANCELLED.value,
+                    )
+                    .group_by(ProductReservation.product_id)
+                )
+            ).all()
+        )
+
+    mismatched = [
+        product_id
+        for product_id, stock in initial.items()
+        if left[product_id] + in_buckets.get(product_id, 0) + reserved.get(product_id, 0) != stock
+    ]
+    oversold = [product_id for product_id in product_ids if left[product_id] < 0]
+    return {
+        "reserved_units": sum(reserved.values()),
+        "mismatched_products": mismatched,
+        "oversold_products": oversold,
+        "negative_buckets": negative_buckets,
+        "stock_is_exact": not mismatched and not oversold and not negative_buckets,
+    }
+
+
+async def run_load(
+    client: AsyncClient, sampler: ZipfSampler, args: argparse.Namespace, first_id: int
+):
+    stats = {endpoint: EndpointStats() for endpoint in ENDPOINTS}
+    reservation_ids = itertools.count(first_id)
+    sessions = iter(range(args.sessions))
+    rng = sampler.rng
+
+    async def call(endpoint: str, method: str, url: str, **kwargs) -> int:
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        stats[endpoint].latencies.append(time.perf_counter() - started)
+        stats[endpoint].statuses[response.status_code] += 1
+        return response.status_code
+
+    async def virtual_user() -> None:
+        for _ in sessions:
+            reservation_id = next(reservation_ids)
+            basket = sampler.basket(rng.randint(args.basket_min, args.basket_max))
+            reserved = False
+            for product_id in basket:
+                status_code = await call(
+                    "make",
+                    "POST",
+                    "/reservation/make",
+                    json={
+                        "reservation_id": reservation_id,
+                        "product_id": product_id,
+                        "quantity": rng.randint(1, args.max_quantity),
+                        "timestamp": datetime.now(timezone.utc).isoformat(),
+                    },
+                )
+                reserved = reserved or status_code == 200
+            if not reserved:
+                continue
+            for _ in range(args.status_polls):
+                await call("status", "GET", f"/reservation/status/{reservation_id}")
+            if rng.random() < args.confirm_ratio:
+                await call("confirm", "PUT", f"/reservation/confirm/{reservation_id}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user() for _ in range(args.concurrency)))
+    return stats, time.perf_counter() - started
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args: argparse.Namespace) -> dict:
+    engine = create_async_engine(args.db_url, pool_size=args.concurrency, max_overflow=0)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    initial_stock = await seed_products(session_factory, args.products, args.stock)
+    # Reservation IDs continue after the existing ones, so runs against the same database
+    # do not collide with each other
+    async with session_factory() as session:
+        first_id = await session.scalar(select(func.coalesce(func.max(Reservation.id), 0))) + 1
+
+    rng = random.Random(args.seed)
+    sampler = ZipfSampler(list(initial_stock), args.zipf, rng)
+
+    if args.base_url:
+        client = AsyncClient(base_url=args.base_url, timeout=30)
+    else:
+        async def get_benchmark_session():
+            async with session_factory() as session:
+                yield session
+
+        app.dependency_overrides[get_db_session] = get_benchmark_session
+        app.dependency_overrides[get_db_read_session] = get_benchmark_session
+        routes.async_session_factory = session_factory
+        client = AsyncClient(transport=ASGITransport(app=app), base_url="http://load")
+
+    async with client:
+        stats, seconds = await run_load(client, sampler, args, first_id)
+
+    stock = await check_stock(session_factory, initial_stock)
+    await engine.dispose()
+
+    requests = sum(len(endpoint.latencies) for endpoint in stats.values())
+    return {
+        "commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("db_url", "output")
+        },
+        "database": engine.dialect.name,
+        "seconds": round(seconds, 3),
+        "requests": requests,
+        "requests_per_second": round(requests / seconds, 1),
+        "endpoints": {endpoint: stats[endpoint].summary(seconds) for endpoint in ENDPOINTS},
+        "stock": stock,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db-url", default=db_settings.DB_URL)
+    parser.add_argument("--base-url", help="Load test a running server instead of the app")
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--stock", type=int, default=1_000)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Popularity skew, 0 is uniform")
+    parser.add_argument("--sessions", type=int, default=2_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--basket-min", type=int, default=1)
+    parser.add_argument("--basket-max", type=int, default=3)
+    parser.add_argument("--max-quantity", type=int, default=3)
+    parser.add_argument("--status-polls", type=int, default=2)
+    parser.add_argument("--confirm-ratio", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="JSON result file, by default in benchmarks/results/")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    result = asyncio.run(main(arguments))
+    output = arguments.output or os.path.join(
+        "benchmarks",
+        "results",
+        f"load-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{result['commit'] or 'unknown'}.json",
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as result_file:
+        json.dump(result, result_file, indent=2)
+    print(json.dumps(result, indent=2))
+    print(f"Results written to {output}")
@@ -0,0 +1,121 @@
+"""
+Measures the time logging takes on the event loop per request.
+
+Every simulated request logs what a reservation request logs: the request line with
+the body, two info messages, an error and the response line. The "sync" mode is the
+previous setup, f-strings and a StreamHandler writing on the calling thread, the
+"queue" mode is the current one, lazy arguments put on the queue of the writer thread.
+A slow sink can be simulated with --write-latency-us, e.g. a blocked stdout pipe.
+
+The writer thread still formats records under the GIL, so with a fast sink and
+no sampling the queue mode is not cheaper, the saving comes from writes that block:
+
+    python -m benchmarks.logging_overhead --requests 20000 --write-latency-us 50
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import queue
+import time
+
+from app.utils.logging import (
+    ErrorAggregator,
+    JsonFormatter,
+    LogWriter,
+    NonBlockingQueueHandler,
+    truncate_body,
+)
+
+BODY = json.dumps(
+    {"reservation_id": 1, "product_id": 2, "quantity": 3, "timestamp": "2025-01-01T00:00:00Z"}
+).encode()
+
+
+class SlowStream(io.StringIO):
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    def write(self, text: str) -> int:
+        if self.latency:
+            time.sleep(self.latency)
+        return super().write(text)
+
+
+def make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(f"benchmark.{name}")
+    logger.handlers = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+async def request_sync(logger: logging.Logger, reservation_id: int) -> None:
+    logger.info(f" - Request: POST /reservation/make - Body: {BODY.decode('utf-8')}")
+    logger.info(f"Reservation with id {reservation_id} not found, adding new one.")
+    logger.info("Reservation was created/updated successfully. Product: 2 Remaining quantity: 7")
+    logger.error(f"Reservation Exception: Status Code: 423 - Reservation ID: {reservation_id}")
+    logger.info("Response: Status 423 - Method: POST - URL: /reservation/make")
+
+
+async def request_queue(logger: logging.Logger, reservation_id: int) -> None:
+    body = truncate_body(BODY[:1024], len(BODY))
+    logger.info("Request: %s %s", "POST", "/reservation/make", extra={"body": body})
+    logger.info("Reservation with id %s not found, adding new one.", reservation_id)
+    logger.info(
+        "Reservation was created/updated successfully. Product: %s Remaining quantity: %s", 2, 7
+    )
+    logger.error(
+        "Reservation Exception: Status Code: %s - Reservation ID: %s",
+        423,
+        reservation_id,
+        extra={"aggregate_key": "ReservationIsLockedException"},
+    )
+    logger.info("Response: Status %s - Method: %s - URL: %s", 423, "POST", "/reservation/make")
+
+
+async def measure(request, logger: logging.Logger, requests: int) -> float:
+    """
+    Returns the event loop time per request in microseconds.
+    """
+    started = time.perf_counter()
+    for reservation_id in range(requests):
+        await request(logger, reservation_id)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def main(requests: int, write_latency: float) -> dict:
+    sync_handler = logging.StreamHandler(SlowStream(write_latency))
+    sync_handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    )
+    sync_us = await measure(request_sync, make_logger("sync", sync_handler), requests)
+
+    log_queue: queue.Queue = queue.Queue(requests * 5)
+    output = logging.StreamHandler(SlowStream(write_latency))
+    output.setFormatter(JsonFormatter())
+    writer = LogWriter(log_queue, output, ErrorAggregator(interval=1))
+    writer.start()
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_us = await measure(request_queue, make_logger("queue", queue_handler), requests)
+    writer.stop()
+
+    return {
+        "requests": requests,
+        "write_latency_us": write_latency * 1e6,
+        "sync_us_per_request": round(sync_us, 2),
+        "queue_us_per_request": round(queue_us, 2),
+        "saved_us_per_request": round(sync_us - queue_us, 2),
+        "dropped": queue_handler.dropped,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--write-latency-us", type=float, default=0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main(args.requests, args.write_latency_us / 1e6)), indent=2))
@@ -0,0 +1,97 @@
+"""
+Microbenchmarks of the hot path, they need pytest-benchmark and run only when this
+directory is passed to pytest explicitly:
+
+    pytest benchmarks/micro --benchmark-save=baseline
+    pytest benchmarks/micro --benchmark-compare --benchmark-compare-fail=mean:20%
+
+The first command stores a baseline under `.benchmarks/`, the second one compares every
+benchmark with the latest stored run and fails if its mean got more than 20% slower.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db.crud import set_stock_buckets
+from app.db.models import Base, Product, ProductReservation, Reservation, ReservationStatus
+
+PRODUCTS = 1_000
+RESERVATIONS = 1_000
+# Products 1 to BUCKETED_PRODUCTS keep their stock in buckets
+BUCKETED_PRODUCTS = 10
+BUCKETS = 8
+
+
+async def seed(session: AsyncSession) -> None:
+    session.add_all(
+        Product(id=product_id, name=f"Product {product_id}", price=100, quantity=1_000_000)
+        for product_id in range(1, PRODUCTS + 1)
+    )
+    session.add_all(
+        Reservation(id=reservation_id, status=ReservationStatus.PENDING.value)
+        for reservation_id in range(1, RESERVATIONS + 1)
+    )
+    await session.flush()
+    session.add_all(
+        ProductReservation(
+            reservation_id=reservation_id,
+            product_id=product_id,
+            reservation_quantity=1,
+            date=datetime(2025, 1, 1),
+        )
+        for reservation_id in range(1, RESERVATIONS + 1)
+        for product_id in (reservation_id, reservation_id % PRODUCTS + 1)
+    )
+    for product_id in range(1, BUCKETED_PRODUCTS + 1):
+        await set_stock_buckets(product_id, BUCKETS, session)
+    await session.commit()
+
+
+@pytest.fixture(scope="session")
+def event_loop_for_benchmarks():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def seeded_session_factory(tmp_path_factory, event_loop_for_benchmarks):
+    """
+    Session factory of a SQLite database file with PRODUCTS products and RESERVATIONS
+    pending reservations with two lines each.
+    """
+    path = tmp_path_factory.mktemp("micro") / "bench.db"
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", echo=False)
+    factory = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def create() -> None:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with factory() as session:
+            await seed(session)
+
+    event_loop_for_benchmarks.run_until_complete(create())
+    yield factory
+    event_loop_for_benchmarks.run_until_complete(engine.dispose())
+
+
+@pytest.fixture()
+def bench_in_session(benchmark, seeded_session_factory, event_loop_for_benchmarks):
+    """
+    Benchmarks an async operation in a fresh session of the seeded database,
+    the transaction is rolled back after every call so every call sees the same data.
+    """
+
+    def run(operation: Callable[[AsyncSession], Awaitable[object]]) -> None:
+        async def once() -> None:
+            async with seeded_session_factory() as session:
+                await operation(session)
+                await session.rollback()
+
+        benchmark(lambda: event_loop_for_benchmarks.run_until_complete(once()))
+
+    return run
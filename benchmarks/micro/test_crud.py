@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.db.crud import (
+    PRODUCT_RESERVATION_QUANTITY_ONLY,
+    PRODUCT_STOCK_ONLY,
+    RESERVATION_STATUS_ONLY,
+    add_product_reservation,
+    add_product_reservations,
+    add_reservation,
+    cancel_reservations,
+    expire_reservations,
+    get_product,
+    get_product_reservation,
+    get_product_reservations,
+    get_products,
+    get_products_availability,
+    get_reservation,
+    get_reservation_details,
+    move_bucket_stock,
+    rebalance_stock_buckets,
+    release_reservations_stock,
+    reserve_product,
+    set_stock_buckets,
+)
+from benchmarks.micro.conftest import BUCKETS, PRODUCTS, RESERVATIONS
+
+pytest.importorskip("pytest_benchmark")
+
+NEW_RESERVATION_ID = RESERVATIONS + 1
+NOW = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+async def _noop(session) -> None:
+    return None
+
+
+def test_session_only(bench_in_session):
+    # Reference for the session and rollback overhead included in every benchmark below
+    bench_in_session(_noop)
+
+
+def test_get_product(bench_in_session):
+    bench_in_session(lambda session: get_product(500, session, True, PRODUCT_STOCK_ONLY))
+
+
+def test_get_products(bench_in_session):
+    product_ids = list(range(100, 110))
+    bench_in_session(lambda session: get_products(product_ids, session, True, PRODUCT_STOCK_ONLY))
+
+
+def test_get_products_availability(bench_in_session):
+    product_ids = list(range(1, 51))
+    bench_in_session(lambda session: get_products_availability(product_ids, session))
+
+
+def test_get_all_products_availability(bench_in_session):
+    bench_in_session(lambda session: get_products_availability(None, session))
+
+
+def test_get_reservation(bench_in_session):
+    bench_in_session(lambda session: get_reservation(500, session, False, RESERVATION_STATUS_ONLY))
+
+
+def test_get_reservation_details(bench_in_session):
+    bench_in_session(lambda session: get_reservation_details(500, session))
+
+
+def test_get_product_reservation(bench_in_session):
+    bench_in_session(
+        lambda session: get_product_reservation(
+            500, 500, session, True, PRODUCT_RESERVATION_QUANTITY_ONLY
+        )
+    )
+
+
+def test_get_product_reservations(bench_in_session):
+    bench_in_session(
+        lambda session: get_product_reservations(
+            500, [500, 501, 502], session, True, PRODUCT_RESERVATION_QUANTITY_ONLY
+        )
+    )
+
+
+def test_add_reservation(bench_in_session):
+    bench_in_session(lambda session: add_reservation(NEW_RESERVATION_ID, session))
+
+
+def test_add_product_reservation(bench_in_session):
+    bench_in_session(lambda session: add_product_reservation(500, 600, 1, NOW, session))
+
+
+def test_add_product_reservations(bench_in_session):
+    quantities = {product_id: 1 for product_id in range(600, 610)}
+    bench_in_session(lambda session: add_product_reservations(500, quantities, NOW, session))
+
+
+def test_reserve_product_new_reservation(bench_in_session):
+    bench_in_session(lambda session: reserve_product(NEW_RESERVATION_ID, PRODUCTS, 1, NOW, session))
+
+
+def test_reserve_product_existing_line(bench_in_session):
+    bench_in_session(lambda session: reserve_product(500, 500, 3, NOW, session))
+
+
+def test_set_stock_buckets(bench_in_session):
+    bench_in_session(lambda session: set_stock_buckets(PRODUCTS, BUCKETS, session))
+
+
+def test_rebalance_stock_buckets(bench_in_session):
+    bench_in_session(lambda session: rebalance_stock_buckets(1, session))
+
+
+def test_move_bucket_stock(bench_in_session):
+    bench_in_session(lambda session: move_bucket_stock(1, BUCKETS, 1, session, start=3))
+
+
+def test_release_reservations_stock(bench_in_session):
+    reservation_ids = list(range(100, 200))
+    bench_in_session(lambda session: release_reservations_stock(reservation_ids, session))
+
+
+def test_cancel_reservations(bench_in_session):
+    reservation_ids = list(range(100, 200))
+    bench_in_session(lambda session: cancel_reservations(reservation_ids, session))
+
+
+def test_expire_reservations(bench_in_session):
+    bench_in_session(
+        lambda session: expire_reservations(NOW - timedelta(days=1), 100, session)
+    )
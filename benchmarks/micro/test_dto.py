@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from app.utils.dto import BatchReservationDTO, ReservationDTO
+
+pytest.importorskip("pytest_benchmark")
+
+RESERVATION = {
+    "reservation_id": 123,
+    "product_id": 456,
+    "quantity": 7,
+    "timestamp": "2025-01-23T10:20:30.400+02:30",
+}
+BATCH_RESERVATION = {
+    "reservation_id": 123,
+    "lines": [{"product_id": product_id, "quantity": 1} for product_id in range(1, 11)],
+    "timestamp": "2025-01-23T10:20:30.400+02:30",
+}
+
+
+def test_reservation_dto_from_json(benchmark):
+    body = json.dumps(RESERVATION)
+    dto = benchmark(ReservationDTO.model_validate_json, body)
+    assert dto.timestamp.utcoffset().total_seconds() == 9000
+
+
+def test_reservation_dto_from_dict(benchmark):
+    benchmark(ReservationDTO.model_validate, RESERVATION)
+
+
+def test_batch_reservation_dto_from_json(benchmark):
+    body = json.dumps(BATCH_RESERVATION)
+    benchmark(BatchReservationDTO.model_validate_json, body)
@@ -0,0 +1,43 @@
+import pytest
+from fastapi import Response
+
+from app.utils.dto import ReservationLineResponse
+from app.utils.exceptions import (
+    BatchReservationException,
+    NotEnoughProductsException,
+    ProductIsReservedException,
+    ProductNotFoundException,
+    ReservationClosedException,
+    ReservationException,
+    ReservationIsLockedException,
+    ReservationNotFoundException,
+)
+
+pytest.importorskip("pytest_benchmark")
+
+EXCEPTIONS = [
+    NotEnoughProductsException,
+    ProductIsReservedException,
+    ProductNotFoundException,
+    ReservationClosedException,
+    ReservationIsLockedException,
+    ReservationNotFoundException,
+]
+
+
+def render(exc: ReservationException) -> bytes:
+    # What the exception handler in app/main.py does with it
+    return Response(exc.render(), exc.status_code, media_type="application/json").body
+
+
+@pytest.mark.parametrize("exception_class", EXCEPTIONS, ids=lambda cls: cls.__name__)
+def test_build_and_render_exception(benchmark, exception_class):
+    benchmark(lambda: render(exception_class(123)))
+
+
+def test_build_and_render_batch_exception(benchmark):
+    lines = [
+        ReservationLineResponse(product_id=product_id, status="error", message="Not enough")
+        for product_id in range(1, 11)
+    ]
+    benchmark(lambda: render(BatchReservationException(422, 123, lines)))
@@ -0,0 +1,106 @@
+"""
+Compares the request overhead of the previous `@app.middleware("http")` logging function
+with the pure ASGI LoggingMiddleware.
+
+A wrk-style closed loop keeps `--concurrency` requests in flight against a minimal app
+with one POST route, the app runs in process over httpx's ASGI transport, so the numbers
+contain no network time. Logging goes through the regular queue-backed logger:
+
+    python -m benchmarks.middleware_overhead --requests 20000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Callable
+
+from fastapi import FastAPI, Request, Response
+from httpx import ASGITransport, AsyncClient
+
+from app.middleware import LoggingMiddleware
+from app.utils.logging import logger, truncate_body
+
+BODY = {"reservation_id": 1, "product_id": 2, "quantity": 3, "timestamp": "2025-01-01T00:00:00Z"}
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/reservation/make")
+    async def make(payload: dict) -> dict:
+        return {"status": "success", "message": "ok", "reservation_id": payload["reservation_id"]}
+
+    return app
+
+
+def base_http_middleware_app(body_max_bytes: int) -> FastAPI:
+    app = make_app()
+
+    @app.middleware("http")
+    async def logging_middleware(request: Request, call_next: Callable) -> Response:
+        body = None
+        if request.method in ["POST", "PUT"]:
+            raw_body = await request.body()
+            body = truncate_body(raw_body[:body_max_bytes], len(raw_body))
+        logger.info("Request: %s %s", request.method, request.url, extra={"body": body})
+        response = await call_next(request)
+        logger.info("Response: Status %s", response.status_code)
+        return response
+
+    return app
+
+
+def asgi_middleware_app(body_max_bytes: int) -> FastAPI:
+    app = make_app()
+    app.add_middleware(LoggingMiddleware, body_max_bytes=body_max_bytes)
+    return app
+
+
+async def run(app: FastAPI, requests: int, concurrency: int) -> dict:
+    latencies = []
+    remaining = iter(range(requests))
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+
+        async def connection() -> None:
+            for _ in remaining:
+                started = time.perf_counter()
+                response = await client.post("/reservation/make", json=BODY)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200
+
+        # Warm up routes and pydantic models before measuring
+        await client.post("/reservation/make", json=BODY)
+        started = time.perf_counter()
+        await asyncio.gather(*(connection() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests_per_second": round(requests / elapsed, 1),
+        "latency_ms_p50": round(latencies[len(latencies) // 2] * 1000, 3),
+        "latency_ms_p99": round(latencies[int(len(latencies) * 0.99)] * 1000, 3),
+    }
+
+
+async def main(requests: int, concurrency: int, body_max_bytes: int) -> dict:
+    base_http = await run(base_http_middleware_app(body_max_bytes), requests, concurrency)
+    asgi = await run(asgi_middleware_app(body_max_bytes), requests, concurrency)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "base_http_middleware": base_http,
+        "asgi_middleware": asgi,
+        "speedup": round(asgi["requests_per_second"] / base_http["requests_per_second"], 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--body-max-bytes", type=int, default=1024)
+    args = parser.parse_args()
+    result = asyncio.run(main(args.requests, args.concurrency, args.body_max_bytes))
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,111 @@
+"""
+Measures throughput against connection pool size to pick DB_POOL_SIZE and DB_MAX_OVERFLOW.
+
+Every simulated request takes a session from the pool, runs one query that keeps the
+connection busy for `--query-ms` on the server and returns the connection, while
+`--concurrency` requests are in flight. Requests that waited longer than the pool timeout
+are counted as timeouts. Run it against PostgreSQL, directly or through PgBouncer:
+
+    python -m benchmarks.pool_size --db-url postgresql+asyncpg://... --pool-sizes 5,10,20,40,64
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db.setup import engine_options
+from settings import DBSettings, lock_settings
+
+
+async def run_pool_size(
+    db_url: str,
+    db: DBSettings,
+    pool_size: int,
+    requests: int,
+    concurrency: int,
+    query_seconds: float,
+) -> dict:
+    options = engine_options(db.model_copy(update={"DB_POOL_SIZE": pool_size}), lock_settings)
+    engine = create_async_engine(db_url, **options)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    latencies: List[float] = []
+    timeouts = 0
+    remaining = iter(range(requests))
+
+    async def client() -> None:
+        nonlocal timeouts
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                async with session_factory() as session:
+                    await session.execute(
+                        text("SELECT pg_sleep(:seconds)"), {"seconds": query_seconds}
+                    )
+            except PoolTimeoutError:
+                timeouts += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    async def warm_up() -> None:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    # Opens the pool connections before measuring
+    await asyncio.gather(*(warm_up() for _ in range(pool_size)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+
+    latencies.sort()
+    return {
+        "pool_size": pool_size,
+        "max_overflow": options.get("max_overflow"),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "latency_ms_p50": round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+        "latency_ms_p99": round(latencies[int(len(latencies) * 0.99)] * 1000, 2)
+        if latencies
+        else None,
+        "pool_timeouts": timeouts,
+    }
+
+
+async def main(args: argparse.Namespace) -> List[dict]:
+    db = DBSettings(
+        DB_HOST="unused",
+        DB_PORT=0,
+        DB_USER="unused",
+        DB_PASS="unused",
+        DB_NAME="unused",
+        DB_MAX_OVERFLOW=args.max_overflow,
+        DB_POOL_TIMEOUT=args.pool_timeout,
+        DB_PGBOUNCER_MODE=args.pgbouncer,
+    )
+    return [
+        await run_pool_size(
+            args.db_url, db, pool_size, args.requests, args.concurrency, args.query_ms / 1000
+        )
+        for pool_size in args.pool_sizes
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db-url", required=True)
+    parser.add_argument(
+        "--pool-sizes", type=lambda value: [int(size) for size in value.split(",")], default=[5]
+    )
+    parser.add_argument("--max-overflow", type=int, default=0)
+    parser.add_argument("--pool-timeout", type=float, default=30)
+    parser.add_argument("--pgbouncer", action="store_true")
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--query-ms", type=float, default=2)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
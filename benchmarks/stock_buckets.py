@@ -0,0 +1,138 @@
+"""
+Compares single-row stock with stock buckets on one hot product.
+
+Every request reserves one unit of the same product under a new reservation ID,
+the benchmark reports throughput, the rate of 423 (locked) responses and checks that
+no stock was lost or oversold. Run it against a disposable PostgreSQL database,
+SQLite does not take row locks, so there are no 423 responses and the single-row mode
+can even lose updates:
+
+    python -m benchmarks.stock_buckets --db-url postgresql+asyncpg://... --buckets 8
+"""
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db.crud import set_stock_buckets
+from app.db.models import Base, Product, ProductReservation, ProductStockBucket, Reservation
+from app.dependencies import get_db_session
+from app.main import app
+from settings import db_settings, reservation_settings
+
+
+async def run_mode(
+    session_factory: async_sessionmaker,
+    buckets: int,
+    requests: int,
+    concurrency: int,
+    reservation_offset: int,
+) -> dict:
+    async with session_factory() as session:
+        product = Product(name="Hot product", price=100, quantity=requests)
+        session.add(product)
+        await session.flush()
+        if buckets:
+            await set_stock_buckets(product.id, buckets, session)
+        await session.commit()
+        product_id = product.id
+
+    reservation_settings.STOCK_BUCKETS_ENABLED = bool(buckets)
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses: Counter = Counter()
+    timestamp = datetime.now(timezone.utc).isoformat()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+
+        async def reserve(reservation_id: int) -> None:
+            async with semaphore:
+                response = await client.post(
+                    "/reservation/make",
+                    json={
+                        "reservation_id": reservation_id,
+                        "product_id": product_id,
+                        "quantity": 1,
+                        "timestamp": timestamp,
+                    },
+                )
+                statuses[response.status_code] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(reserve(reservation_offset + number) for number in range(1, requests + 1))
+        )
+        elapsed = time.perf_counter() - started
+
+    async with session_factory() as session:
+        left_in_product = await session.scalar(
+            select(Product.quantity).where(Product.id == product_id)
+        )
+        left_in_buckets = await session.scalar(
+            select(func.coalesce(func.sum(ProductStockBucket.quantity), 0)).where(
+                ProductStockBucket.product_id == product_id
+            )
+        )
+        reserved = await session.scalar(
+            select(func.coalesce(func.sum(ProductReservation.reservation_quantity), 0)).where(
+                ProductReservation.product_id == product_id
+            )
+        )
+
+    return {
+        "buckets": buckets,
+        "requests": requests,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1),
+        "successful_reservations_per_second": round(statuses[200] / elapsed, 1),
+        "locked_rate": round(statuses[423] / requests, 4),
+        "statuses": dict(statuses),
+        "stock_is_exact": left_in_product + left_in_buckets + reserved == requests,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db-url", default=db_settings.DB_URL)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--buckets", type=int, default=8)
+    args = parser.parse_args()
+
+    engine = create_async_engine(args.db_url, pool_size=args.concurrency, max_overflow=0)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def get_benchmark_session():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db_session] = get_benchmark_session
+
+    # Reservation IDs continue after the existing ones, so runs against the same database
+    # do not collide with each other
+    async with session_factory() as session:
+        reservation_offset = await session.scalar(
+            select(func.coalesce(func.max(Reservation.id), 0))
+        )
+    for run, buckets in enumerate([0, args.buckets]):
+        result = await run_mode(
+            session_factory,
+            buckets,
+            args.requests,
+            args.concurrency,
+            reservation_offset + run * args.requests,
+        )
+        print(result)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
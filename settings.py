@@ -1,3 +1,5 @@
+from typing import Dict, Literal, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -7,11 +9,40 @@ class DBSettings(BaseSettings):
     DB_USER: str
     DB_PASS: str
     DB_NAME: str
+    # Connections kept open per worker and extra connections opened under load,
+    # requests wait up to DB_POOL_TIMEOUT seconds for a free connection
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    # Connections older than this many seconds are replaced, -1 keeps them forever
+    DB_POOL_RECYCLE: int = -1
+    # Checks every connection with a round trip when it is taken from the pool
+    DB_POOL_PRE_PING: bool = False
+    # asyncpg statement cache and SQLAlchemy prepared statement cache, per connection
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    # For PgBouncer in transaction mode: disables both statement caches, uses unique
+    # prepared statement names and does not pool connections in the application.
+    # Startup parameters are not sent, so LOCK_TIMEOUT_MS is not applied and row locks
+    # fail at once with NOWAIT.
+    DB_PGBOUNCER_MODE: bool = False
+    # Optional read replica for read-only endpoints, same user, password and database name
+    DB_REPLICA_HOST: Optional[str] = None
+    DB_REPLICA_PORT: Optional[int] = None
+    # Reservations changed by this worker are read from the primary for this many seconds
+    DB_REPLICA_READ_YOUR_WRITES_SECONDS: float = 5
 
     @property
     def DB_URL(self) -> str:
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"  # noqa
 
+    @property
+    def DB_REPLICA_URL(self) -> Optional[str]:
+        if not self.DB_REPLICA_HOST:
+            return None
+        port = self.DB_REPLICA_PORT or self.DB_PORT
+        return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_REPLICA_HOST}:{port}/{self.DB_NAME}"  # noqa
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 
@@ -22,5 +53,172 @@ class BackendSettings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 
+class ReservationSettings(BaseSettings):
+    # "orm" locks product, reservation and reservation line rows one by one,
+    # "atomic" checks and decrements stock with a single conditional statement,
+    # "coalesced" groups concurrent requests for one product into one transaction
+    RESERVATION_ENGINE: Literal["orm", "atomic", "coalesced"] = "orm"
+    # Reserve stock of products with stock buckets from the bucket rows instead of locking
+    # the product row with the "orm" engine, the "atomic" engine always reads it unlocked
+    STOCK_BUCKETS_ENABLED: bool = False
+    # Bucketed products whose stock was returned to the product row or that have an empty
+    # bucket are rebalanced every interval, this many products per run
+    STOCK_BUCKET_REBALANCE_ENABLED: bool = True
+    STOCK_BUCKET_REBALANCE_INTERVAL_SECONDS: float = 30
+    STOCK_BUCKET_REBALANCE_BATCH_SIZE: int = 100
+    # "coalesced" engine: a group is applied when its first request waited this long
+    # or when it has this many requests
+    COALESCE_WINDOW_MS: float = 2
+    COALESCE_MAX_BATCH: int = 64
+    # Batch cancellation cancels and releases this many reservations per transaction
+    CANCEL_CHUNK_SIZE: int = 1000
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+
+class LockSettings(BaseSettings):
+    # 0 keeps SELECT ... FOR UPDATE NOWAIT, otherwise row locks are waited for
+    # up to this many milliseconds (PostgreSQL lock_timeout)
+    LOCK_TIMEOUT_MS: int = 0
+    # Retries of a reservation transaction that failed on a locked row, 0 answers 423 at once
+    LOCK_RETRIES: int = 0
+    # Base of the exponential backoff with full jitter between retries
+    LOCK_RETRY_BACKOFF_MS: int = 10
+    # No retry is started after this much time since the first attempt
+    LOCK_RETRY_DEADLINE_MS: int = 250
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+
+class ExpirySettings(BaseSettings):
+    # Pending reservations whose lines were not changed for this long are cancelled
+    # and their stock is returned
+    EXPIRY_SWEEPER_ENABLED: bool = True
+    RESERVATION_TTL_SECONDS: int = 900
+    EXPIRY_SWEEP_INTERVAL_SECONDS: float = 30
+    # Reservations cancelled per transaction, a sweep runs batches until nothing is left
+    EXPIRY_BATCH_SIZE: int = 500
+    # Locked products are waited for this long, a batch whose products stay locked is
+    # skipped and left for the next sweep
+    EXPIRY_LOCK_TIMEOUT_MS: int = 1000
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+
+class CacheSettings(BaseSettings):
+    # Reservation status cache, TTLs are in seconds, a TTL of 0 disables caching
+    STATUS_CACHE_SIZE: int = 100_000
+    STATUS_CACHE_TTL: float = 5.0
+    STATUS_CACHE_NEGATIVE_TTL: float = 1.0
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+
+class StatusPushSettings(BaseSettings):
+    # Requests waiting for a status change, with ?wait= or on the SSE stream, per worker
+    STATUS_MAX_WAITERS: int = 50_000
+    STATUS_MAX_WAIT_SECONDS: float = 60
+    # Comment lines sent on idle streams, so proxies do not close them
+    STATUS_STREAM_HEARTBEAT_SECONDS: float = 15
+    # Changes are pushed only by the worker that made them, streams re-read the status
+    # this often to see changes of other workers, 0 disables it
+    STATUS_STREAM_RECHECK_SECONDS: float = 30
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+
+class AvailabilitySettings(BaseSettings):
+    # GET /products/availability answers from a snapshot of all products, a background task
+    # reloads it every interval, a snapshot older than the staleness bound is reloaded
+    # before answering, by one request while the others wait for it
+    AVAILABILITY_REFRESH_ENABLED: bool = True
+    AVAILABILITY_REFRESH_INTERVAL_SECONDS: float = 1
+    AVAILABILITY_MAX_STALENESS_SECONDS: float = 5
+    # Products per request
+    AVAILABILITY_MAX_IDS: int = 100
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+
+class ImportSettings(BaseSettings):
+    # POST /products/import upserts this many rows per statement and transaction
+    IMPORT_CHUNK_SIZE: int = 1000
+    # Longer lines are reported as failed rows, only one line is buffered at a time
+    IMPORT_MAX_LINE_BYTES: int = 65_536
+    # Failed rows listed in the response, all of them are counted
+    IMPORT_MAX_ERRORS: int = 100
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+
+class IdempotencySettings(BaseSettings):
+    # Responses stored for an Idempotency-Key are replayed for at least this many seconds,
+    # the cleanup deletes older keys every interval, a batch per transaction
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = 86_400
+    IDEMPOTENCY_CLEANUP_ENABLED: bool = True
+    IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS: float = 300
+    IDEMPOTENCY_CLEANUP_BATCH_SIZE: int = 1000
+    # In-process cache of stored responses in front of the table, a TTL of 0 disables it
+    IDEMPOTENCY_CACHE_SIZE: int = 10_000
+    IDEMPOTENCY_CACHE_TTL: float = 300
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+
+class OutboxSettings(BaseSettings):
+    # Reservation changes are written to the outbox table in the same transaction as the change,
+    # a relay on every worker delivers them to the sink in batches and deletes them
+    OUTBOX_ENABLED: bool = False
+    OUTBOX_RELAY_ENABLED: bool = True
+    OUTBOX_RELAY_INTERVAL_SECONDS: float = 1
+    OUTBOX_BATCH_SIZE: int = 500
+    # "file" appends NDJSON lines to OUTBOX_FILE_PATH, "webhook" POSTs every batch
+    # as an NDJSON body to OUTBOX_WEBHOOK_URL
+    OUTBOX_SINK: Literal["file", "webhook"] = "file"
+    OUTBOX_FILE_PATH: str = "outbox.ndjson"
+    OUTBOX_WEBHOOK_URL: Optional[str] = None
+    OUTBOX_WEBHOOK_TIMEOUT_SECONDS: float = 5
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+
+class LoggingSettings(BaseSettings):
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: Literal["json", "text"] = "json"
+    # Records that do not fit into the queue of the log writer thread are dropped
+    LOG_QUEUE_SIZE: int = 10_000
+    # At most this many bytes of POST and PUT bodies are logged, 0 disables body logging
+    LOG_BODY_MAX_BYTES: int = 1024
+    # Share of records kept per level, e.g. {"INFO": 0.1}, unlisted levels are always kept
+    LOG_SAMPLE_RATES: Dict[str, float] = {}
+    # Repeated identical records of LOG_AGGREGATE_LEVEL and above are written once and
+    # summarized at the end of the interval, 0 disables aggregation
+    LOG_AGGREGATE_INTERVAL_SECONDS: float = 10
+    LOG_AGGREGATE_LEVEL: str = "WARNING"
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+
+class MetricsSettings(BaseSettings):
+    METRICS_ENABLED: bool = True
+    # Shared directory for several uvicorn workers, each worker writes its metrics there
+    # and /metrics of any worker returns the sum of all workers
+    METRICS_DIR: Optional[str] = None
+    METRICS_FLUSH_INTERVAL_SECONDS: float = 5
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+
 db_settings = DBSettings()
 backend_settings = BackendSettings()
+reservation_settings = ReservationSettings()
+lock_settings = LockSettings()
+expiry_settings = ExpirySettings()
+cache_settings = CacheSettings()
+status_push_settings = StatusPushSettings()
+availability_settings = AvailabilitySettings()
+import_settings = ImportSettings()
+idempotency_settings = IdempotencySettings()
+outbox_settings = OutboxSettings()
+logging_settings = LoggingSettings()
+metrics_settings = MetricsSettings()
@@ -1,12 +1,29 @@
 from datetime import datetime
 
 import pytest
+from asyncpg.exceptions import LockNotAvailableError
 from fastapi.testclient import TestClient
 from mock import AsyncMock, patch
+from sqlalchemy.exc import DBAPIError
 
+from app.db.idempotency import stored_response_cache
+from app.db.locking import lock_retry_policy
 from app.db.models import Product, ProductReservation, Reservation
-from app.dependencies import get_db_session
+from app.dependencies import get_db_read_session, get_db_session
 from app.main import app
+from app.utils.cache import recent_reservation_writes, reservation_status_cache
+from settings import reservation_settings
+
+
+@pytest.fixture(autouse=True)
+def clear_reservation_status_cache():
+    reservation_status_cache.clear()
+    recent_reservation_writes.clear()
+    stored_response_cache.clear()
+    yield
+    reservation_status_cache.clear()
+    recent_reservation_writes.clear()
+    stored_response_cache.clear()
 
 
 @pytest.fixture
@@ -83,6 +100,7 @@ def request_payload_q7():
 @pytest.fixture()
 def test_app_client(test_db_session) -> TestClient:
     app.dependency_overrides[get_db_session] = lambda: test_db_session
+    app.dependency_overrides[get_db_read_session] = lambda: test_db_session
     test_client = TestClient(app)
     return test_client
 
@@ -163,3 +181,173 @@ def mock_get_confirmed_reservation(mocker, fake_confirmed_reservation):
     with patch("app.routes.get_reservation") as mock:
         mock.return_value = fake_confirmed_reservation
         yield mock
+
+
+@pytest.fixture
+def make_batch_reservation_url():
+    return "reservation/make/batch"
+
+
+@pytest.fixture()
+def fake_product_2():
+    return Product(id=457, name="Product 2", price=50, quantity=2)
+
+
+@pytest.fixture
+def batch_request_payload():
+    return {
+        "reservation_id": 123,
+        "lines": [
+            {"product_id": 457, "quantity": 1},
+            {"product_id": 456, "quantity": 7},
+        ],
+        "timestamp": "2025-01-23T10:20:30.400+02:30",
+    }
+
+
+@pytest.fixture()
+def mock_get_products(mocker, fake_product, fake_product_2):
+    with patch("app.routes.get_products") as mock:
+        mock.return_value = {fake_product.id: fake_product, fake_product_2.id: fake_product_2}
+        yield mock
+
+
+@pytest.fixture()
+def mock_get_product_reservations_q5(mocker, fake_product_reservation_q5):
+    with patch("app.routes.get_product_reservations") as mock:
+        mock.return_value = {fake_product_reservation_q5.product_id: fake_product_reservation_q5}
+        yield mock
+
+
+@pytest.fixture()
+def mock_add_product_reservations(mocker):
+    with patch("app.routes.add_product_reservations", new_callable=AsyncMock) as mock:
+        yield mock
+
+
+@pytest.fixture()
+def atomic_reservation_engine(monkeypatch):
+    monkeypatch.setattr(reservation_settings, "RESERVATION_ENGINE", "atomic")
+
+
+@pytest.fixture()
+def mock_reserve_product(mocker):
+    with patch("app.routes.reserve_product", new_callable=AsyncMock) as mock:
+        mock.return_value = 3
+        yield mock
+
+
+@pytest.fixture()
+def mock_reserve_product_unchanged(mocker):
+    with patch("app.routes.reserve_product", new_callable=AsyncMock) as mock:
+        mock.return_value = None
+        yield mock
+
+
+@pytest.fixture()
+def stock_buckets_enabled(monkeypatch):
+    monkeypatch.setattr(reservation_settings, "STOCK_BUCKETS_ENABLED", True)
+
+
+@pytest.fixture()
+def mock_get_bucketed_product(mocker, fake_product):
+    fake_product.quantity = 0
+    fake_product.stock_buckets = 4
+    with patch("app.routes.get_product") as mock:
+        mock.return_value = fake_product
+        yield mock
+
+
+@pytest.fixture()
+def mock_move_bucket_stock(mocker):
+    with patch("app.routes.move_bucket_stock", new_callable=AsyncMock) as mock:
+        mock.return_value = True
+        yield mock
+
+
+@pytest.fixture()
+def mock_get_locked_product(mocker, fake_product):
+    lock_error = DBAPIError("SELECT ... FOR UPDATE NOWAIT", {}, LockNotAvailableError("locked"))
+    with patch("app.routes.get_product") as mock:
+        mock.side_effect = [lock_error, fake_product]
+        yield mock
+
+
+@pytest.fixture()
+def lock_retries(monkeypatch):
+    monkeypatch.setattr(lock_retry_policy, "retries", 1)
+    monkeypatch.setattr(lock_retry_policy, "backoff", 0)
+
+
+@pytest.fixture()
+def coalesced_reservation_engine(monkeypatch, isolated_session_factory):
+    monkeypatch.setattr(reservation_settings, "RESERVATION_ENGINE", "coalesced")
+    monkeypatch.setattr("app.routes.async_session_factory", isolated_session_factory)
+
+
+@pytest.fixture
+def cancel_reservation_url():
+    return "reservation/cancel/123"
+
+
+@pytest.fixture
+def cancel_batch_url():
+    return "reservation/cancel/batch"
+
+
+@pytest.fixture()
+def mock_cancel_reservations(mocker):
+    # Cancels every even reservation ID and releases one unit per cancelled reservation
+    async def cancel(reservation_ids, session):
+        cancelled_ids = [
+            reservation_id for reservation_id in reservation_ids if reservation_id % 2 == 0
+        ]
+        return cancelled_ids, len(cancelled_ids)
+
+    with patch("app.routes.cancel_reservations", side_effect=cancel) as mock:
+        yield mock
+
+
+@pytest.fixture()
+def cancel_chunk_size_2(monkeypatch):
+    monkeypatch.setattr(reservation_settings, "CANCEL_CHUNK_SIZE", 2)
+
+
+@pytest.fixture()
+def replica_app_client(monkeypatch, isolated_session_factory, replica_session_factory):
+    """
+    Client of the app with `isolated_session_factory` as the primary database
+    and `replica_session_factory` as its replica.
+    """
+
+    async def primary_session():
+        async with isolated_session_factory() as session:
+            yield session
+
+    async def replica_session():
+        async with replica_session_factory() as session:
+            yield session
+
+    monkeypatch.setattr("app.routes.async_session_factory", isolated_session_factory)
+    monkeypatch.setattr("app.routes.replica_session_factory", replica_session_factory)
+    app.dependency_overrides[get_db_session] = primary_session
+    app.dependency_overrides[get_db_read_session] = replica_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture()
+def isolated_app_client(isolated_session_factory):
+    """
+    Client of the app with `isolated_session_factory` as its database, for requests
+    that commit their changes.
+    """
+
+    async def session():
+        async with isolated_session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db_session] = session
+    app.dependency_overrides[get_db_read_session] = session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
@@ -0,0 +1,65 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db.availability import StockSnapshot
+
+
+@pytest.fixture()
+def snapshot(monkeypatch, isolated_session_factory):
+    snapshot = StockSnapshot(isolated_session_factory, interval=1, max_staleness=60)
+    monkeypatch.setattr("app.routes.stock_snapshot", snapshot)
+    return snapshot
+
+
+def reserve(client: TestClient, product_id: int, quantity: int) -> None:
+    response = client.post(
+        "reservation/make",
+        json={
+            "reservation_id": 10,
+            "product_id": product_id,
+            "quantity": quantity,
+            "timestamp": "2025-01-23T10:20:30.400+02:30",
+        },
+    )
+    assert response.status_code == 200
+
+
+def test_availability_from_snapshot(isolated_app_client: TestClient, snapshot):
+    response = isolated_app_client.get("products/availability", params={"ids": "2,1,3,2"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body.pop("age_seconds") < 60
+    assert body == {
+        "status": "success",
+        "products": [{"product_id": 2, "available": 5}, {"product_id": 1, "available": 10}],
+        "missing": [3],
+    }
+
+    # Reservations are seen only after the next reload, fresh reads see them at once
+    reserve(isolated_app_client, 2, 3)
+    response = isolated_app_client.get("products/availability", params={"ids": "2"})
+    assert response.json()["products"] == [{"product_id": 2, "available": 5}]
+
+    response = isolated_app_client.get(
+        "products/availability", params={"ids": "2", "fresh": "true"}
+    )
+    assert response.json()["products"] == [{"product_id": 2, "available": 2}]
+    assert response.json()["age_seconds"] == 0
+    assert snapshot.stats().refreshes == 1
+
+
+@pytest.mark.parametrize("ids", ["", "1,,2", "a", "-1"])
+def test_availability_invalid_ids(isolated_app_client: TestClient, snapshot, ids):
+    response = isolated_app_client.get("products/availability", params={"ids": ids})
+
+    assert response.status_code == 422
+
+
+def test_availability_too_many_ids(isolated_app_client: TestClient, snapshot):
+    ids = ",".join(str(product_id) for product_id in range(1, 102))
+
+    response = isolated_app_client.get("products/availability", params={"ids": ids})
+
+    assert response.status_code == 422
+    assert response.json()["message"] == "At most 100 products per request"
@@ -0,0 +1,145 @@
+import json
+
+import pytest
+from sqlalchemy import select
+
+from app.db.crud import set_stock_buckets
+from app.db.models import Product
+from settings import import_settings
+
+
+async def products(session_factory):
+    async with session_factory() as session:
+        result = await session.execute(
+            select(Product.id, Product.name, Product.price, Product.quantity).order_by(Product.id)
+        )
+        return [tuple(row) for row in result]
+
+
+def body_chunks(body: bytes, size: int = 7):
+    for start in range(0, len(body), size):
+        yield body[start : start + size]
+
+
+@pytest.mark.asyncio
+async def test_import_csv_upserts_products(
+    isolated_app_client, isolated_session_factory, monkeypatch
+):
+    monkeypatch.setattr(import_settings, "IMPORT_CHUNK_SIZE", 2)
+    body = (
+        b"product_id,name,price,quantity\n"
+        b"1,Product 1,120,40\n"
+        b"3,Product 3,30,3\n"
+        b"4,Product 4,-5,1\n"
+        b"5,Product 5,10,9\n"
+    )
+
+    response = isolated_app_client.post(
+        "products/import", content=body_chunks(body), headers={"Content-Type": "text/csv"}
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result.pop("seconds") >= 0
+    assert result.pop("rows_per_second") >= 0
+    assert result == {
+        "status": "partial",
+        "message": "Imported 3 products from 4 rows",
+        "rows": 4,
+        "imported": 3,
+        "failed": 1,
+        "errors": [{"line": 4, "message": "price: Input should be greater than or equal to 0"}],
+    }
+    assert await products(isolated_session_factory) == [
+        (1, "Product 1", 120, 40),
+        (2, "Product 2", 50, 5),
+        (3, "Product 3", 30, 3),
+        (5, "Product 5", 10, 9),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_import_ndjson_adds_quantities(isolated_app_client, isolated_session_factory):
+    rows = [
+        {"product_id": 2, "name": "Product 2", "price": 50, "quantity": 10},
+        {"product_id": 2, "name": "Product 2", "price": 50, "quantity": 1},
+        {"product_id": 6, "name": "Product 6", "price": 60, "quantity": 6},
+    ]
+    body = "\n".join(json.dumps(row) for row in rows).encode() + b"\nnot json\n"
+
+    response = isolated_app_client.post(
+        "products/import",
+        params={"mode": "add"},
+        content=body_chunks(body),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["imported"] == 2
+    assert response.json()["errors"] == [{"line": 4, "message": "Invalid JSON: Expecting value"}]
+    assert await products(isolated_session_factory) == [
+        (1, "Product 1", 100, 10),
+        (2, "Product 2", 50, 16),
+        (6, "Product 6", 60, 6),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_import_reports_quantities_exceeding_integer_range(
+    isolated_app_client, isolated_session_factory
+):
+    body = (
+        b"product_id,name,price,quantity\n"
+        b"1,Product 1,100,2147483640\n"
+        b"2,Product 2,50,2147483000\n"
+        b"2,Product 2,50,1000\n"
+        b"3,Product 3,2147483648,1\n"
+    )
+
+    response = isolated_app_client.post(
+        "products/import",
+        params={"mode": "add"},
+        content=body,
+        headers={"Content-Type": "text/csv"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["imported"] == 1
+    assert response.json()["errors"] == [
+        {"line": 4, "message": "Quantity would make the stock exceed 2147483647"},
+        {"line": 5, "message": "price: Input should be less than or equal to 2147483647"},
+        {"line": 2, "message": "Quantity would make the stock exceed 2147483647"},
+    ]
+    assert await products(isolated_session_factory) == [
+        (1, "Product 1", 100, 10),
+        (2, "Product 2", 50, 2147483005),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_import_does_not_replace_bucketed_stock(
+    isolated_app_client, isolated_session_factory
+):
+    async with isolated_session_factory() as session:
+        await set_stock_buckets(1, 4, session)
+        await session.commit()
+
+    response = isolated_app_client.post(
+        "products/import",
+        content=b"product_id,name,price,quantity\n1,Product 1,100,99\n2,Product 2,50,7\n",
+        headers={"Content-Type": "text/csv; charset=utf-8"},
+    )
+
+    assert response.json()["imported"] == 1
+    assert response.json()["errors"] == [
+        {"line": 2, "message": "Product keeps its stock in buckets, import it with mode=add"}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_import_rejects_other_content_types(isolated_app_client):
+    response = isolated_app_client.post(
+        "products/import", json=[{"product_id": 1}], headers={"Content-Type": "application/json"}
+    )
+
+    assert response.status_code == 415
@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import func, select
+
+from app.db.models import Product, ProductStockBucket
+
+
+@pytest.mark.asyncio
+async def test_stock_buckets_are_turned_on_and_off(isolated_app_client, isolated_session_factory):
+    response = isolated_app_client.put("products/1/stock-buckets", json={"buckets": 4})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "status": "success",
+        "message": "Stock is kept in 4 buckets",
+        "product_id": 1,
+        "buckets": 4,
+    }
+    async with isolated_session_factory() as session:
+        assert await session.scalar(
+            select(func.sum(ProductStockBucket.quantity)).where(ProductStockBucket.product_id == 1)
+        ) == 10
+
+    response = isolated_app_client.put("products/1/stock-buckets", json={"buckets": 0})
+
+    assert response.status_code == 200
+    async with isolated_session_factory() as session:
+        product = await session.get(Product, 1)
+        assert (product.quantity, product.stock_buckets) == (10, 0)
+
+
+@pytest.mark.asyncio
+async def test_stock_buckets_of_missing_product(isolated_app_client):
+    response = isolated_app_client.put("products/404/stock-buckets", json={"buckets": 4})
+
+    assert response.status_code == 404
+    assert response.json() == {"status": "error", "message": "Product not found"}
+
+
+@pytest.mark.asyncio
+async def test_stock_buckets_are_validated(isolated_app_client):
+    response = isolated_app_client.put("products/1/stock-buckets", json={"buckets": -1})
+
+    assert response.status_code == 422
@@ -0,0 +1,140 @@
+import pytest
+from asyncpg.exceptions import LockNotAvailableError
+from fastapi.testclient import TestClient
+from mock import AsyncMock, patch
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
+
+from app.db.models import Product
+from app.dependencies import get_db_session
+from app.main import app
+from app.utils.cache import reservation_status_cache
+
+
+@pytest.mark.asyncio
+async def test_cancel_reservation_successful(
+    test_app_client: TestClient,
+    cancel_reservation_url: str,
+):
+    with patch("app.routes.cancel_reservations") as mock_cancel:
+        mock_cancel.return_value = ([123], 5)
+        response = test_app_client.put(cancel_reservation_url)
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "message": "Reservation cancelled",
+        "reservation_id": 123,
+        "status": "success",
+    }
+    mock_cancel.assert_awaited_once()
+    assert reservation_status_cache.get(123) == "cancelled"
+
+
+@pytest.mark.asyncio
+async def test_cancel_reservation_not_found(
+    test_app_client: TestClient,
+    cancel_reservation_url: str,
+    mock_get_empty_reservation: AsyncMock,
+):
+    with patch("app.routes.cancel_reservations") as mock_cancel:
+        mock_cancel.return_value = ([], 0)
+        response = test_app_client.put(cancel_reservation_url)
+
+    assert response.status_code == 404
+    assert response.json() == {
+        "message": "Reservation not found",
+        "reservation_id": 123,
+        "status": "error",
+    }
+
+
+@pytest.mark.asyncio
+async def test_cancel_reservation_already_confirmed(
+    test_app_client: TestClient,
+    cancel_reservation_url: str,
+    mock_get_confirmed_reservation: AsyncMock,
+):
+    with patch("app.routes.cancel_reservations") as mock_cancel:
+        mock_cancel.return_value = ([], 0)
+        response = test_app_client.put(cancel_reservation_url)
+
+    assert response.status_code == 409
+    assert response.json() == {
+        "message": "Reservation is closed or confirmed",
+        "reservation_id": 123,
+        "status": "error",
+    }
+
+
+@pytest.mark.asyncio
+async def test_cancel_reservations_batch_in_chunks(
+    test_app_client: TestClient,
+    cancel_batch_url: str,
+    mock_cancel_reservations: AsyncMock,
+    cancel_chunk_size_2,
+):
+    response = test_app_client.post(
+        cancel_batch_url, json={"reservation_ids": [5, 2, 4, 3, 2, 8]}
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "status": "success",
+        "message": "Cancelled 3 of 5 reservations",
+        "cancelled": [2, 4, 8],
+        "skipped": [3, 5],
+        "locked": [],
+        "released_units": 3,
+    }
+    assert [call.args[0] for call in mock_cancel_reservations.await_args_list] == [
+        [2, 3],
+        [4, 5],
+        [8],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_cancel_reservations_batch_locked_chunk(
+    test_app_client: TestClient,
+    cancel_batch_url: str,
+    cancel_chunk_size_2,
+):
+    lock_error = DBAPIError("UPDATE reservations", {}, LockNotAvailableError("locked"))
+    with patch("app.routes.cancel_reservations") as mock_cancel:
+        mock_cancel.side_effect = [([2], 4), lock_error]
+        response = test_app_client.post(cancel_batch_url, json={"reservation_ids": [1, 2, 3, 4]})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "status": "partial",
+        "message": "Cancelled 1 of 4 reservations",
+        "cancelled": [2],
+        "skipped": [1],
+        "locked": [3, 4],
+        "released_units": 4,
+    }
+
+
+@pytest.mark.asyncio
+async def test_cancel_reservations_batch_empty(test_app_client: TestClient, cancel_batch_url: str):
+    response = test_app_client.post(cancel_batch_url, json={"reservation_ids": []})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_cancel_reservations_batch_releases_stock(
+    cancel_batch_url: str, isolated_session_factory
+):
+    async def override():
+        async with isolated_session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db_session] = override
+    response = TestClient(app).post(cancel_batch_url, json={"reservation_ids": [1, 2]})
+
+    assert response.status_code == 200
+    assert response.json()["cancelled"] == [1]
+    assert response.json()["skipped"] == [2]
+    assert response.json()["released_units"] == 2
+    async with isolated_session_factory() as session:
+        assert await session.scalar(select(Product.quantity).where(Product.id == 1)) == 12
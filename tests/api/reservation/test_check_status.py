@@ -34,3 +34,57 @@ async def test_get_reservation_successful(
         "status": "success",
     }
     mock_get_reservation.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_get_reservation_query_budget(
+    test_app_client: TestClient,
+    query_budget,
+):
+    with query_budget(1):
+        response = test_app_client.get("reservation/status/1")
+
+    assert response.status_code == 200
+    assert response.json()["message"] == "Reservation status: pending"
+
+
+@pytest.mark.asyncio
+async def test_get_reservation_status_cached(
+    test_app_client: TestClient,
+    check_reservation_status_url: str,
+    mock_get_reservation: AsyncMock,
+):
+    for _ in range(3):
+        response = test_app_client.get(check_reservation_status_url)
+        assert response.status_code == 200
+        assert response.json()["message"] == "Reservation status: pending"
+
+    mock_get_reservation.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_get_reservation_not_found_cached(
+    test_app_client: TestClient,
+    check_reservation_status_url: str,
+    mock_get_empty_reservation: AsyncMock,
+):
+    for _ in range(2):
+        response = test_app_client.get(check_reservation_status_url)
+        assert response.status_code == 404
+
+    mock_get_empty_reservation.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_get_reservation_status_after_confirm(
+    test_app_client: TestClient,
+    check_reservation_status_url: str,
+    confirm_reservation_url: str,
+    mock_get_reservation: AsyncMock,
+):
+    test_app_client.get(check_reservation_status_url)
+    test_app_client.put(confirm_reservation_url)
+    response = test_app_client.get(check_reservation_status_url)
+
+    assert response.json()["message"] == "Reservation status: confirmed"
+    assert mock_get_reservation.await_count == 2
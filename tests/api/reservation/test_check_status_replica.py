@@ -0,0 +1,47 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from app.db.models import Reservation, ReservationStatus
+from app.utils.cache import reservation_status_cache
+
+
+@pytest.mark.asyncio
+async def test_status_is_read_from_replica(replica_app_client: TestClient, replica_session_factory):
+    async with replica_session_factory() as session:
+        await session.execute(
+            update(Reservation).values(status=ReservationStatus.CANCELLED.value)
+        )
+        await session.commit()
+
+    response = replica_app_client.get("reservation/status/1")
+
+    assert response.status_code == 200
+    assert response.json()["message"] == "Reservation status: cancelled"
+
+
+@pytest.mark.asyncio
+async def test_status_read_your_writes(replica_app_client: TestClient):
+    response = replica_app_client.put("reservation/confirm/1")
+    assert response.status_code == 200
+    reservation_status_cache.clear()
+
+    # The replica still has the reservation as pending, the primary is used after a write
+    response = replica_app_client.get("reservation/status/1")
+
+    assert response.status_code == 200
+    assert response.json()["message"] == "Reservation status: confirmed"
+
+
+@pytest.mark.asyncio
+async def test_status_missing_on_replica(replica_app_client: TestClient, isolated_session_factory):
+    async with isolated_session_factory() as session:
+        session.add(Reservation(id=2, status=ReservationStatus.PENDING.value))
+        await session.commit()
+
+    response = replica_app_client.get("reservation/status/2")
+    assert response.status_code == 200
+    assert response.json()["message"] == "Reservation status: pending"
+
+    response = replica_app_client.get("reservation/status/3")
+    assert response.status_code == 404
@@ -0,0 +1,96 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db.models import Reservation, ReservationStatus
+
+
+@pytest.fixture
+def details_url():
+    return "reservation/1"
+
+
+def test_get_reservation_details(test_app_client: TestClient, details_url: str):
+    response = test_app_client.get(details_url)
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "status": "success",
+        "message": "Reservation details",
+        "reservation_id": 1,
+        "reservation_status": "pending",
+        "lines": [
+            {
+                "product_id": 1,
+                "name": "Product 1",
+                "price": 100,
+                "quantity": 2,
+                "date": "2025-01-01T00:00:00",
+            }
+        ],
+    }
+    etag = response.headers["ETag"]
+    assert etag.startswith('"') and etag.endswith('"')
+
+
+def test_get_reservation_details_not_modified(test_app_client: TestClient, details_url: str):
+    etag = test_app_client.get(details_url).headers["ETag"]
+
+    response = test_app_client.get(details_url, headers={"If-None-Match": f'"other", {etag}'})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+
+def test_get_reservation_details_etag_mismatch(test_app_client: TestClient, details_url: str):
+    response = test_app_client.get(details_url, headers={"If-None-Match": '"outdated"'})
+
+    assert response.status_code == 200
+    assert response.json()["lines"][0]["quantity"] == 2
+
+
+def test_get_reservation_details_query_budget(
+    test_app_client: TestClient, details_url: str, query_budget
+):
+    with query_budget(1):
+        response = test_app_client.get(details_url)
+
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_get_reservation_details_without_lines(test_app_client: TestClient, test_db_session):
+    test_db_session.add(Reservation(id=2, status=ReservationStatus.CONFIRMED.value))
+    await test_db_session.flush()
+
+    response = test_app_client.get("reservation/2")
+
+    assert response.status_code == 200
+    assert response.json()["reservation_status"] == "confirmed"
+    assert response.json()["lines"] == []
+
+
+def test_get_reservation_details_not_found(test_app_client: TestClient):
+    response = test_app_client.get("reservation/3")
+
+    assert response.status_code == 404
+    assert response.json()["message"] == "Reservation not found"
+
+
+def test_etag_changes_with_reservation(isolated_app_client: TestClient):
+    etag = isolated_app_client.get("reservation/1").headers["ETag"]
+    isolated_app_client.post(
+        "reservation/make",
+        json={
+            "reservation_id": 1,
+            "product_id": 1,
+            "quantity": 3,
+            "timestamp": "2025-01-23T10:20:30.400+02:30",
+        },
+    )
+
+    response = isolated_app_client.get("reservation/1", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["lines"][0]["quantity"] == 3
@@ -145,3 +145,77 @@ async def test_make_reservation_closed(
     }
     mock_get_product.assert_awaited_once()
     mock_get_confirmed_reservation.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_add_product_reservation_from_stock_buckets(
+    test_app_client: TestClient,
+    request_payload_q7: dict,
+    make_reservation_url: str,
+    stock_buckets_enabled,
+    mock_get_bucketed_product: AsyncMock,
+    mock_get_reservation: AsyncMock,
+    mock_get_empty_product_reservation: AsyncMock,
+    mock_add_product_reservation: AsyncMock,
+    mock_move_bucket_stock: AsyncMock,
+):
+    response = test_app_client.post(make_reservation_url, json=request_payload_q7)
+
+    assert response.status_code == 200
+    # product row is read without a lock and is not changed
+    mock_get_bucketed_product.assert_awaited_once_with(456, ANY, False, ANY)
+    mock_move_bucket_stock.assert_awaited_once_with(456, 4, 7, ANY, ANY)
+    assert mock_get_bucketed_product.return_value.quantity == 0
+
+
+@pytest.mark.asyncio
+async def test_stock_buckets_not_enough_products(
+    test_app_client: TestClient,
+    request_payload_q7: dict,
+    make_reservation_url: str,
+    stock_buckets_enabled,
+    mock_get_bucketed_product: AsyncMock,
+    mock_get_reservation: AsyncMock,
+    mock_get_empty_product_reservation: AsyncMock,
+    mock_add_product_reservation: AsyncMock,
+    mock_move_bucket_stock: AsyncMock,
+):
+    mock_move_bucket_stock.return_value = False
+    response = test_app_client.post(make_reservation_url, json=request_payload_q7)
+
+    assert response.status_code == 422
+    assert response.json()["message"] == "Not enough products available"
+
+
+@pytest.mark.asyncio
+async def test_make_reservation_locked(
+    test_app_client: TestClient,
+    request_payload_q7: dict,
+    make_reservation_url: str,
+    mock_get_locked_product: AsyncMock,
+):
+    response = test_app_client.post(make_reservation_url, json=request_payload_q7)
+
+    assert response.status_code == 423
+    assert response.json() == {
+        "message": "Reservation is locked by another transaction",
+        "reservation_id": 123,
+        "status": "error",
+    }
+    mock_get_locked_product.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_make_reservation_locked_retried(
+    test_app_client: TestClient,
+    request_payload_q7: dict,
+    make_reservation_url: str,
+    lock_retries,
+    mock_get_locked_product: AsyncMock,
+    mock_get_reservation: AsyncMock,
+    mock_get_product_reservation_q5: AsyncMock,
+):
+    response = test_app_client.post(make_reservation_url, json=request_payload_q7)
+
+    assert response.status_code == 200
+    assert mock_get_locked_product.await_count == 2
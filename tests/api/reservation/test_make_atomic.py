@@ -0,0 +1,110 @@
+import pytest
+from fastapi.testclient import TestClient
+from mock import ANY, AsyncMock
+
+
+@pytest.mark.asyncio
+async def test_atomic_reservation_successful(
+    test_app_client: TestClient,
+    request_payload_q7: dict,
+    make_reservation_url: str,
+    atomic_reservation_engine,
+    mock_reserve_product: AsyncMock,
+    mock_get_product: AsyncMock,
+):
+    response = test_app_client.post(make_reservation_url, json=request_payload_q7)
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "message": "Reservation created/updated",
+        "reservation_id": 123,
+        "status": "success",
+    }
+    mock_reserve_product.assert_awaited_once_with(123, 456, 7, ANY, ANY)
+    mock_get_product.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_atomic_reservation_no_product(
+    test_app_client: TestClient,
+    request_payload_q5: dict,
+    make_reservation_url: str,
+    atomic_reservation_engine,
+    mock_reserve_product_unchanged: AsyncMock,
+    mock_get_empty_product: AsyncMock,
+):
+    response = test_app_client.post(make_reservation_url, json=request_payload_q5)
+
+    assert response.status_code == 404
+    assert response.json()["message"] == "Product not found"
+
+
+@pytest.mark.asyncio
+async def test_atomic_reservation_closed(
+    test_app_client: TestClient,
+    request_payload_q5: dict,
+    make_reservation_url: str,
+    atomic_reservation_engine,
+    mock_reserve_product_unchanged: AsyncMock,
+    mock_get_product: AsyncMock,
+    mock_get_confirmed_reservation: AsyncMock,
+):
+    response = test_app_client.post(make_reservation_url, json=request_payload_q5)
+
+    assert response.status_code == 409
+    assert response.json()["message"] == "Reservation is closed or confirmed"
+
+
+@pytest.mark.asyncio
+async def test_atomic_reservation_product_already_reserved(
+    test_app_client: TestClient,
+    request_payload_q5: dict,
+    make_reservation_url: str,
+    atomic_reservation_engine,
+    mock_reserve_product_unchanged: AsyncMock,
+    mock_get_product: AsyncMock,
+    mock_get_reservation: AsyncMock,
+    mock_get_product_reservation_q5: AsyncMock,
+):
+    response = test_app_client.post(make_reservation_url, json=request_payload_q5)
+
+    assert response.status_code == 409
+    assert response.json()["message"] == "This product is already reserved"
+
+
+@pytest.mark.asyncio
+async def test_atomic_reservation_not_enough_products(
+    test_app_client: TestClient,
+    request_payload_q30: dict,
+    make_reservation_url: str,
+    atomic_reservation_engine,
+    mock_reserve_product_unchanged: AsyncMock,
+    mock_get_product: AsyncMock,
+    mock_get_reservation: AsyncMock,
+    mock_get_product_reservation_q5: AsyncMock,
+):
+    response = test_app_client.post(make_reservation_url, json=request_payload_q30)
+
+    assert response.status_code == 422
+    assert response.json()["message"] == "Not enough products available"
+
+
+@pytest.mark.asyncio
+async def test_atomic_reservation_from_stock_buckets(
+    test_app_client: TestClient,
+    request_payload_q7: dict,
+    make_reservation_url: str,
+    atomic_reservation_engine,
+    mock_reserve_product_unchanged: AsyncMock,
+    mock_get_bucketed_product: AsyncMock,
+    mock_get_reservation: AsyncMock,
+    mock_get_empty_product_reservation: AsyncMock,
+    mock_add_product_reservation: AsyncMock,
+    mock_move_bucket_stock: AsyncMock,
+):
+    response = test_app_client.post(make_reservation_url, json=request_payload_q7)
+
+    assert response.status_code == 200
+    assert response.json()["message"] == "Reservation created/updated"
+    mock_get_bucketed_product.assert_awaited_once_with(456, ANY, False, ANY)
+    mock_move_bucket_stock.assert_awaited_once_with(456, 4, 7, ANY, ANY)
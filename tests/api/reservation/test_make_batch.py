@@ -0,0 +1,115 @@
+import pytest
+from fastapi.testclient import TestClient
+from mock import ANY, AsyncMock
+
+
+@pytest.mark.asyncio
+async def test_batch_reservation_successful(
+    test_app_client: TestClient,
+    batch_request_payload: dict,
+    make_batch_reservation_url: str,
+    mock_get_products: AsyncMock,
+    mock_get_reservation: AsyncMock,
+    mock_get_product_reservations_q5: AsyncMock,
+    mock_add_product_reservations: AsyncMock,
+):
+    response = test_app_client.post(make_batch_reservation_url, json=batch_request_payload)
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "message": "Reservation created/updated",
+        "reservation_id": 123,
+        "status": "success",
+        "lines": [
+            {"product_id": 457, "status": "success", "message": "Reservation line created/updated"},
+            {"product_id": 456, "status": "success", "message": "Reservation line created/updated"},
+        ],
+    }
+
+    mock_get_products.assert_awaited_once_with([457, 456], ANY, True, ANY)
+    mock_add_product_reservations.assert_awaited_once_with(123, {457: 1}, ANY, ANY)
+
+    products = mock_get_products.return_value
+    assert products[456].quantity == 8
+    assert products[457].quantity == 1
+    assert mock_get_product_reservations_q5.return_value[456].reservation_quantity == 7
+
+
+@pytest.mark.asyncio
+async def test_batch_reservation_not_enough_products(
+    test_app_client: TestClient,
+    batch_request_payload: dict,
+    make_batch_reservation_url: str,
+    mock_get_products: AsyncMock,
+    mock_get_reservation: AsyncMock,
+    mock_get_product_reservations_q5: AsyncMock,
+    mock_add_product_reservations: AsyncMock,
+):
+    batch_request_payload["lines"][0]["quantity"] = 3
+    response = test_app_client.post(make_batch_reservation_url, json=batch_request_payload)
+
+    assert response.status_code == 422
+    assert response.json() == {
+        "message": "Batch reservation failed, no lines were applied",
+        "reservation_id": 123,
+        "status": "error",
+        "lines": [
+            {"product_id": 457, "status": "error", "message": "Not enough products available"},
+            {"product_id": 456, "status": "success", "message": "Reservation line is valid"},
+        ],
+    }
+
+    mock_add_product_reservations.assert_not_awaited()
+    products = mock_get_products.return_value
+    assert products[456].quantity == 10
+    assert products[457].quantity == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_reservation_product_not_found(
+    test_app_client: TestClient,
+    batch_request_payload: dict,
+    make_batch_reservation_url: str,
+    mock_get_products: AsyncMock,
+    mock_get_reservation: AsyncMock,
+    mock_get_product_reservations_q5: AsyncMock,
+):
+    batch_request_payload["lines"].append({"product_id": 999, "quantity": 1})
+    response = test_app_client.post(make_batch_reservation_url, json=batch_request_payload)
+
+    assert response.status_code == 404
+    assert response.json()["lines"][2] == {
+        "product_id": 999,
+        "status": "error",
+        "message": "Product not found",
+    }
+
+
+@pytest.mark.asyncio
+async def test_batch_reservation_closed(
+    test_app_client: TestClient,
+    batch_request_payload: dict,
+    make_batch_reservation_url: str,
+    mock_get_products: AsyncMock,
+    mock_get_confirmed_reservation: AsyncMock,
+):
+    response = test_app_client.post(make_batch_reservation_url, json=batch_request_payload)
+
+    assert response.status_code == 409
+    assert response.json() == {
+        "message": "Reservation is closed or confirmed",
+        "reservation_id": 123,
+        "status": "error",
+    }
+
+
+@pytest.mark.asyncio
+async def test_batch_reservation_duplicate_products(
+    test_app_client: TestClient,
+    batch_request_payload: dict,
+    make_batch_reservation_url: str,
+):
+    batch_request_payload["lines"].append({"product_id": 456, "quantity": 1})
+    response = test_app_client.post(make_batch_reservation_url, json=batch_request_payload)
+
+    assert response.status_code == 422
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from asyncpg.exceptions import LockNotAvailableError
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.exc import DBAPIError
+
+from app.db import crud
+from app.db.crud import get_product, get_product_reservation
+from app.main import app
+
+
+@pytest.mark.asyncio
+async def test_coalesced_reservations(
+    coalesced_reservation_engine,
+    isolated_session_factory,
+):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        responses = await asyncio.gather(
+            *(
+                client.post(
+                    "reservation/make",
+                    json={
+                        "reservation_id": reservation_id,
+                        "product_id": 2,
+                        "quantity": 2,
+                        "timestamp": "2025-01-23T10:20:30.400+02:30",
+                    },
+                )
+                for reservation_id in range(10, 14)
+            )
+        )
+
+    # Product 2 has 5 items, the first two requests that arrive get them
+    status_codes = [response.status_code for response in responses]
+    assert sorted(status_codes) == [200, 200, 422, 422]
+    failed = status_codes.index(422)
+    assert responses[failed].json() == {
+        "message": "Not enough products available",
+        "reservation_id": 10 + failed,
+        "status": "error",
+    }
+
+    async with isolated_session_factory() as session:
+        product = await get_product(product_id=2, session=session, lock=False)
+        assert product.quantity == 1
+        for reservation_id, status_code in zip(range(10, 14), status_codes):
+            product_reservation = await get_product_reservation(
+                reservation_id, 2, session, lock=False
+            )
+            assert (product_reservation is not None) == (status_code == 200)
+
+
+@pytest.mark.asyncio
+async def test_coalesced_reservation_product_already_reserved(
+    coalesced_reservation_engine,
+):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post(
+            "reservation/make",
+            json={
+                "reservation_id": 1,
+                "product_id": 1,
+                "quantity": 2,
+                "timestamp": "2025-01-23T10:20:30.400+02:30",
+            },
+        )
+
+    assert response.status_code == 409
+    assert response.json()["message"] == "This product is already reserved"
+
+
+@pytest.mark.asyncio
+async def test_coalesced_reservation_locked_row_fails_alone(
+    coalesced_reservation_engine, isolated_session_factory, mocker
+):
+    get_reservation = crud.get_reservation
+
+    async def reservation_11_locked(reservation_id, *args):
+        if reservation_id == 11:
+            raise DBAPIError("SELECT ... FOR UPDATE NOWAIT", {}, LockNotAvailableError("locked"))
+        return await get_reservation(reservation_id, *args)
+
+    mocker.patch("app.routes.get_reservation", side_effect=reservation_11_locked)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        responses = await asyncio.gather(
+            *(
+                client.post(
+                    "reservation/make",
+                    json={
+                        "reservation_id": reservation_id,
+                        "product_id": 2,
+                        "quantity": 1,
+                        "timestamp": "2025-01-23T10:20:30.400+02:30",
+                    },
+                )
+                for reservation_id in (10, 11, 12)
+            )
+        )
+
+    assert [response.status_code for response in responses] == [200, 423, 200]
+    async with isolated_session_factory() as session:
+        product = await get_product(product_id=2, session=session, lock=False)
+        assert product.quantity == 3
+        assert await get_product_reservation(11, 2, session, lock=False) is None
+        assert await get_product_reservation(12, 2, session, lock=False) is not None
@@ -0,0 +1,102 @@
+import pytest
+from fastapi.testclient import TestClient
+from mock import patch
+from sqlalchemy import func, select
+
+from app.db.crud import get_product
+from app.db.idempotency import stored_response_cache
+from app.db.models import IdempotencyKey
+from app.utils.cache import MISSING
+
+
+@pytest.fixture
+def payload():
+    return {
+        "reservation_id": 10,
+        "product_id": 2,
+        "quantity": 2,
+        "timestamp": "2025-01-23T10:20:30.400+02:30",
+    }
+
+
+async def stored_keys(session_factory) -> int:
+    async with session_factory() as session:
+        return await session.scalar(select(func.count()).select_from(IdempotencyKey))
+
+
+@pytest.mark.asyncio
+async def test_repeated_request_is_replayed(
+    isolated_app_client: TestClient, isolated_session_factory, payload
+):
+    headers = {"Idempotency-Key": "retry-1"}
+    first = isolated_app_client.post("reservation/make", json=payload, headers=headers)
+    assert first.status_code == 200
+    assert "Idempotent-Replayed" not in first.headers
+
+    with patch("app.routes.get_product") as mock_get_product:
+        repeated = isolated_app_client.post("reservation/make", json=payload, headers=headers)
+        mock_get_product.assert_not_called()
+
+    assert repeated.status_code == 200
+    assert repeated.headers["Idempotent-Replayed"] == "true"
+    assert repeated.json() == first.json()
+
+    async with isolated_session_factory() as session:
+        product = await get_product(2, session, lock=False)
+        assert product.quantity == 3
+    assert await stored_keys(isolated_session_factory) == 1
+
+
+@pytest.mark.asyncio
+async def test_repeated_request_is_replayed_from_table(
+    isolated_app_client: TestClient, atomic_reservation_engine, payload
+):
+    headers = {"Idempotency-Key": "retry-1"}
+    first = isolated_app_client.post("reservation/make", json=payload, headers=headers)
+    stored_response_cache.clear()
+
+    repeated = isolated_app_client.post("reservation/make", json=payload, headers=headers)
+
+    assert repeated.status_code == 200
+    assert repeated.headers["Idempotent-Replayed"] == "true"
+    assert repeated.json() == first.json()
+    assert stored_response_cache.get("retry-1") is not MISSING
+
+
+def test_key_reused_for_different_request(isolated_app_client: TestClient, payload):
+    headers = {"Idempotency-Key": "retry-1"}
+    isolated_app_client.post("reservation/make", json=payload, headers=headers)
+
+    response = isolated_app_client.post(
+        "reservation/make", json={**payload, "quantity": 3}, headers=headers
+    )
+
+    assert response.status_code == 422
+    assert response.json() == {
+        "status": "error",
+        "message": "Idempotency key was already used for a different request",
+        "reservation_id": 10,
+    }
+
+
+@pytest.mark.asyncio
+async def test_failed_request_is_not_stored(
+    isolated_app_client: TestClient, isolated_session_factory, payload
+):
+    headers = {"Idempotency-Key": "retry-1"}
+    payload["quantity"] = 30
+
+    for _ in range(2):
+        response = isolated_app_client.post("reservation/make", json=payload, headers=headers)
+        assert response.status_code == 422
+        assert "Idempotent-Replayed" not in response.headers
+
+    assert await stored_keys(isolated_session_factory) == 0
+
+
+def test_requests_without_key_are_not_replayed(isolated_app_client: TestClient, payload):
+    isolated_app_client.post("reservation/make", json=payload)
+
+    response = isolated_app_client.post("reservation/make", json=payload)
+
+    assert response.status_code == 409
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+from sqlalchemy import select
+
+from app.db.models import OutboxEvent
+from settings import outbox_settings
+
+
+@pytest.fixture()
+def outbox_enabled(monkeypatch):
+    monkeypatch.setattr(outbox_settings, "OUTBOX_ENABLED", True)
+
+
+async def outbox_events(session_factory):
+    async with session_factory() as session:
+        result = await session.execute(
+            select(OutboxEvent.event_type, OutboxEvent.reservation_id, OutboxEvent.payload)
+            .order_by(OutboxEvent.id)
+        )
+        return [
+            (event_type, reservation_id, json.loads(payload))
+            for event_type, reservation_id, payload in result
+        ]
+
+
+@pytest.mark.asyncio
+async def test_reservation_changes_are_written_to_outbox(
+    isolated_app_client, isolated_session_factory, outbox_enabled
+):
+    make = isolated_app_client.post(
+        "reservation/make",
+        json={
+            "reservation_id": 5,
+            "product_id": 2,
+            "quantity": 3,
+            "timestamp": "2025-01-23T10:20:30+00:00",
+        },
+    )
+    confirm = isolated_app_client.put("reservation/confirm/5")
+    cancel = isolated_app_client.put("reservation/cancel/1")
+
+    assert (make.status_code, confirm.status_code, cancel.status_code) == (200, 200, 200)
+    assert await outbox_events(isolated_session_factory) == [
+        (
+            "reservation.updated",
+            5,
+            {
+                "status": "pending",
+                "lines": [{"product_id": 2, "quantity": 3}],
+                "timestamp": "2025-01-23T10:20:30+00:00",
+            },
+        ),
+        ("reservation.confirmed", 5, {"status": "confirmed"}),
+        ("reservation.cancelled", 1, {"status": "cancelled", "reason": "cancelled"}),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_failed_requests_write_no_events(
+    isolated_app_client, isolated_session_factory, outbox_enabled
+):
+    response = isolated_app_client.post(
+        "reservation/make/batch",
+        json={
+            "reservation_id": 5,
+            "lines": [{"product_id": 1, "quantity": 1}, {"product_id": 2, "quantity": 50}],
+            "timestamp": "2025-01-23T10:20:30+00:00",
+        },
+    )
+
+    assert response.status_code == 422
+    assert await outbox_events(isolated_session_factory) == []
+
+
+@pytest.mark.asyncio
+async def test_outbox_is_disabled_by_default(isolated_app_client, isolated_session_factory):
+    response = isolated_app_client.put("reservation/confirm/1")
+
+    assert response.status_code == 200
+    assert await outbox_events(isolated_session_factory) == []
@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import update
+
+from app.db.models import Reservation
+from app.main import app
+from app.utils.cache import reservation_status_cache
+from app.utils.subscriptions import reservation_status_subscriptions
+from settings import status_push_settings
+
+
+@pytest_asyncio.fixture()
+async def push_client(isolated_app_client):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    assert len(reservation_status_subscriptions) == 0
+
+
+def status_events(body: str):
+    return [
+        json.loads(event.split("data: ", 1)[1])["message"]
+        for event in body.split("\n\n")
+        if event.startswith("event: status")
+    ]
+
+
+async def confirm_later(client: AsyncClient, reservation_id: int):
+    await asyncio.sleep(0.05)
+    return await client.put(f"reservation/confirm/{reservation_id}")
+
+
+@pytest.mark.asyncio
+async def test_long_poll_is_woken_by_confirmation(push_client):
+    waiting, confirmed = await asyncio.gather(
+        push_client.get("reservation/status/1", params={"wait": 10}),
+        confirm_later(push_client, 1),
+    )
+
+    assert confirmed.status_code == 200
+    assert waiting.status_code == 200
+    assert waiting.json()["message"] == "Reservation status: confirmed"
+
+
+@pytest.mark.asyncio
+async def test_long_poll_returns_pending_after_wait(push_client):
+    response = await push_client.get("reservation/status/1", params={"wait": 0.05})
+
+    assert response.status_code == 200
+    assert response.json()["message"] == "Reservation status: pending"
+
+
+@pytest.mark.asyncio
+async def test_long_poll_of_missing_reservation(push_client):
+    response = await push_client.get("reservation/status/404", params={"wait": 10})
+
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_stream_ends_with_confirmation(push_client):
+    streamed, _ = await asyncio.gather(
+        push_client.get("reservation/status/1/stream"), confirm_later(push_client, 1)
+    )
+
+    assert streamed.status_code == 200
+    assert streamed.headers["content-type"].startswith("text/event-stream")
+    assert status_events(streamed.text) == [
+        "Reservation status: pending",
+        "Reservation status: confirmed",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stream_rechecks_changes_of_other_workers(
+    push_client, isolated_session_factory, monkeypatch
+):
+    monkeypatch.setattr(status_push_settings, "STATUS_STREAM_HEARTBEAT_SECONDS", 0.01)
+    monkeypatch.setattr(status_push_settings, "STATUS_STREAM_RECHECK_SECONDS", 0.05)
+    monkeypatch.setattr("app.routes.async_session_factory", isolated_session_factory)
+
+    async def cancel_elsewhere():
+        await asyncio.sleep(0.05)
+        async with isolated_session_factory() as session:
+            await session.execute(update(Reservation).values(status="cancelled"))
+            await session.commit()
+        # Rechecks read through the status cache, as if its entry had expired
+        reservation_status_cache.clear()
+
+    streamed, _ = await asyncio.gather(
+        push_client.get("reservation/status/1/stream"), cancel_elsewhere()
+    )
+
+    assert status_events(streamed.text)[-1] == "Reservation status: cancelled"
+    assert ": keep-alive" in streamed.text
+
+
+@pytest.mark.asyncio
+async def test_stream_of_missing_reservation(push_client):
+    response = await push_client.get("reservation/status/404/stream")
+
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_waiting_requests_are_limited(push_client, monkeypatch):
+    monkeypatch.setattr(reservation_status_subscriptions, "max_subscriptions", 0)
+
+    response = await push_client.get("reservation/status/1", params={"wait": 10})
+
+    assert response.status_code == 503
+    assert response.json() == {"status": "error", "message": "Too many requests are waiting"}
@@ -0,0 +1,33 @@
+import pytest
+from fastapi.testclient import TestClient
+from mock import AsyncMock
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(
+    test_app_client: TestClient,
+    check_reservation_status_url: str,
+    mock_get_empty_reservation: AsyncMock,
+):
+    test_app_client.get(check_reservation_status_url)
+
+    response = test_app_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert (
+        'http_requests_total{method="GET",route="/reservation/status/{reservation_id}",'
+        'status="404"}' in response.text
+    )
+    assert 'http_exceptions_total{exception="ReservationNotFoundException"}' in response.text
+    assert 'http_request_duration_seconds_bucket{method="GET",' in response.text
+    assert "db_pool_checked_out" in response.text
+    assert "lock_conflicts_total" in response.text
+    assert "lock_waited_requests_total" in response.text
+    assert "lock_wait_seconds_total" in response.text
+    assert "# TYPE lock_wait_seconds_max gauge" in response.text
+
+
+def test_metrics_disabled(test_app_client: TestClient, monkeypatch):
+    monkeypatch.setattr("app.main.metrics_settings.METRICS_ENABLED", False)
+    assert test_app_client.get("/metrics").status_code == 404
@@ -0,0 +1,62 @@
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.responses import PlainTextResponse
+from starlette.types import Receive, Scope, Send
+
+from app.middleware import LoggingMiddleware
+
+
+async def echo_app(scope: Scope, receive: Receive, send: Send) -> None:
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    await PlainTextResponse(body.decode())(scope, receive, send)
+
+
+def request_records(caplog):
+    return [record for record in caplog.records if record.getMessage().startswith("Request:")]
+
+
+def test_logging_middleware_body_prefix(caplog):
+    client = TestClient(LoggingMiddleware(echo_app, body_max_bytes=4))
+
+    with caplog.at_level(logging.INFO, logger="reservation_app"):
+        response = client.post("/echo", content=b"0123456789")
+
+    # The application still gets the whole body
+    assert response.text == "0123456789"
+    assert response.headers["server-timing"].startswith("app;dur=")
+
+    (record,) = request_records(caplog)
+    assert record.method == "POST"
+    assert record.path == "/echo"
+    assert record.status_code == 200
+    assert record.request_bytes == 10
+    assert record.response_bytes == 10
+    assert record.body == "0123... (10 bytes)"
+
+
+def test_logging_middleware_without_body(caplog):
+    client = TestClient(LoggingMiddleware(echo_app, body_max_bytes=0))
+
+    with caplog.at_level(logging.INFO, logger="reservation_app"):
+        client.put("/echo", content=b"0123456789")
+
+    (record,) = request_records(caplog)
+    assert record.body is None
+    assert record.request_bytes == 10
+
+
+@pytest.mark.asyncio
+async def test_app_has_server_timing(test_app_client: TestClient, caplog):
+    with caplog.at_level(logging.INFO, logger="reservation_app"):
+        response = test_app_client.get("/reservation/status/1")
+
+    assert "server-timing" in response.headers
+    (record,) = request_records(caplog)
+    assert record.status_code == response.status_code
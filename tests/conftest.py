@@ -1,6 +1,11 @@
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, List
 
+import pytest
 import pytest_asyncio
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from app.db.models import Base, Product, ProductReservation, Reservation, ReservationStatus
@@ -29,20 +34,24 @@ def session_factory(test_db_engine):
     )
 
 
+async def populate_db(session: AsyncSession) -> None:
+    product = Product(name="Product 1", quantity=10, price=100)
+    product_2 = Product(name="Product 2", quantity=5, price=50)
+    reservation = Reservation(status=ReservationStatus.PENDING)
+    product_reservation = ProductReservation(
+        product=product,
+        reservation=reservation,
+        reservation_quantity=2,
+        date=datetime(2025, 1, 1),
+    )
+    session.add_all([product, reservation, product_reservation, product_2])
+    await session.commit()
+
+
 @pytest_asyncio.fixture(scope="session")
 async def populate_test_db(session_factory, create_tables):
     async with session_factory() as session:
-        product = Product(name="Product 1", quantity=10, price=100)
-        product_2 = Product(name="Product 2", quantity=5, price=50)
-        reservation = Reservation(status=ReservationStatus.PENDING)
-        product_reservation = ProductReservation(
-            product=product,
-            reservation=reservation,
-            reservation_quantity=2,
-            date=datetime(2025, 1, 1),
-        )
-        session.add_all([product, reservation, product_reservation, product_2])
-        await session.commit()
+        await populate_db(session)
 
 
 @pytest_asyncio.fixture(scope="function")
@@ -50,3 +59,68 @@ async def test_db_session(session_factory, populate_test_db):
     async with session_factory() as session:
         yield session
         await session.rollback()
+
+
+@asynccontextmanager
+async def file_session_factory(path: Path) -> AsyncIterator[async_sessionmaker[AsyncSession]]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", echo=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as session:
+        await populate_db(session)
+    try:
+        yield factory
+    finally:
+        await engine.dispose()
+
+
+@pytest_asyncio.fixture()
+async def isolated_session_factory(tmp_path):
+    """
+    Session factory of a fresh database file with the same data as the shared test database,
+    for tests that commit their changes.
+    """
+    async with file_session_factory(tmp_path / "test.db") as factory:
+        yield factory
+
+
+@pytest_asyncio.fixture()
+async def replica_session_factory(tmp_path):
+    """
+    Session factory of a second database file with the same initial data, used as a replica
+    of the `isolated_session_factory` database. Nothing is replicated between them.
+    """
+    async with file_session_factory(tmp_path / "replica.db") as factory:
+        yield factory
+
+
+@pytest.fixture()
+def query_budget(test_db_engine):
+    """
+    Returns a context manager that fails the test if the code inside it executes
+    more SQL statements than the declared budget. The executed statements are yielded
+    so tests can inspect them.
+    """
+
+    @contextmanager
+    def _query_budget(max_statements: int):
+        statements: List[str] = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(test_db_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(
+                test_db_engine.sync_engine, "before_cursor_execute", before_cursor_execute
+            )
+
+        assert len(statements) <= max_statements, (
+            f"Expected at most {max_statements} SQL statements, got {len(statements)}:\n"
+            + "\n".join(statements)
+        )
+
+    return _query_budget
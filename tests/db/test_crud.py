@@ -1,18 +1,36 @@
 import asyncio
 from datetime import datetime
+from typing import List
 
 import pytest
 from asyncpg.exceptions import LockNotAvailableError
+from sqlalchemy import select
+from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 
 from app.db.crud import (
+    PRODUCT_STOCK_ONLY,
+    _nowait,
     add_product_reservation,
+    add_product_reservations,
     add_reservation,
+    cancel_reservations,
+    expire_reservations,
     get_product,
     get_product_reservation,
+    get_product_reservations,
+    get_products,
+    get_products_availability,
     get_reservation,
+    get_reservation_details,
+    move_bucket_stock,
+    rebalance_stock_buckets,
+    release_reservations_stock,
+    reserve_product,
+    set_stock_buckets,
 )
-from app.db.models import ReservationStatus
+from app.db.models import Product, ProductStockBucket, ReservationStatus
+from settings import db_settings, lock_settings
 
 
 @pytest.mark.asyncio
@@ -134,3 +152,291 @@ async def test_concurrent_locking(test_db_engine):
     assert not isinstance(results[0], Exception)
 
     assert isinstance(results[1].orig.__cause__, LockNotAvailableError)  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_get_products(test_db_session):
+    products = await get_products(product_ids=[2, 999, 1], session=test_db_session, lock=False)
+    assert list(products) == [1, 2]
+    assert products[1].name == "Product 1"
+    assert products[2].name == "Product 2"
+
+
+@pytest.mark.asyncio
+async def test_get_product_reservations(test_db_session):
+    product_reservations = await get_product_reservations(
+        reservation_id=1, product_ids=[1, 2], session=test_db_session, lock=False
+    )
+    assert list(product_reservations) == [1]
+    assert product_reservations[1].reservation_quantity == 2
+
+
+@pytest.mark.asyncio
+async def test_add_product_reservations(test_db_session):
+    await add_reservation(reservation_id=3, session=test_db_session)
+    new_product_reservations = await add_product_reservations(
+        reservation_id=3,
+        quantities={1: 1, 2: 2},
+        date=datetime(2025, 2, 1),
+        session=test_db_session,
+    )
+    assert [pr.product_id for pr in new_product_reservations] == [1, 2]
+
+    product_reservations = await get_product_reservations(
+        reservation_id=3, product_ids=[1, 2], session=test_db_session, lock=False
+    )
+    assert {pid: pr.reservation_quantity for pid, pr in product_reservations.items()} == {
+        1: 1,
+        2: 2,
+    }
+
+
+@pytest.mark.asyncio
+async def test_reserve_product_new_reservation(test_db_session):
+    remaining = await reserve_product(
+        reservation_id=4,
+        product_id=2,
+        quantity=3,
+        date=datetime(2025, 2, 1),
+        session=test_db_session,
+    )
+    assert remaining == 2
+
+    reservation = await get_reservation(reservation_id=4, session=test_db_session, lock=False)
+    assert reservation is not None
+    assert reservation.status == ReservationStatus.PENDING
+
+    product_reservation = await get_product_reservation(
+        reservation_id=4, product_id=2, session=test_db_session, lock=False
+    )
+    assert product_reservation is not None
+    assert product_reservation.reservation_quantity == 3
+
+
+@pytest.mark.asyncio
+async def test_reserve_product_change_quantity(test_db_session):
+    remaining = await reserve_product(
+        reservation_id=1,
+        product_id=1,
+        quantity=5,
+        date=datetime(2025, 2, 1),
+        session=test_db_session,
+    )
+    assert remaining == 7
+
+    product_reservation = await get_product_reservation(
+        reservation_id=1, product_id=1, session=test_db_session, lock=False
+    )
+    assert product_reservation.reservation_quantity == 5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "reservation_id, product_id, quantity",
+    [
+        (1, 999, 1),  # product does not exist
+        (1, 1, 2),  # same quantity is already reserved
+        (1, 2, 6),  # not enough products
+    ],
+)
+async def test_reserve_product_unchanged(test_db_session, reservation_id, product_id, quantity):
+    remaining = await reserve_product(
+        reservation_id=reservation_id,
+        product_id=product_id,
+        quantity=quantity,
+        date=datetime(2025, 2, 1),
+        session=test_db_session,
+    )
+    assert remaining is None
+
+
+@pytest.mark.asyncio
+async def test_reserve_product_closed_reservation(test_db_session):
+    reservation = await get_reservation(reservation_id=1, session=test_db_session, lock=False)
+    reservation.status = ReservationStatus.CONFIRMED
+    await test_db_session.flush()
+
+    remaining = await reserve_product(
+        reservation_id=1,
+        product_id=2,
+        quantity=1,
+        date=datetime(2025, 2, 1),
+        session=test_db_session,
+    )
+    assert remaining is None
+
+
+@pytest.mark.asyncio
+async def test_get_product_query_budget(test_db_session, query_budget):
+    with query_budget(1):
+        product = await get_product(product_id=1, session=test_db_session, lock=False)
+
+    with pytest.raises(InvalidRequestError):
+        product.product_reservations
+
+
+@pytest.mark.asyncio
+async def test_get_product_stock_only(test_db_session, query_budget):
+    with query_budget(1) as statements:
+        product = await get_product(
+            product_id=2, session=test_db_session, lock=False, options=PRODUCT_STOCK_ONLY
+        )
+
+    assert product.quantity == 5
+    assert "products.name" not in statements[0]
+
+
+@pytest.mark.asyncio
+async def test_reserve_product_query_budget(test_db_session, query_budget):
+    # sqlite runs the statements one by one, postgresql needs one statement
+    with query_budget(3):
+        await reserve_product(
+            reservation_id=5,
+            product_id=2,
+            quantity=1,
+            date=datetime(2025, 2, 1),
+            session=test_db_session,
+        )
+
+
+async def _bucket_quantities(product_id: int, session: AsyncSession) -> List[int]:
+    result = await session.execute(
+        select(ProductStockBucket.quantity)
+        .where(ProductStockBucket.product_id == product_id)
+        .order_by(ProductStockBucket.bucket)
+    )
+    return list(result.scalars())
+
+
+@pytest.mark.asyncio
+async def test_set_stock_buckets(test_db_session):
+    assert await set_stock_buckets(product_id=2, buckets=3, session=test_db_session)
+    assert await _bucket_quantities(2, test_db_session) == [2, 2, 1]
+
+    product = await get_product(product_id=2, session=test_db_session, lock=False)
+    assert product.quantity == 0
+    assert product.stock_buckets == 3
+
+    assert await set_stock_buckets(product_id=2, buckets=0, session=test_db_session)
+    assert await _bucket_quantities(2, test_db_session) == []
+    assert product.quantity == 5
+    assert product.stock_buckets == 0
+
+    assert not await set_stock_buckets(product_id=999, buckets=2, session=test_db_session)
+
+
+@pytest.mark.asyncio
+async def test_move_bucket_stock(test_db_session):
+    await set_stock_buckets(product_id=2, buckets=3, session=test_db_session)
+
+    assert await move_bucket_stock(2, 3, 2, test_db_session, start=1)
+    assert await _bucket_quantities(2, test_db_session) == [2, 0, 1]
+
+    assert await move_bucket_stock(2, 3, -1, test_db_session, start=2)
+    assert await _bucket_quantities(2, test_db_session) == [2, 0, 2]
+
+
+@pytest.mark.asyncio
+async def test_move_bucket_stock_fallback(test_db_session):
+    await set_stock_buckets(product_id=2, buckets=3, session=test_db_session)
+
+    # No single bucket has 4 units, the remaining stock is rebalanced
+    assert await move_bucket_stock(2, 3, 4, test_db_session)
+    assert await _bucket_quantities(2, test_db_session) == [1, 0, 0]
+
+    assert not await move_bucket_stock(2, 3, 2, test_db_session)
+    assert await _bucket_quantities(2, test_db_session) == [1, 0, 0]
+
+
+@pytest.mark.asyncio
+async def test_rebalance_stock_buckets(test_db_session):
+    await set_stock_buckets(product_id=2, buckets=2, session=test_db_session)
+    product = await get_product(product_id=2, session=test_db_session, lock=False)
+    product.quantity = 3
+    await test_db_session.flush()
+
+    assert await rebalance_stock_buckets(product_id=2, session=test_db_session) == 8
+    assert await _bucket_quantities(2, test_db_session) == [4, 4]
+    assert product.quantity == 0
+
+    assert await rebalance_stock_buckets(product_id=1, session=test_db_session) is None
+
+
+async def _product_quantity(product_id: int, session: AsyncSession) -> int:
+    return await session.scalar(select(Product.quantity).where(Product.id == product_id))
+
+
+@pytest.mark.asyncio
+async def test_release_reservations_stock(test_db_session):
+    await add_reservation(reservation_id=6, session=test_db_session)
+    await add_product_reservations(6, {1: 3, 2: 1}, datetime(2025, 2, 1), test_db_session)
+
+    units = await release_reservations_stock(reservation_ids=[1, 6], session=test_db_session)
+
+    assert units == 6
+    assert await _product_quantity(1, test_db_session) == 15
+    assert await _product_quantity(2, test_db_session) == 6
+    assert await release_reservations_stock(reservation_ids=[], session=test_db_session) == 0
+
+
+@pytest.mark.asyncio
+async def test_cancel_reservations(test_db_session):
+    await add_reservation(reservation_id=7, session=test_db_session)
+
+    cancelled_ids, units = await cancel_reservations(
+        reservation_ids=[1, 7, 999], session=test_db_session
+    )
+    assert cancelled_ids == [1, 7]
+    assert units == 2
+    assert await _product_quantity(1, test_db_session) == 12
+
+    # cancelled reservations are not cancelled again
+    assert await cancel_reservations(reservation_ids=[1], session=test_db_session) == ([], 0)
+
+
+@pytest.mark.asyncio
+async def test_expire_reservations(test_db_session):
+    await add_reservation(reservation_id=8, session=test_db_session)
+    await add_product_reservations(8, {2: 1}, datetime(2025, 3, 1), test_db_session)
+
+    cancelled_ids, units = await expire_reservations(
+        expired_before=datetime(2025, 2, 1), limit=10, session=test_db_session
+    )
+    assert cancelled_ids == [1]
+    assert units == 2
+
+    reservation = await get_reservation(reservation_id=1, session=test_db_session, lock=True)
+    assert reservation.status == ReservationStatus.CANCELLED
+
+
+@pytest.mark.asyncio
+async def test_get_reservation_details(test_db_session):
+    await add_product_reservations(1, {2: 3}, datetime(2025, 3, 1), test_db_session)
+
+    rows = await get_reservation_details(reservation_id=1, session=test_db_session)
+    assert [tuple(row) for row in rows] == [
+        ("pending", 1, "Product 1", 100, 2, datetime(2025, 1, 1)),
+        ("pending", 2, "Product 2", 50, 3, datetime(2025, 3, 1)),
+    ]
+
+    assert await get_reservation_details(reservation_id=999, session=test_db_session) == []
+
+
+@pytest.mark.asyncio
+async def test_get_products_availability(test_db_session):
+    await set_stock_buckets(1, 4, test_db_session)
+
+    assert await get_products_availability([1, 3], test_db_session) == {1: 10}
+    assert await get_products_availability(None, test_db_session) == {1: 10, 2: 5}
+
+
+@pytest.mark.parametrize(
+    "lock_timeout_ms, pgbouncer_mode, nowait",
+    [(0, False, True), (50, False, False), (0, True, True), (50, True, True)],
+)
+def test_nowait_behind_pgbouncer(monkeypatch, lock_timeout_ms, pgbouncer_mode, nowait):
+    # PgBouncer does not pass the lock_timeout on, waiting locks would never time out
+    monkeypatch.setattr(lock_settings, "LOCK_TIMEOUT_MS", lock_timeout_ms)
+    monkeypatch.setattr(db_settings, "DB_PGBOUNCER_MODE", pgbouncer_mode)
+
+    assert _nowait() == nowait
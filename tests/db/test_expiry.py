@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from asyncpg.exceptions import LockNotAvailableError
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
+
+from app.db import expiry
+from app.db.crud import add_product_reservations, add_reservation, get_reservation
+from app.db.expiry import ExpirySweeper
+from app.db.models import Product, ReservationStatus
+from app.utils.cache import recent_reservation_writes, reservation_status_cache
+
+
+@pytest.mark.asyncio
+async def test_expiry_sweeper(isolated_session_factory):
+    async with isolated_session_factory() as session:
+        for reservation_id in (2, 3, 4):
+            await add_reservation(reservation_id, session)
+        await add_product_reservations(2, {2: 1}, datetime(2025, 1, 1), session)
+        await add_product_reservations(3, {1: 1, 2: 2}, datetime(2025, 1, 1), session)
+        await add_product_reservations(4, {2: 1}, datetime.now(timezone.utc), session)
+        await session.commit()
+
+    sweeper = ExpirySweeper(
+        isolated_session_factory, ttl=timedelta(hours=1), batch_size=2, interval=1
+    )
+    result = await sweeper.sweep()
+
+    # Reservations 1-3 expired and are cancelled in two batches, 4 is still fresh
+    assert result.reservations == 3
+    assert result.units == 6
+    assert reservation_status_cache.get(3) == ReservationStatus.CANCELLED.value
+
+    async with isolated_session_factory() as session:
+        quantities = dict((await session.execute(select(Product.id, Product.quantity))).all())
+        assert quantities == {1: 13, 2: 8}
+        reservation = await get_reservation(4, session, lock=False)
+        assert reservation.status == ReservationStatus.PENDING
+
+    assert (await sweeper.sweep()).reservations == 0
+    reservation_status_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_expiry_sweeper_skips_locked_batch(isolated_session_factory, monkeypatch):
+    async with isolated_session_factory() as session:
+        for reservation_id in (2, 3):
+            await add_reservation(reservation_id, session)
+            await add_product_reservations(reservation_id, {2: 1}, datetime(2025, 1, 1), session)
+        await session.commit()
+
+    cancel_expired_reservations = expiry.cancel_expired_reservations
+    batches = []
+
+    async def cancel_unless_first_batch(reservation_ids, *args):
+        batches.append(list(reservation_ids))
+        if len(batches) == 1:
+            raise DBAPIError("SELECT ... FOR UPDATE", {}, LockNotAvailableError("locked"))
+        return await cancel_expired_reservations(reservation_ids, *args)
+
+    monkeypatch.setattr(expiry, "cancel_expired_reservations", cancel_unless_first_batch)
+    sweeper = ExpirySweeper(
+        isolated_session_factory, ttl=timedelta(hours=1), batch_size=2, interval=1
+    )
+    result = await sweeper.sweep()
+
+    assert batches == [[1, 2], [3]]
+    assert (result.reservations, result.skipped_batches) == (1, 1)
+    # Reads of the cancelled reservation go to the primary for a while
+    assert recent_reservation_writes.get(3) is True
+    reservation_status_cache.clear()
+    recent_reservation_writes.clear()
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.db.crud import add_idempotency_key, delete_idempotency_keys
+from app.db.idempotency import IdempotencyKeyCleaner
+from app.db.models import IdempotencyKey
+
+NOW = datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_delete_idempotency_keys(test_db_session):
+    for age in range(5):
+        await add_idempotency_key(
+            f"key-{age}", "hash", 200, "{}", NOW - timedelta(hours=age), test_db_session
+        )
+
+    deleted = await delete_idempotency_keys(NOW - timedelta(minutes=90), 2, test_db_session)
+
+    assert deleted == 2
+    keys = await test_db_session.scalars(select(IdempotencyKey.key).order_by(IdempotencyKey.key))
+    assert keys.all() == ["key-0", "key-1", "key-2"]
+
+
+@pytest.mark.asyncio
+async def test_cleaner_deletes_expired_keys_in_batches(isolated_session_factory):
+    now = datetime.now(timezone.utc)
+    async with isolated_session_factory() as session:
+        for number in range(5):
+            await add_idempotency_key(
+                f"old-{number}", "hash", 200, "{}", now - timedelta(days=2), session
+            )
+        await add_idempotency_key("new", "hash", 200, "{}", now, session)
+        await session.commit()
+
+    cleaner = IdempotencyKeyCleaner(
+        isolated_session_factory, ttl=timedelta(days=1), batch_size=2, interval=1
+    )
+
+    assert await cleaner.clean() == 5
+    async with isolated_session_factory() as session:
+        keys = await session.scalars(select(IdempotencyKey.key))
+        assert keys.all() == ["new"]
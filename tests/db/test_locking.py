@@ -0,0 +1,101 @@
+from typing import List
+
+import pytest
+from asyncpg.exceptions import LockNotAvailableError
+from sqlalchemy.exc import DBAPIError
+
+from app.db.locking import LockRetryPolicy, is_lock_not_available
+
+
+def lock_error() -> DBAPIError:
+    return DBAPIError("SELECT ... FOR UPDATE NOWAIT", {}, LockNotAvailableError("locked"))
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps: List[float] = []
+
+    def clock(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_operation(failures: int):
+    calls = {"count": 0}
+
+    async def operation():
+        calls["count"] += 1
+        if calls["count"] <= failures:
+            raise lock_error()
+        return "done"
+
+    return operation, calls
+
+
+def test_is_lock_not_available():
+    assert is_lock_not_available(lock_error())
+    assert not is_lock_not_available(DBAPIError("SELECT 1", {}, ValueError("other")))
+
+
+@pytest.mark.asyncio
+async def test_lock_retry_policy_succeeds_after_retries():
+    fake_time = FakeTime()
+    policy = LockRetryPolicy(
+        retries=3, backoff=0.01, deadline=1, sleep=fake_time.sleep, clock=fake_time.clock
+    )
+    operation, calls = make_operation(failures=2)
+
+    assert await policy.run(operation) == "done"
+    assert calls["count"] == 3
+    assert len(fake_time.sleeps) == 2
+    assert all(0 <= delay <= 0.02 for delay in fake_time.sleeps)
+
+    stats = policy.stats()
+    assert stats.lock_conflicts == 2
+    assert stats.retries == 2
+    assert stats.exhausted == 0
+    assert stats.waited_requests == 1
+    assert stats.wait_seconds_total == pytest.approx(sum(fake_time.sleeps))
+
+
+@pytest.mark.asyncio
+async def test_lock_retry_policy_gives_up():
+    fake_time = FakeTime()
+    policy = LockRetryPolicy(
+        retries=2, backoff=0.01, deadline=1, sleep=fake_time.sleep, clock=fake_time.clock
+    )
+    operation, calls = make_operation(failures=5)
+
+    with pytest.raises(DBAPIError):
+        await policy.run(operation)
+    assert calls["count"] == 3
+    assert policy.stats().exhausted == 1
+
+
+@pytest.mark.asyncio
+async def test_lock_retry_policy_deadline():
+    fake_time = FakeTime()
+    policy = LockRetryPolicy(
+        retries=100, backoff=1, deadline=0.5, sleep=fake_time.sleep, clock=fake_time.clock
+    )
+    operation, _ = make_operation(failures=100)
+
+    with pytest.raises(DBAPIError):
+        await policy.run(operation)
+    assert sum(fake_time.sleeps) <= 0.5
+
+
+@pytest.mark.asyncio
+async def test_lock_retry_policy_other_errors_are_not_retried():
+    policy = LockRetryPolicy(retries=3, backoff=0.01, deadline=1)
+
+    async def operation():
+        raise DBAPIError("SELECT 1", {}, ValueError("other"))
+
+    with pytest.raises(DBAPIError):
+        await policy.run(operation)
+    assert policy.stats().retries == 0
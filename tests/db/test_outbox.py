@@ -0,0 +1,137 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from sqlalchemy import func, select
+
+from app.db.crud import claim_outbox_events, delete_outbox_events
+from app.db.expiry import ExpirySweeper
+from app.db.models import OutboxEvent, OutboxEventType
+from app.db.outbox import (
+    FileSink,
+    OutboxRelay,
+    WebhookSink,
+    cancellation_events,
+    record_events,
+)
+from settings import outbox_settings
+
+
+@pytest.fixture()
+def outbox_enabled(monkeypatch):
+    monkeypatch.setattr(outbox_settings, "OUTBOX_ENABLED", True)
+
+
+async def add_events(session_factory, count: int) -> None:
+    async with session_factory() as session:
+        async with session.begin():
+            await record_events(
+                OutboxEventType.RESERVATION_CANCELLED,
+                cancellation_events(range(1, count + 1), "expired"),
+                session,
+            )
+
+
+async def outbox_size(session_factory) -> int:
+    async with session_factory() as session:
+        return await session.scalar(select(func.count()).select_from(OutboxEvent))
+
+
+@pytest.mark.asyncio
+async def test_record_events_does_nothing_while_disabled(test_db_session):
+    await record_events(
+        OutboxEventType.RESERVATION_CONFIRMED, [(1, {"status": "confirmed"})], test_db_session
+    )
+
+    assert await claim_outbox_events(10, test_db_session) == []
+
+
+@pytest.mark.asyncio
+async def test_claim_and_delete_outbox_events(test_db_session, outbox_enabled):
+    await record_events(
+        OutboxEventType.RESERVATION_UPDATED,
+        [(7, {"status": "pending"}), (8, {"status": "pending"}), (9, {"status": "pending"})],
+        test_db_session,
+    )
+
+    events = await claim_outbox_events(2, test_db_session)
+    assert [event.reservation_id for event in events] == [7, 8]
+    assert json.loads(events[0].payload) == {"status": "pending"}
+
+    assert await delete_outbox_events([event.id for event in events], test_db_session) == 2
+    remaining = await claim_outbox_events(10, test_db_session)
+    assert [event.reservation_id for event in remaining] == [9]
+
+
+@pytest.mark.asyncio
+async def test_expiry_sweeper_writes_cancellations(isolated_session_factory, outbox_enabled):
+    sweeper = ExpirySweeper(
+        isolated_session_factory, ttl=timedelta(hours=1), batch_size=10, interval=1
+    )
+    await sweeper.sweep()
+
+    async with isolated_session_factory() as session:
+        events = await claim_outbox_events(10, session)
+    assert [(event.event_type, event.reservation_id) for event in events] == [
+        ("reservation.cancelled", 1)
+    ]
+    assert json.loads(events[0].payload) == {"status": "cancelled", "reason": "expired"}
+
+
+@pytest.mark.asyncio
+async def test_relay_appends_batches_to_file(isolated_session_factory, outbox_enabled, tmp_path):
+    await add_events(isolated_session_factory, 5)
+    path = tmp_path / "outbox.ndjson"
+    relay = OutboxRelay(isolated_session_factory, FileSink(str(path)), batch_size=2, interval=1)
+
+    assert await relay.relay() == 5
+
+    messages = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [message["reservation_id"] for message in messages] == [1, 2, 3, 4, 5]
+    assert messages[0]["type"] == "reservation.cancelled"
+    assert messages[0]["data"] == {"status": "cancelled", "reason": "expired"}
+    assert datetime.fromisoformat(messages[0]["created_at"]).tzinfo == timezone.utc
+    assert await outbox_size(isolated_session_factory) == 0
+
+    stats = relay.stats()
+    assert (stats.batches, stats.published) == (3, 5)
+    assert await relay.relay() == 0
+    assert relay.stats().lag_seconds == 0
+
+
+@pytest.mark.asyncio
+async def test_relay_delivers_to_webhook(isolated_session_factory, outbox_enabled):
+    bodies = []
+
+    def webhook(request: httpx.Request) -> httpx.Response:
+        bodies.append((request.headers["Content-Type"], request.content))
+        return httpx.Response(204)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(webhook))
+    sink = WebhookSink("http://fulfilment.local/events", timeout=1, client=client)
+    await add_events(isolated_session_factory, 3)
+    relay = OutboxRelay(isolated_session_factory, sink, batch_size=10, interval=1)
+
+    assert await relay.relay() == 3
+    await sink.close()
+
+    assert len(bodies) == 1
+    content_type, body = bodies[0]
+    assert content_type == "application/x-ndjson"
+    assert [json.loads(line)["reservation_id"] for line in body.splitlines()] == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_relay_keeps_events_the_sink_rejected(isolated_session_factory, outbox_enabled):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda _: httpx.Response(503)))
+    sink = WebhookSink("http://fulfilment.local/events", timeout=1, client=client)
+    await add_events(isolated_session_factory, 3)
+    relay = OutboxRelay(isolated_session_factory, sink, batch_size=10, interval=1)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await relay.relay()
+    await sink.close()
+
+    assert await outbox_size(isolated_session_factory) == 3
+    assert relay.stats().published == 0
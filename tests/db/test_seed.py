@@ -0,0 +1,82 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.models import Product, ProductReservation, Reservation, ReservationStatus
+from app.db.seed import SeedConfig, main, seed_data
+
+
+async def dump(engine):
+    async with engine.connect() as connection:
+        return {
+            table.name: (await connection.execute(select(table).order_by(table.c.id))).all()
+            for table in (Product.__table__, Reservation.__table__, ProductReservation.__table__)
+        }
+
+
+@pytest.mark.asyncio
+async def test_seed_is_deterministic(tmp_path):
+    tables = []
+    for name, chunk_size in (("first.db", 7), ("second.db", 1000)):
+        url = f"sqlite+aiosqlite:///{tmp_path / name}"
+        await main(
+            [
+                "--db-url", url, "--create-tables", "--products", "20", "--reservations", "50",
+                "--lines-per-reservation", "3", "--skew", "zipf", "--chunk-size", str(chunk_size),
+                "--end-date", "2025-01-01T00:00:00",
+            ]
+        )  # fmt: skip
+        engine = create_async_engine(url)
+        tables.append(await dump(engine))
+        await engine.dispose()
+
+    assert tables[0] == tables[1]
+    assert len(tables[0]["products"]) == 20
+    assert len(tables[0]["reservations"]) == 50
+    assert len(tables[0]["products_reservations"]) == 150
+
+
+@pytest.mark.asyncio
+async def test_zipf_skew_concentrates_lines_on_few_products(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'zipf.db'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(Product.metadata.create_all)
+
+    config = SeedConfig(
+        products=100, reservations=2_000, lines_per_reservation=1, skew="zipf", chunk_size=500
+    )
+    assert await seed_data(config, engine)
+    lines = (await dump(engine))["products_reservations"]
+    counts = Counter(line.product_id for line in lines)
+    assert counts.most_common(1)[0][1] > 10 * sorted(counts.values())[len(counts) // 2]
+
+    # Seeding again leaves the existing data alone
+    assert not await seed_data(config, engine)
+    async with engine.connect() as connection:
+        assert await connection.scalar(select(func.count()).select_from(Reservation)) == 2_000
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_pending_reservations_are_dated_recently(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'recent.db'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(Product.metadata.create_all)
+
+    # SQLite returns the dates without their UTC time zone
+    started = datetime.now(timezone.utc).replace(tzinfo=None)
+    assert await seed_data(SeedConfig(products=10, reservations=200, pending_max_age=60), engine)
+    async with engine.connect() as connection:
+        result = await connection.execute(
+            select(Reservation.status, func.min(ProductReservation.date))
+            .join(ProductReservation)
+            .group_by(Reservation.status)
+        )
+        oldest = dict(result.all())
+    await engine.dispose()
+
+    assert oldest[ReservationStatus.PENDING.value] >= started - timedelta(seconds=61)
+    assert oldest[ReservationStatus.CONFIRMED.value] < started - timedelta(days=1)
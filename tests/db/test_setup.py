@@ -0,0 +1,45 @@
+from sqlalchemy.pool import NullPool
+
+from app.db.setup import engine_options
+from settings import DBSettings, LockSettings
+
+
+def make_db_settings(**overrides) -> DBSettings:
+    return DBSettings(
+        DB_HOST="localhost",
+        DB_PORT=5432,
+        DB_USER="postgres",
+        DB_PASS="postgres",
+        DB_NAME="shop_db",
+        **overrides,
+    )
+
+
+def test_engine_options_pool():
+    options = engine_options(
+        make_db_settings(DB_POOL_SIZE=64, DB_MAX_OVERFLOW=0, DB_PREPARED_STATEMENT_CACHE_SIZE=500),
+        LockSettings(LOCK_TIMEOUT_MS=50),
+    )
+
+    assert options["pool_size"] == 64
+    assert options["max_overflow"] == 0
+    assert options["connect_args"] == {
+        "statement_cache_size": 100,
+        "prepared_statement_cache_size": 500,
+        "server_settings": {"lock_timeout": "50"},
+    }
+
+
+def test_engine_options_pgbouncer_mode():
+    options = engine_options(
+        make_db_settings(DB_PGBOUNCER_MODE=True, DB_POOL_SIZE=64), LockSettings(LOCK_TIMEOUT_MS=50)
+    )
+
+    assert options["poolclass"] is NullPool
+    assert "pool_size" not in options
+    connect_args = options["connect_args"]
+    assert connect_args["statement_cache_size"] == 0
+    assert connect_args["prepared_statement_cache_size"] == 0
+    assert "server_settings" not in connect_args
+    name_func = connect_args["prepared_statement_name_func"]
+    assert name_func() != name_func()
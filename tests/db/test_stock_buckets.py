@@ -0,0 +1,81 @@
+import pytest
+from asyncpg.exceptions import LockNotAvailableError
+from sqlalchemy import select, update
+from sqlalchemy.exc import DBAPIError
+
+from app.db import crud
+from app.db.crud import get_unbalanced_bucketed_products, set_stock_buckets
+from app.db.models import Product, ProductStockBucket
+from app.db.stock_buckets import StockBucketRebalancer
+
+
+async def stock(session_factory, product_id: int):
+    async with session_factory() as session:
+        product_quantity = await session.scalar(
+            select(Product.quantity).where(Product.id == product_id)
+        )
+        buckets = await session.scalars(
+            select(ProductStockBucket.quantity)
+            .where(ProductStockBucket.product_id == product_id)
+            .order_by(ProductStockBucket.bucket)
+        )
+        return product_quantity, list(buckets)
+
+
+async def unbalance_stock(session):
+    await set_stock_buckets(1, 3, session)
+    await set_stock_buckets(2, 2, session)
+    # Stock of product 1 was returned to its row, a bucket of product 2 ran empty
+    await session.execute(update(Product).where(Product.id == 1).values(quantity=5))
+    await session.execute(
+        update(ProductStockBucket)
+        .where(ProductStockBucket.product_id == 2)
+        .values(quantity=ProductStockBucket.bucket * 5)
+    )
+    await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_rebalancer_spreads_returned_stock(isolated_session_factory):
+    async with isolated_session_factory() as session:
+        await unbalance_stock(session)
+
+        assert await get_unbalanced_bucketed_products(10, session) == [1, 2]
+        assert await get_unbalanced_bucketed_products(1, session) == [1]
+
+    rebalancer = StockBucketRebalancer(isolated_session_factory, batch_size=10, interval=1)
+
+    assert await rebalancer.rebalance() == 2
+    assert await stock(isolated_session_factory, 1) == (0, [5, 5, 5])
+    assert await stock(isolated_session_factory, 2) == (0, [3, 2])
+    # Balanced products are not touched again
+    assert await rebalancer.rebalance() == 0
+
+
+@pytest.mark.asyncio
+async def test_rebalancer_ignores_products_without_buckets(isolated_session_factory):
+    rebalancer = StockBucketRebalancer(isolated_session_factory, batch_size=10, interval=1)
+
+    assert await rebalancer.rebalance() == 0
+    assert await stock(isolated_session_factory, 1) == (10, [])
+
+
+@pytest.mark.asyncio
+async def test_rebalancer_skips_locked_products(isolated_session_factory, mocker):
+    async with isolated_session_factory() as session:
+        await unbalance_stock(session)
+    lock_stock_buckets = crud._lock_stock_buckets
+
+    async def product_1_locked(product_id, session, nowait):
+        if product_id == 1:
+            raise DBAPIError("SELECT ... FOR UPDATE NOWAIT", {}, LockNotAvailableError("locked"))
+        return await lock_stock_buckets(product_id, session, nowait)
+
+    lock = mocker.patch("app.db.crud._lock_stock_buckets", side_effect=product_1_locked)
+    rebalancer = StockBucketRebalancer(isolated_session_factory, batch_size=10, interval=1)
+
+    assert await rebalancer.rebalance() == 1
+    # The rebalancer never waits for locked products
+    assert all(call.kwargs["nowait"] for call in lock.call_args_list)
+    assert await stock(isolated_session_factory, 1) == (5, [4, 3, 3])
+    assert await stock(isolated_session_factory, 2) == (0, [3, 2])
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from app.db.availability import StockSnapshot
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_reloaded_when_stale(isolated_session_factory):
+    clock = FakeClock()
+    snapshot = StockSnapshot(isolated_session_factory, interval=1, max_staleness=5, clock=clock)
+
+    assert await snapshot.get([1, 2, 3]) == ({1: 10, 2: 5}, 0)
+
+    clock.now += 5
+    assert await snapshot.get([2]) == ({2: 5}, 5)
+    assert snapshot.stats().refreshes == 1
+
+    clock.now += 1
+    assert await snapshot.get([2]) == ({2: 5}, 0)
+    assert snapshot.stats().refreshes == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reads_share_one_reload(isolated_session_factory):
+    snapshot = StockSnapshot(isolated_session_factory, interval=1, max_staleness=5)
+
+    results = await asyncio.gather(*(snapshot.get([1]) for _ in range(10)))
+
+    assert all(available == {1: 10} for available, _ in results)
+    assert snapshot.stats().refreshes == 1
+    assert snapshot.stats().products == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_reload():
+    def broken_session_factory():
+        raise ConnectionError("database is down")
+
+    snapshot = StockSnapshot(broken_session_factory, interval=1, max_staleness=5)
+
+    with pytest.raises(ConnectionError):
+        await snapshot.get([1])
+    assert snapshot.stats().failed_refreshes == 1
+    assert snapshot.age() is None
@@ -0,0 +1,67 @@
+from app.utils.cache import MISSING, TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_cache_hit_and_miss():
+    cache = TTLCache(max_size=10, ttl=5)
+    assert cache.get(1) is MISSING
+
+    cache.set(1, "pending")
+    assert cache.get(1) == "pending"
+
+    stats = cache.stats()
+    assert stats.hits == 1
+    assert stats.misses == 1
+    assert stats.size == 1
+
+
+def test_cache_none_value():
+    cache = TTLCache(max_size=10, ttl=5)
+    cache.set(1, None)
+    assert cache.get(1) is None
+
+
+def test_cache_ttl_expiration():
+    clock = FakeClock()
+    cache = TTLCache(max_size=10, ttl=5, clock=clock)
+    cache.set(1, "pending")
+    cache.set(2, None, ttl=1)
+
+    clock.now = 2
+    assert cache.get(1) == "pending"
+    assert cache.get(2) is MISSING
+
+    clock.now = 5
+    assert cache.get(1) is MISSING
+    assert cache.stats().expirations == 2
+    assert len(cache) == 0
+
+
+def test_cache_lru_eviction():
+    cache = TTLCache(max_size=2, ttl=5)
+    cache.set(1, "pending")
+    cache.set(2, "pending")
+    cache.get(1)
+    cache.set(3, "confirmed")
+
+    assert cache.get(2) is MISSING
+    assert cache.get(1) == "pending"
+    assert cache.get(3) == "confirmed"
+    assert cache.stats().evictions == 1
+
+
+def test_cache_invalidate_and_disabled():
+    cache = TTLCache(max_size=2, ttl=5)
+    cache.set(1, "pending")
+    cache.invalidate(1)
+    assert cache.get(1) is MISSING
+
+    cache.set(1, "pending", ttl=0)
+    assert cache.get(1) is MISSING
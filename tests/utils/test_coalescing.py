@@ -0,0 +1,77 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from app.utils.coalescing import RequestCoalescer
+
+
+class Recorder:
+    def __init__(self, delay: float = 0):
+        self.batches: List[List[int]] = []
+        self.delay = delay
+        self.running = 0
+        self.max_running = 0
+
+    async def __call__(self, key: str, items: List[int]):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        self.batches.append(items)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        return [ValueError(item) if item < 0 else item * 10 for item in items]
+
+
+@pytest.mark.asyncio
+async def test_coalescer_groups_concurrent_items():
+    recorder = Recorder()
+    coalescer = RequestCoalescer(recorder, window=0.01, max_batch=100)
+
+    results = await asyncio.gather(*(coalescer.submit("a", item) for item in [1, 2, 3]))
+
+    assert results == [10, 20, 30]
+    assert recorder.batches == [[1, 2, 3]]
+
+
+@pytest.mark.asyncio
+async def test_coalescer_returns_exceptions_to_their_callers():
+    coalescer = RequestCoalescer(Recorder(), window=0.01, max_batch=100)
+
+    results = await asyncio.gather(
+        *(coalescer.submit("a", item) for item in [1, -2, 3]), return_exceptions=True
+    )
+
+    assert results[0] == 10
+    assert isinstance(results[1], ValueError)
+    assert results[2] == 30
+
+
+@pytest.mark.asyncio
+async def test_coalescer_max_batch_and_keys():
+    recorder = Recorder()
+    coalescer = RequestCoalescer(recorder, window=10, max_batch=2)
+
+    results = await asyncio.gather(
+        coalescer.submit("a", 1),
+        coalescer.submit("b", 2),
+        coalescer.submit("a", 3),
+        coalescer.submit("b", 4),
+    )
+
+    assert results == [10, 20, 30, 40]
+    assert sorted(recorder.batches) == [[1, 3], [2, 4]]
+
+
+@pytest.mark.asyncio
+async def test_coalescer_runs_one_batch_per_key():
+    recorder = Recorder(delay=0.02)
+    coalescer = RequestCoalescer(recorder, window=0.001, max_batch=100)
+
+    first = asyncio.create_task(coalescer.submit("a", 1))
+    await asyncio.sleep(0.005)
+    rest = [asyncio.create_task(coalescer.submit("a", item)) for item in [2, 3]]
+
+    assert await asyncio.gather(first, *rest) == [10, 20, 30]
+    assert recorder.batches == [[1], [2, 3]]
+    assert recorder.max_running == 1
+    assert coalescer.pending == 0
@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from app.utils.dto import ReservationLineResponse, ReservationResponse
+from app.utils.exceptions import (
+    BatchReservationException,
+    FixedMessageReservationException,
+    NotEnoughProductsException,
+    ReservationIsLockedException,
+)
+
+
+@pytest.mark.parametrize(
+    "exception_class",
+    FixedMessageReservationException.__subclasses__(),
+    ids=lambda cls: cls.__name__,
+)
+def test_rendered_body_matches_response(exception_class):
+    exc = exception_class(123)
+
+    assert exc.render() == exc.response.model_dump_json().encode()
+    assert exc.response == ReservationResponse(
+        status="error", message=exc.message, reservation_id=123
+    )
+
+
+def test_fixed_message_exception_attributes():
+    exc = ReservationIsLockedException(7)
+
+    assert exc.status_code == 423
+    assert exc.reservation_id == 7
+    assert json.loads(exc.render()) == {
+        "status": "error",
+        "message": "Reservation is locked by another transaction",
+        "reservation_id": 7,
+    }
+
+
+def test_batch_exception_renders_lines():
+    lines = [ReservationLineResponse(product_id=1, status="error", message="Not enough")]
+    exc = BatchReservationException(NotEnoughProductsException(5).status_code, 5, lines)
+
+    assert exc.status_code == 422
+    assert exc.message == "Batch reservation failed, no lines were applied"
+    assert json.loads(exc.render())["lines"] == [
+        {"product_id": 1, "status": "error", "message": "Not enough"}
+    ]
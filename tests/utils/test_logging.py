@@ -0,0 +1,110 @@
+import io
+import json
+import logging
+import queue
+
+from app.utils.logging import (
+    ErrorAggregator,
+    JsonFormatter,
+    LogWriter,
+    NonBlockingQueueHandler,
+    SamplingFilter,
+    truncate_body,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_record(msg: str, *args, level: int = logging.ERROR, **extra) -> logging.LogRecord:
+    record = logging.LogRecord("reservation_app", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter():
+    record = make_record("Product with id %s not found", 5, status_code=404)
+
+    payload = json.loads(JsonFormatter().format(record))
+
+    assert payload["level"] == "ERROR"
+    assert payload["logger"] == "reservation_app"
+    assert payload["message"] == "Product with id 5 not found"
+    assert payload["status_code"] == 404
+
+
+def test_sampling_filter():
+    values = iter([0.05, 0.5])
+    sampling = SamplingFilter({"info": 0.1}, rand=lambda: next(values))
+
+    assert sampling.filter(make_record("kept", level=logging.INFO))
+    assert not sampling.filter(make_record("dropped", level=logging.INFO))
+    # Levels without a rate are always kept
+    assert sampling.filter(make_record("error"))
+
+
+def test_error_aggregator():
+    clock = FakeClock()
+    aggregator = ErrorAggregator(interval=10, clock=clock)
+
+    assert aggregator.admit(make_record("Locked %s", 1))
+    assert not aggregator.admit(make_record("Locked %s", 2))
+    assert not aggregator.admit(make_record("Locked %s", 3))
+    assert aggregator.admit(make_record("Not found %s", 1))
+    assert aggregator.admit(make_record("Info %s", 1, level=logging.INFO))
+    assert aggregator.due() == []
+
+    clock.now = 10
+    summaries = aggregator.due()
+    assert [summary.getMessage() for summary in summaries] == [
+        "Locked %s (repeated 2 more times in 10.0s)"
+    ]
+    assert summaries[0].repeated == 2
+    # A new window starts after the summary
+    assert aggregator.admit(make_record("Locked %s", 4))
+
+
+def test_error_aggregator_key():
+    aggregator = ErrorAggregator(interval=10, clock=FakeClock())
+
+    assert aggregator.admit(make_record("Exception %s", "A", aggregate_key="A"))
+    assert aggregator.admit(make_record("Exception %s", "B", aggregate_key="B"))
+    assert not aggregator.admit(make_record("Exception %s", "A", aggregate_key="A"))
+    assert not aggregator.admit(make_record("Other exception %s", "C", aggregate_key="A"))
+
+    summaries = aggregator.due(force=True)
+    assert [summary.getMessage() for summary in summaries] == [
+        "Exception A (first of 3 similar records in 0.0s)"
+    ]
+
+
+def test_queue_handler_and_writer():
+    log_queue: queue.Queue = queue.Queue(2)
+    stream = io.StringIO()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter())
+    handler = NonBlockingQueueHandler(log_queue)
+
+    for reservation_id in range(3):
+        handler.handle(make_record("Locked %s", reservation_id))
+    assert handler.dropped == 1
+
+    writer = LogWriter(log_queue, output, ErrorAggregator(interval=60), tick=0.01)
+    writer.start()
+    writer.stop()
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line["message"] for line in lines] == [
+        "Locked 0",
+        "Locked %s (repeated 1 more times in 0.0s)",
+    ]
+
+
+def test_truncate_body():
+    assert truncate_body(b'{"a": 1}', 8) == '{"a": 1}'
+    assert truncate_body(b"xxxx", 10) == "xxxx... (10 bytes)"
@@ -0,0 +1,69 @@
+import os
+
+from app.utils.metrics import MetricsRegistry
+
+
+def test_counters_and_gauges():
+    registry = MetricsRegistry()
+    registry.describe("requests_total", "counter", "Requests")
+    registry.inc("requests_total", (("status", "200"),))
+    registry.inc("requests_total", (("status", "200"),))
+    registry.inc("requests_total", (("status", "423"),))
+    registry.inc_gauge("in_flight", value=3)
+    registry.add_callback(lambda: [("pool_checked_out", (), 2), ("requests_total", (), 1)])
+
+    text = registry.collect()
+
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{status="200"} 2' in text
+    assert 'requests_total{status="423"} 1' in text
+    # Callback samples of described counters are counters
+    assert "requests_total 1" in text
+    assert "# TYPE in_flight gauge" in text
+    assert "in_flight 3" in text
+    assert "pool_checked_out 2" in text
+
+
+def test_histogram():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    labels = (("route", "/reservation/make"),)
+    for value in (0.05, 0.5, 0.5, 5):
+        registry.observe("duration_seconds", labels, value)
+
+    text = registry.collect()
+
+    assert "# TYPE duration_seconds histogram" in text
+    assert 'duration_seconds_bucket{route="/reservation/make",le="0.1"} 1' in text
+    assert 'duration_seconds_bucket{route="/reservation/make",le="1.0"} 3' in text
+    assert 'duration_seconds_bucket{route="/reservation/make",le="+Inf"} 4' in text
+    assert 'duration_seconds_sum{route="/reservation/make"} 6.05' in text
+    assert 'duration_seconds_count{route="/reservation/make"} 4' in text
+
+
+def test_label_escaping():
+    registry = MetricsRegistry()
+    registry.inc("errors_total", (("detail", 'a "quoted"\\value'),))
+    assert 'errors_total{detail="a \\"quoted\\"\\\\value"} 1' in registry.collect()
+
+
+def test_shared_directory(tmp_path):
+    # Two workers write to the same directory
+    worker_1 = MetricsRegistry(directory=str(tmp_path), stale_after=60)
+    worker_1.inc("requests_total", value=2)
+    worker_1.inc_gauge("in_flight", value=1)
+    worker_1.write_snapshot()
+    os.rename(tmp_path / f"metrics-{os.getpid()}.json", tmp_path / "metrics-1.json")
+
+    worker_2 = MetricsRegistry(directory=str(tmp_path), stale_after=60)
+    worker_2.inc("requests_total", value=3)
+    worker_2.inc_gauge("in_flight", value=4)
+
+    text = worker_2.collect()
+    assert "requests_total 5" in text
+    assert "in_flight 5" in text
+
+    # Gauges of workers that stopped writing are dropped, their counters are kept
+    os.utime(tmp_path / "metrics-1.json", (0, 0))
+    text = worker_2.collect()
+    assert "requests_total 5" in text
+    assert "in_flight 4" in text
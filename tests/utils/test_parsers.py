@@ -0,0 +1,64 @@
+from typing import AsyncIterator, List
+
+import pytest
+
+from app.utils.parsers import iter_csv_records, iter_lines, iter_ndjson_records
+
+
+async def chunked(*chunks: bytes) -> AsyncIterator[bytes]:
+    for chunk in chunks:
+        yield chunk
+
+
+async def collect(records) -> List:
+    return [
+        (line_number, str(item) if isinstance(item, ValueError) else item)
+        async for line_number, item in records
+    ]
+
+
+@pytest.mark.asyncio
+async def test_lines_are_split_across_chunks():
+    lines = await collect(
+        iter_lines(chunked(b"\xef\xbb\xbffir", b"st\r\nsec", b"ond\nthi\xc3", b"\xa9rd"), 100)
+    )
+
+    assert lines == [(1, "first"), (2, "second"), (3, "thiérd")]
+
+
+@pytest.mark.asyncio
+async def test_long_lines_are_dropped_as_they_arrive():
+    lines = await collect(iter_lines(chunked(b"short\n", b"x" * 8, b"x" * 8, b"x\nok\n"), 10))
+
+    assert lines == [(1, "short"), (2, "Line is longer than 10 bytes"), (3, "ok")]
+
+
+@pytest.mark.asyncio
+async def test_ndjson_records():
+    body = b'{"product_id": 1}\n\n[1, 2]\n{"product_id": \n{"product_id": 2}'
+
+    records = await collect(iter_ndjson_records(chunked(body), 100))
+
+    assert records == [
+        (1, {"product_id": 1}),
+        (3, "Line is not a JSON object"),
+        (4, "Invalid JSON: Expecting value"),
+        (5, {"product_id": 2}),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_csv_records_with_quoted_fields():
+    body = (
+        b'product_id,name,price,quantity\n1,"Desk, oak",100,5\n'
+        b'2,"Lamp\n""Luna""",50\n3,"Chair",20,7\n4,"Shelf'
+    )
+
+    records = await collect(iter_csv_records(chunked(body[:40], body[40:]), 100))
+
+    assert records == [
+        (2, {"product_id": "1", "name": "Desk, oak", "price": "100", "quantity": "5"}),
+        (3, "Expected 4 fields, got 3"),
+        (5, {"product_id": "3", "name": "Chair", "price": "20", "quantity": "7"}),
+        (6, "Unterminated quoted field"),
+    ]
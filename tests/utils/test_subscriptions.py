@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from app.utils.subscriptions import SubscriptionLimitError, SubscriptionRegistry
+
+
+@pytest.mark.asyncio
+async def test_publish_wakes_subscribers_of_the_key():
+    registry: SubscriptionRegistry[int, str] = SubscriptionRegistry(max_subscriptions=10)
+    with registry.subscribe(1) as first, registry.subscribe(1) as second:
+        with registry.subscribe(2) as other:
+            waiting = asyncio.gather(first.wait(1), second.wait(1))
+            await asyncio.sleep(0)
+
+            assert registry.publish(1, "confirmed") == 2
+            assert await waiting == ["confirmed", "confirmed"]
+            assert await other.wait(0.01) is None
+
+    assert registry.stats().wakeups == 2
+
+
+@pytest.mark.asyncio
+async def test_busy_subscriber_gets_the_latest_value():
+    registry: SubscriptionRegistry[int, str] = SubscriptionRegistry(max_subscriptions=10)
+    with registry.subscribe(1) as subscription:
+        registry.publish(1, "pending")
+        registry.publish(1, "cancelled")
+
+        assert await subscription.wait(1) == "cancelled"
+        assert await subscription.wait(0.01) is None
+
+
+@pytest.mark.asyncio
+async def test_subscriptions_are_limited_and_removed_on_close():
+    registry: SubscriptionRegistry[int, str] = SubscriptionRegistry(max_subscriptions=2)
+    first = registry.subscribe(1)
+    second = registry.subscribe(2)
+
+    with pytest.raises(SubscriptionLimitError):
+        registry.subscribe(3)
+
+    first.close()
+    first.close()
+    assert len(registry) == 1
+    assert registry.publish(1, "confirmed") == 0
+    with registry.subscribe(3):
+        assert len(registry) == 2
+    second.close()
+
+    stats = registry.stats()
+    assert (stats.subscriptions, stats.rejected) == (0, 1)